@@ -1,17 +1,51 @@
-from typing import List
+from typing import List, Iterator, Optional
 import json
 import numpy as np
-from classes.consts import InputFmapSize as fs
+from classes.config import Config
 
 f_id = 0
+
+
+class FmapTile:
+    # a tile is a view on the input fmap that contains every input element needed
+    # to compute a tile_height x tile_width block of the output fmap, halo included
+    def __init__(
+        self,
+        data: np.ndarray,
+        p0: int,
+        q0: int,
+        height: int,
+        width: int,
+        h0: int,
+        w0: int,
+    ) -> None:
+        self.data = data  # view on the parent fmap, no copy
+        self.p0 = p0  # first output row computed from this tile
+        self.q0 = q0  # first output column computed from this tile
+        self.height = height  # number of output rows
+        self.width = width  # number of output columns
+        self.h0 = h0  # first input row covered by the tile
+        self.w0 = w0  # first input column covered by the tile
+
+    def __repr__(self) -> str:
+        return (
+            f"FmapTile(output [{self.p0}:{self.p0 + self.height}, {self.q0}:{self.q0 + self.width}], "
+            f"input {self.data.shape[-2]}x{self.data.shape[-1]} at ({self.h0}, {self.w0}))"
+        )
+
+
 class InputFeatureMap:
     # for sake of simplicity we
-    def __init__(self, *args) -> None:
+    def __init__(self, *args, config: Optional[Config] = None) -> None:
+        fs = (config or Config()).input_fmap_size
         self.channels: int = fs.C
         self.h: int = fs.H
         self.w: int = fs.W
         if len(args) == 1:
             self.fmap = args[0]
+            # a given fmap knows its own shape (single channel tiles are 2D)
+            if self.fmap.ndim == 3:
+                self.channels, self.h, self.w = self.fmap.shape
         else:
             self.fmap = np.random.rand(self.channels, self.h, self.w)
         global f_id
@@ -39,6 +73,37 @@ class InputFeatureMap:
         }
         return data
     
+    def tiles(
+        self,
+        tile_height: int,
+        tile_width: int,
+        filter_height: int,
+        filter_width: int,
+        stride: int,
+        channel: Optional[int] = None,
+    ) -> Iterator[FmapTile]:
+        # tile_height and tile_width are measured in output elements, each tile covers
+        # (tile - 1) * stride + filter input elements so neighbouring tiles share a halo
+        # of filter - stride rows/columns whenever the filter is larger than the stride
+        if tile_height < 1 or tile_width < 1 or stride < 1:
+            raise ValueError("Tile sizes and stride must be positive.")
+        fmap = self.fmap if channel is None else self.fmap[channel]
+        h, w = fmap.shape[-2:]
+        if filter_height > h or filter_width > w:
+            raise ValueError("Filter does not fit in the input feature map.")
+        P = (h - filter_height) // stride + 1
+        Q = (w - filter_width) // stride + 1
+        for p0 in range(0, P, tile_height):
+            height = min(tile_height, P - p0)
+            h0 = p0 * stride
+            h1 = h0 + (height - 1) * stride + filter_height
+            for q0 in range(0, Q, tile_width):
+                width = min(tile_width, Q - q0)
+                w0 = q0 * stride
+                w1 = w0 + (width - 1) * stride + filter_width
+                yield FmapTile(fmap[..., h0:h1, w0:w1], p0, q0, height, width, h0, w0)
+
+    # legacy fixed tiling, copies 4 tiles of 3x3 into new InputFeatureMaps: use tiles() instead
     def perform_tiling(self, number_of_tiles: int, size_of_tile: int, channel : int) -> List['InputFeatureMap']:
         if number_of_tiles != 4 or size_of_tile != 3:
             raise ValueError("Currently only supports tiling into 4 tiles of size 3x3.")
@@ -0,0 +1,67 @@
+from typing import Any, List, Dict, Union, Hashable
+import numpy as np
+from classes.consts import UnitModel
+from classes.filter import Filter
+from classes.InputFeatureMap import InputFeatureMap
+
+
+def allocation_key(data: Union[np.ndarray, List, Dict, Filter, InputFeatureMap]) -> Hashable:
+    # numpy slices like filters[m].kernel[k] are new objects every time we index,
+    # so arrays are identified by the memory region they look at instead of id()
+    # two distinct buffers with equal contents get different keys
+    if isinstance(data, np.ndarray):
+        return (
+            data.__array_interface__["data"][0],
+            data.shape,
+            data.strides,
+            data.dtype.str,
+        )
+    return id(data)
+
+
+def sizeof(
+    data: Union[np.ndarray, List, Dict, Filter, InputFeatureMap], um: Any = UnitModel
+) -> int:
+    # number of bytes the data takes once it is placed in memory,
+    # um gives the size of plain Python ints and floats (UnitModel or a config section)
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    elif isinstance(data, list):
+        return sum(sizeof(item, um) for item in data)
+    elif isinstance(data, dict):
+        size = 0
+        for key, value in data.items():
+            size += um.SIZE_OF_INT if isinstance(key, int) else len(str(key))
+            if isinstance(value, int):
+                size += um.SIZE_OF_INT
+            elif isinstance(value, float):
+                size += um.SIZE_OF_FLOAT
+            elif isinstance(value, Filter):
+                size += value.kernel.nbytes
+            elif isinstance(value, InputFeatureMap):
+                size += value.fmap.nbytes
+            else:
+                size += sizeof(value, um)
+        return size
+    elif isinstance(data, InputFeatureMap):
+        return data.fmap.nbytes
+    raise ValueError("Unsupported data type for memory update.")
+
+
+class Allocation:
+    # handle returned by Memory.alloc, the size is computed once here so that
+    # freeing and residency checks never have to walk the data again
+    def __init__(
+        self,
+        data: Union[np.ndarray, List, Dict, Filter, InputFeatureMap],
+        volatile: bool,
+        unit_model: Any = UnitModel,
+    ) -> None:
+        self.data = data
+        self.key: Hashable = allocation_key(data)
+        self.nbytes: int = sizeof(data, unit_model)
+        self.volatile: bool = volatile
+
+    def __repr__(self) -> str:
+        memory = "volatile" if self.volatile else "non-volatile"
+        return f"Allocation({type(self.data).__name__}, {self.nbytes} bytes, {memory})"
@@ -0,0 +1,102 @@
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+import numpy as np
+
+REPLACEMENT_POLICIES = ("lru", "fifo", "random")
+
+
+class Cache:
+    # set-associative model of the volatile memory used as a cache in front of the FRAM.
+    # It only tracks tags and dirty bits, Memory turns hits, misses and write-backs
+    # into volatile / non-volatile accesses so the energy getters keep working
+    def __init__(
+        self,
+        size: int,
+        line_size: int = 32,
+        associativity: Optional[int] = 4,
+        policy: str = "lru",
+        write_back: bool = True,
+        seed: Optional[int] = None,
+    ) -> None:
+        if policy not in REPLACEMENT_POLICIES:
+            raise ValueError(f"Unknown replacement policy: {policy}")
+        if size % line_size != 0:
+            raise ValueError("Cache size must be a multiple of the line size.")
+        number_of_lines = size // line_size
+        # associativity None means fully associative
+        ways = number_of_lines if associativity is None else associativity
+        if number_of_lines % ways != 0:
+            raise ValueError("Number of lines must be a multiple of the associativity.")
+        self.size = size
+        self.line_size = line_size
+        self.ways = ways
+        self.number_of_sets = number_of_lines // ways
+        self.policy = policy
+        self.write_back = write_back
+        self.rng = np.random.default_rng(seed)
+        # every set maps tag -> dirty bit, ordered by insertion (FIFO) or last use (LRU)
+        self.sets: List[OrderedDict] = [OrderedDict() for _ in range(self.number_of_sets)]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def access(self, address: int, write: bool = False) -> Tuple[bool, bool]:
+        # look up the line containing address, returns (hit, dirty line evicted)
+        line = address // self.line_size
+        cache_set = self.sets[line % self.number_of_sets]
+        tag = line // self.number_of_sets
+        if tag in cache_set:
+            self.hits += 1
+            if self.policy == "lru":
+                cache_set.move_to_end(tag)
+            if write and self.write_back:
+                cache_set[tag] = True
+            return True, False
+
+        self.misses += 1
+        dirty_eviction = False
+        if len(cache_set) >= self.ways:
+            if self.policy == "random":
+                victim = list(cache_set)[self.rng.integers(len(cache_set))]
+            else:
+                victim = next(iter(cache_set))
+            dirty_eviction = cache_set.pop(victim)
+            self.evictions += 1
+            if dirty_eviction:
+                self.writebacks += 1
+        # write-allocate: the line is fetched on write misses as well
+        cache_set[tag] = write and self.write_back
+        return False, dirty_eviction
+
+    def flush(self, invalidate: bool = False) -> int:
+        # write back every dirty line, returns how many lines were written.
+        # invalidate=True also drops the content (e.g. on a power failure)
+        dirty_lines = 0
+        for cache_set in self.sets:
+            for tag, dirty in cache_set.items():
+                if dirty:
+                    dirty_lines += 1
+                    cache_set[tag] = False
+            if invalidate:
+                cache_set.clear()
+        self.writebacks += dirty_lines
+        return dirty_lines
+
+    def invalidate(self) -> int:
+        # drop every line without writing it back, returns how many dirty lines were lost
+        lost = sum(dirty for cache_set in self.sets for dirty in cache_set.values())
+        for cache_set in self.sets:
+            cache_set.clear()
+        return lost
+
+    def get_statistics(self) -> Dict[str, float]:
+        accesses = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "writebacks": self.writebacks,
+            "hit_rate": self.hits / accesses if accesses else 0.0,
+        }
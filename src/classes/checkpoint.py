@@ -0,0 +1,189 @@
+from typing import Dict, Optional, Union
+import numpy as np
+
+
+class CheckpointPolicy:
+    # decides when the volatile state is saved to FRAM and keeps the cost of doing it.
+    # block_size is the dirty tracking granularity in bytes: only the blocks written
+    # since the last checkpoint are saved. None saves every volatile object as a whole.
+    # Both are charged in words of SIZE_OF_FLOAT bytes
+    name = "policy"
+    # True if the policy saves while the MACs run, so they can't be counted in closed form
+    counts_macs = False
+
+    def __init__(self, block_size: Optional[int] = None) -> None:
+        if block_size is not None and block_size <= 0:
+            raise ValueError("Block size must be positive.")
+        self.block_size = block_size
+        self.reset()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(block_size={self.block_size})"
+
+    def reset(self) -> None:
+        self.checkpoints = 0
+        self.restores = 0
+        self.blocks_written = 0
+        self.blocks_skipped = 0
+        # accesses charged by checkpoints and restores, already included in the Memory counters
+        self.volatile_reads = 0
+        self.volatile_writes = 0
+        self.nonvolatile_reads = 0
+        self.nonvolatile_writes = 0
+
+    # the hooks below are asked by Memory whether the state has to be saved now
+
+    def on_mac(self, macs_since_checkpoint: int) -> bool:
+        return False
+
+    def on_low_energy(self) -> bool:
+        return False
+
+    def on_failure(self) -> bool:
+        return False
+
+    def record(
+        self,
+        volatile_reads: int = 0,
+        volatile_writes: int = 0,
+        nonvolatile_reads: int = 0,
+        nonvolatile_writes: int = 0,
+    ) -> None:
+        self.volatile_reads += volatile_reads
+        self.volatile_writes += volatile_writes
+        self.nonvolatile_reads += nonvolatile_reads
+        self.nonvolatile_writes += nonvolatile_writes
+
+    def merge(self, other: "CheckpointPolicy") -> None:
+        # add the statistics of a policy that ran somewhere else (e.g. a parallel worker)
+        self.checkpoints += other.checkpoints
+        self.restores += other.restores
+        self.blocks_written += other.blocks_written
+        self.blocks_skipped += other.blocks_skipped
+        self.record(
+            other.volatile_reads,
+            other.volatile_writes,
+            other.nonvolatile_reads,
+            other.nonvolatile_writes,
+        )
+
+    def get_statistics(
+        self,
+        volatile_read_cost: float,
+        volatile_write_cost: float,
+        nonvolatile_read_cost: float,
+        nonvolatile_write_cost: float,
+    ) -> Dict[str, float]:
+        energy = (
+            self.volatile_reads * volatile_read_cost
+            + self.volatile_writes * volatile_write_cost
+            + self.nonvolatile_reads * nonvolatile_read_cost
+            + self.nonvolatile_writes * nonvolatile_write_cost
+        )
+        return {
+            "policy": self.name,
+            "checkpoints": self.checkpoints,
+            "restores": self.restores,
+            "blocks_written": self.blocks_written,
+            "blocks_skipped": self.blocks_skipped,
+            "volatile_reads": self.volatile_reads,
+            "volatile_writes": self.volatile_writes,
+            "nonvolatile_reads": self.nonvolatile_reads,
+            "nonvolatile_writes": self.nonvolatile_writes,
+            "energy": energy,
+        }
+
+
+class OnFailure(CheckpointPolicy):
+    # the state is saved when the power failure happens (the original behaviour)
+    name = "on-failure"
+
+    def on_failure(self) -> bool:
+        return True
+
+
+class Periodic(CheckpointPolicy):
+    # the state is saved every interval MACs, a failure loses what was done since
+    name = "periodic"
+    counts_macs = True
+
+    def __init__(self, interval: int, block_size: Optional[int] = None) -> None:
+        if interval <= 0:
+            raise ValueError("Checkpoint interval must be positive.")
+        super().__init__(block_size)
+        self.interval = interval
+
+    def __repr__(self) -> str:
+        return f"Periodic(interval={self.interval}, block_size={self.block_size})"
+
+    def on_mac(self, macs_since_checkpoint: int) -> bool:
+        return macs_since_checkpoint >= self.interval
+
+
+class JustInTime(CheckpointPolicy):
+    # the state is saved when the supply raises the low-energy signal,
+    # right before the brown-out
+    name = "just-in-time"
+
+    def on_low_energy(self) -> bool:
+        return True
+
+
+CHECKPOINT_POLICIES = {
+    policy.name: policy for policy in (OnFailure, Periodic, JustInTime)
+}
+
+
+class ExecutionProgress:
+    # forward progress of an intermittent execution: MACs of the program, MACs executed
+    # again after a rollback, MACs whose result was lost, and the accesses wasted on them
+    # (a ledger of Memory, priced with its costs)
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.macs = 0
+        self.replayed_macs = 0
+        self.lost_macs = 0
+        self.failures = 0
+        self.replays = 0
+        self.completed_outputs = 0
+        # volatile reads, volatile writes, non-volatile reads, non-volatile writes
+        self.wasted_accesses = [0, 0, 0, 0]
+        # every kind of the ledger, 0 until something is wasted
+        self.wasted_ledger: Union[int, np.ndarray] = 0
+
+    def waste(self, ledger: Union[int, np.ndarray]) -> None:
+        self.wasted_ledger = self.wasted_ledger + ledger
+        if isinstance(ledger, np.ndarray):
+            for i, count in enumerate(ledger[0].sum(axis=0).ravel()):
+                self.wasted_accesses[i] += int(count)
+
+    def merge(self, other: "ExecutionProgress") -> None:
+        self.macs += other.macs
+        self.replayed_macs += other.replayed_macs
+        self.lost_macs += other.lost_macs
+        self.failures += other.failures
+        self.replays += other.replays
+        self.completed_outputs += other.completed_outputs
+        self.waste(other.wasted_ledger)
+
+    def get_statistics(self, total_energy: float, costs: np.ndarray) -> Dict[str, float]:
+        # costs are those of the ledger (Memory.costs), so the wasted energy is in the
+        # unit of total_energy
+        wasted_energy = float(np.sum(self.wasted_ledger * costs))
+        executed = self.macs + self.replayed_macs
+        return {
+            "macs": self.macs,
+            "replayed_macs": self.replayed_macs,
+            "lost_macs": self.lost_macs,
+            "failures": self.failures,
+            "replays": self.replays,
+            "completed_outputs": self.completed_outputs,
+            # share of the executed MACs that moved the computation forward
+            "forward_progress": self.macs / executed if executed else 1.0,
+            "wasted_energy": wasted_energy,
+            "energy_per_output": (
+                total_energy / self.completed_outputs if self.completed_outputs else 0.0
+            ),
+        }
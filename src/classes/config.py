@@ -0,0 +1,120 @@
+from typing import Any, Dict, Optional
+import copy
+import json
+from classes.consts import (
+    FilterSize,
+    InputFmapSize,
+    OutputFmapSize,
+    U,
+    MemoryModel,
+    UnitModel,
+    EnergyModel,
+)
+
+
+class ConfigSection:
+    # runtime copy of one of the constant classes in consts.py, it exposes the same
+    # attribute names (M, C, R, S, ...) so code written against the constants works unchanged
+    def __init__(self, defaults: type, values: Optional[Dict[str, Any]] = None) -> None:
+        self._name = defaults.__name__
+        for key, value in vars(defaults).items():
+            if not key.startswith("_"):
+                setattr(self, key, value)
+        for key, value in (values or {}).items():
+            if not hasattr(self, key):
+                raise ValueError(f"Unknown {self._name} parameter: {key}")
+            setattr(self, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in vars(self).items() if not key.startswith("_")}
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{key}={value}" for key, value in self.to_dict().items())
+        return f"{self._name}({values})"
+
+
+# config sections and the constant class that provides their defaults
+SECTIONS = {
+    "filter_size": FilterSize,
+    "input_fmap_size": InputFmapSize,
+    "output_fmap_size": OutputFmapSize,
+    "memory_model": MemoryModel,
+    "unit_model": UnitModel,
+    "energy_model": EnergyModel,
+}
+
+
+class Config:
+    # everything the simulator used to read from consts.py, as an object that can be
+    # built in code or loaded from a JSON file and passed around explicitly
+    def __init__(self, stride: int = U, **sections: Dict[str, Any]) -> None:
+        for name in sections:
+            if name not in SECTIONS:
+                raise ValueError(f"Unknown config section: {name}")
+        self.stride: int = stride
+        self.filter_size = ConfigSection(FilterSize, sections.get("filter_size"))
+        self.input_fmap_size = ConfigSection(InputFmapSize, sections.get("input_fmap_size"))
+        self.memory_model = ConfigSection(MemoryModel, sections.get("memory_model"))
+        self.unit_model = ConfigSection(UnitModel, sections.get("unit_model"))
+        self.energy_model = ConfigSection(EnergyModel, sections.get("energy_model"))
+        # the output size follows from the input, the filters and the stride
+        output_fmap_size = dict(sections.get("output_fmap_size") or {})
+        output_fmap_size.setdefault("N", self.input_fmap_size.N)
+        output_fmap_size.setdefault("M", self.filter_size.M)
+        output_fmap_size.setdefault(
+            "P", (self.input_fmap_size.H - self.filter_size.R) // stride + 1
+        )
+        output_fmap_size.setdefault(
+            "Q", (self.input_fmap_size.W - self.filter_size.S) // stride + 1
+        )
+        self.output_fmap_size = ConfigSection(OutputFmapSize, output_fmap_size)
+        if self.filter_size.C != self.input_fmap_size.C:
+            raise ValueError("Filters and input fmaps must have the same number of channels.")
+
+    @property
+    def P(self) -> int:
+        return self.output_fmap_size.P
+
+    @property
+    def Q(self) -> int:
+        return self.output_fmap_size.Q
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"stride": self.stride}
+        for name in SECTIONS:
+            data[name] = getattr(self, name).to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Config":
+        data = dict(data)
+        stride = data.pop("stride", U)
+        return cls(stride, **data)
+
+    @classmethod
+    def from_file(cls, path: str) -> "Config":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def replace(self, stride: Optional[int] = None, **sections: Dict[str, Any]) -> "Config":
+        # new config with some parameters changed, e.g. replace(input_fmap_size={"H": 64}).
+        # The output size is derived again unless it is given explicitly
+        data = copy.deepcopy(self.to_dict())
+        data.pop("output_fmap_size")
+        if stride is not None:
+            data["stride"] = stride
+        for name, values in sections.items():
+            if name not in SECTIONS:
+                raise ValueError(f"Unknown config section: {name}")
+            data.setdefault(name, {}).update(values)
+        return Config.from_dict(data)
+
+    def __repr__(self) -> str:
+        return (
+            f"Config(stride={self.stride}, {self.filter_size}, {self.input_fmap_size}, "
+            f"{self.output_fmap_size})"
+        )
@@ -32,6 +32,14 @@ class MemoryModel:
     NONVOLATILE_MEMORY_SIZE: int = 256 * 1024  # 256KB
     NONVOLATILE_READ: float = 281.25
     NONVOLATILE_WRITE: float = 375  # pJ/bit
+    # the costs above are per access of a float word ("word", the unit of the benchmarks)
+    # or per bit moved ("bit", the energy is then in pJ)
+    COST_UNIT: str = "word"
+    # fixed cost of every memory transaction, on top of the bits it moves
+    VOLATILE_TRANSACTION: float = 0.0
+    NONVOLATILE_TRANSACTION: float = 0.0
+    # bytes a contiguous transfer moves per transaction, 0 for one transaction per element
+    BURST_SIZE: int = 0
 
 
 # the overall cost should be
@@ -0,0 +1,99 @@
+from typing import Any, Dict, Tuple
+import numpy as np
+
+# the counters are an array of shape (roles, levels, operations): every access is
+# attributed to the tensor it touches, checkpoint traffic has its own role
+ROLES: Tuple[str, ...] = ("filters", "input", "biases", "output", "checkpoint", "other")
+LEVELS: Tuple[str, ...] = ("volatile", "nonvolatile")
+OPERATIONS: Tuple[str, ...] = ("read", "write")
+ROLE_INDEX: Dict[str, int] = {role: i for i, role in enumerate(ROLES)}
+# Memory keeps one such array per kind in a ledger of shape (kinds, roles, levels,
+# operations): the accesses, the bits moved on top of the role width of every access,
+# and the transactions on top of one per access. Plain accesses only touch the first
+# one, transfers of other widths or in bursts correct the other two
+KINDS: Tuple[str, ...] = ("accesses", "extra_bits", "extra_transactions")
+# offsets of the kinds in a flat view of the ledger
+EXTRA_BITS = len(ROLES) * len(LEVELS) * len(OPERATIONS)
+EXTRA_TRANSACTIONS = 2 * EXTRA_BITS
+
+
+class CounterSnapshot:
+    # copy of the Memory counters at some point, snapshots can be subtracted to get
+    # what happened in between and turned into flat records (one row of a table)
+    def __init__(self, ledger: np.ndarray, costs: np.ndarray, widths: np.ndarray) -> None:
+        self.ledger = ledger
+        # energy per unit of every kind of the ledger, same shape
+        self.costs = costs
+        # bits of an access of every role
+        self.widths = widths
+
+    def __sub__(self, other: "CounterSnapshot") -> "CounterSnapshot":
+        return CounterSnapshot(self.ledger - other.ledger, self.costs, self.widths)
+
+    def __add__(self, other: "CounterSnapshot") -> "CounterSnapshot":
+        return CounterSnapshot(self.ledger + other.ledger, self.costs, self.widths)
+
+    @property
+    def counters(self) -> np.ndarray:
+        return self.ledger[0]
+
+    def energy(self) -> np.ndarray:
+        # (role, level, operation) energy
+        return (self.ledger * self.costs).sum(axis=0)
+
+    def __repr__(self) -> str:
+        return f"CounterSnapshot({self.get_counters()}, energy={self.get_total_energy_cost()})"
+
+    def get_counters(self) -> Tuple[int, int, int, int]:
+        # volatile reads, volatile writes, non-volatile reads, non-volatile writes
+        return tuple(int(count) for count in self.counters.sum(axis=0).ravel())
+
+    def get_energy_by_role(self) -> Dict[str, float]:
+        energy = self.energy().sum(axis=(1, 2))
+        return {role: float(value) for role, value in zip(ROLES, energy)}
+
+    def get_energy_by_level(self) -> Dict[str, float]:
+        energy = self.energy().sum(axis=(0, 2))
+        return {level: float(value) for level, value in zip(LEVELS, energy)}
+
+    def get_total_energy_cost(self) -> float:
+        return float(self.energy().sum())
+
+    def get_bits(self) -> Tuple[int, int, int, int]:
+        # bits moved by the volatile reads, volatile writes, non-volatile reads and writes
+        bits = self.ledger[0] * self.widths[:, None, None] + self.ledger[1]
+        return tuple(int(count) for count in bits.sum(axis=0).ravel())
+
+    def get_transactions(self) -> Tuple[int, int, int, int]:
+        transactions = self.ledger[0] + self.ledger[2]
+        return tuple(int(count) for count in transactions.sum(axis=0).ravel())
+
+    def to_record(self, **labels: Any) -> Dict[str, Any]:
+        # labels first (e.g. the work item), then the counters and energies
+        volatile_reads, volatile_writes, nonvolatile_reads, nonvolatile_writes = self.get_counters()
+        energy_by_level = self.get_energy_by_level()
+        bits = self.get_bits()
+        record = dict(labels)
+        record.update(
+            {
+                "volatile_reads": volatile_reads,
+                "volatile_writes": volatile_writes,
+                "nonvolatile_reads": nonvolatile_reads,
+                "nonvolatile_writes": nonvolatile_writes,
+                "volatile_accesses": volatile_reads + volatile_writes,
+                "nonvolatile_accesses": nonvolatile_reads + nonvolatile_writes,
+                "total_accesses": volatile_reads
+                + volatile_writes
+                + nonvolatile_reads
+                + nonvolatile_writes,
+                "volatile_bits": bits[0] + bits[1],
+                "nonvolatile_bits": bits[2] + bits[3],
+                "transactions": sum(self.get_transactions()),
+                "volatile_energy": energy_by_level["volatile"],
+                "nonvolatile_energy": energy_by_level["nonvolatile"],
+                "total_energy": self.get_total_energy_cost(),
+            }
+        )
+        for role, energy in self.get_energy_by_role().items():
+            record[f"{role}_energy"] = energy
+        return record
@@ -0,0 +1,104 @@
+from typing import Any, Callable, Dict, Optional
+
+# events Memory can notify, with the verbosity the console logger needs to print them
+EVENT_LEVELS: Dict[str, int] = {
+    "work_item": 1,
+    "summary": 1,
+    "power_failure": 2,
+    "checkpoint": 2,
+    "restore": 2,
+    "alloc": 3,
+    "free": 3,
+    "read": 4,
+    "write": 4,
+}
+EVENTS = tuple(EVENT_LEVELS)
+
+# callback(memory, event, payload)
+Callback = Callable[[Any, str, Dict[str, Any]], None]
+
+
+class Subscription:
+    # a callback subscribed to one event of a Memory, called for one event every `every`
+    # (sampling, e.g. every=1000 to follow the reads of a long run)
+    def __init__(self, event: str, callback: Callback, every: int = 1) -> None:
+        if event not in EVENT_LEVELS:
+            raise ValueError(f"Unknown event: {event} (expected one of {EVENTS})")
+        if every < 1:
+            raise ValueError("Sampling period must be at least 1.")
+        self.event = event
+        self.callback = callback
+        self.every = every
+        self.seen = 0
+
+    def __repr__(self) -> str:
+        return f"Subscription({self.event}, {self.callback}, every={self.every})"
+
+    def __call__(self, memory: Any, payload: Dict[str, Any]) -> None:
+        self.seen += 1
+        if self.seen % self.every == 0:
+            self.callback(memory, self.event, payload)
+
+
+class ConsoleLogger:
+    # prints the events up to the given verbosity:
+    # 0 nothing, 1 work item and convolution summaries, 2 power failures and
+    # checkpoints, 3 memory usage after every alloc/free, 4 every read and write
+    def __init__(self, verbosity: int = 1, every: int = 1) -> None:
+        self.verbosity = verbosity
+        self.every = every
+
+    def attach(self, memory: Any) -> None:
+        for event, level in EVENT_LEVELS.items():
+            if level <= self.verbosity:
+                memory.subscribe(event, self.log, self.every)
+
+    def log(self, memory: Any, event: str, payload: Dict[str, Any]) -> None:
+        if event in ("alloc", "free"):
+            print(f"Current volatile memory usage: {payload['volatile_usage']} bytes")
+            print(f"Current non-volatile memory usage: {payload['nonvolatile_usage']} bytes")
+        elif event == "power_failure":
+            print("Power failure occurred. Data has been restored from non-volatile memory.")
+        elif event in ("checkpoint", "restore"):
+            print(f"{event.capitalize()}: {payload['words']} words")
+        elif event == "work_item":
+            print(
+                "InputFmap #", payload["inputFmap"], " Filter #", payload["filter"],
+                " Channel #", payload["fmap"],
+            )
+            self.print_totals(memory)
+        elif event == "summary":
+            self.print_summary(memory, payload)
+        else:
+            level = "volatile" if payload["volatile"] else "non-volatile"
+            print(f"{event} {level} {payload['role']} x{payload['count']}")
+
+    def print_totals(self, memory: Any) -> None:
+        print(
+            "Total energy cost: ",
+            memory.get_total_energy_cost(),
+            " In volatile : ",
+            memory.get_volatile_energy_cost(),
+            " In non-volatile : ",
+            memory.get_nonvolatile_energy_cost(),
+        )
+        print(
+            "Total memory accesses: ",
+            memory.get_total_memory_accesses(),
+            " In volatile : ",
+            memory.get_volatile_memory_accesses(),
+            " In non-volatile : ",
+            memory.get_nonvolatile_memory_accesses(),
+        )
+
+    def print_summary(self, memory: Any, payload: Dict[str, Any]) -> None:
+        schedule: Optional[str] = payload.get("schedule")
+        if schedule is None:
+            self.print_totals(memory)
+            return
+        print(f"Schedule {schedule} (SRAM footprint {payload['footprint']} bytes)")
+        for name, tensor in payload["counts"].items():
+            print(
+                f"  {name}: NVM reads {tensor['nvm_reads']} NVM writes {tensor['nvm_writes']}"
+                f" SRAM reads {tensor['sram_reads']} SRAM writes {tensor['sram_writes']}"
+            )
@@ -1,18 +1,21 @@
-from typing import List
+from typing import List, Optional
 import json
-from classes.consts import FilterSize as fs
+from classes.config import Config
 import numpy as np
 
 id = 0
 class Filter:
     # for sake of simplicity we
-    def __init__(self, *args) -> None:
+    def __init__(self, *args, config: Optional[Config] = None) -> None:
+        fs = (config or Config()).filter_size
         self.channels: int = fs.C
         self.r: int = fs.R
         self.s: int = fs.S
         if len(args) == 2:
             self.bias: float = args[0]
             self.kernel = args[1]
+            # a given kernel knows its own shape
+            self.channels, self.r, self.s = self.kernel.shape
         else:
             self.bias: float = np.random.rand()
             self.kernel = np.random.rand(self.channels, self.r, self.s)
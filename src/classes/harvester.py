@@ -0,0 +1,196 @@
+from typing import Dict, Optional
+import os
+import numpy as np
+
+
+def load_trace(path: str, column: int = -1) -> np.ndarray:
+    # energy trace from a .npy array or a text/.csv file with one sample per row,
+    # for files with several columns (e.g. time, value) column selects the value
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        trace = np.load(path)
+    else:
+        delimiter = "," if extension == ".csv" else None
+        # header rows are read as nan and dropped below
+        trace = np.genfromtxt(path, delimiter=delimiter, comments="#")
+    trace = np.atleast_1d(np.asarray(trace, dtype=np.float64))
+    if trace.ndim == 2:
+        trace = trace[:, column]
+    trace = trace[~np.isnan(trace)]
+    if trace.size == 0:
+        raise ValueError(f"Empty energy trace: {path}")
+    return trace
+
+
+def voltage_to_energy(voltage: np.ndarray, capacitance: float) -> np.ndarray:
+    # energy stored in a capacitor of capacitance farads, in pJ like the memory costs
+    return 0.5 * capacitance * np.square(voltage) * 1e12
+
+
+class PowerModel:
+    # decides after how many MACs the next power failure happens. Memory asks for the
+    # distance to the next failure once and counts it down, instead of drawing every MAC.
+    # stateful models follow a timeline, so a run can't be split over parallel workers.
+    # The base model is an unlimited supply that never fails
+    stateful = False
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+    def macs_to_failure(self, energy_per_mac: float, rng: np.random.Generator) -> float:
+        # the failure happens on the returned MAC (1 is the next one), np.inf if never
+        return np.inf
+
+    def advance(self, macs: int, energy: float) -> None:
+        # the simulator executed macs MACs spending energy
+        pass
+
+    def power_failure(self) -> None:
+        # the failure happened, wait until the device can run again
+        pass
+
+    def get_statistics(self) -> Dict[str, float]:
+        return {}
+
+
+class BernoulliPowerModel(PowerModel):
+    # every MAC fails independently with the given probability, as the original
+    # per-MAC draw, so the distance to the next failure is geometric
+    def __init__(self, probability: float) -> None:
+        if not 0 <= probability <= 1:
+            raise ValueError("Power failure probability must be between 0 and 1.")
+        self.probability = probability
+
+    def __repr__(self) -> str:
+        return f"BernoulliPowerModel(probability={self.probability})"
+
+    def macs_to_failure(self, energy_per_mac: float, rng: np.random.Generator) -> float:
+        if self.probability == 0:
+            return np.inf
+        return int(rng.geometric(self.probability))
+
+
+class HarvestingPowerModel(PowerModel):
+    # capacitor charged by a harvested energy trace and drained by the accesses the
+    # simulator counts. Every trace sample is the energy harvested (pJ) during
+    # macs_per_sample MACs, the trace is repeated when it ends. The device stops when the
+    # stored energy drops below threshold and starts again once it is back to turn_on.
+    # kind="voltage" reads the trace as the open circuit voltage of a capacitor of the
+    # given capacitance and harvests its energy increases
+    stateful = True
+
+    def __init__(
+        self,
+        trace: np.ndarray,
+        capacity: float,
+        threshold: float,
+        turn_on: Optional[float] = None,
+        initial: Optional[float] = None,
+        macs_per_sample: int = 1,
+        kind: str = "energy",
+        capacitance: Optional[float] = None,
+    ) -> None:
+        trace = np.asarray(trace, dtype=np.float64)
+        if kind == "voltage":
+            if capacitance is None:
+                raise ValueError("Voltage traces need the capacitance.")
+            trace = np.maximum(np.diff(voltage_to_energy(trace, capacitance), prepend=0.0), 0)
+        elif kind != "energy":
+            raise ValueError(f"Unknown trace kind: {kind}")
+        turn_on = capacity if turn_on is None else turn_on
+        if not 0 <= threshold < turn_on <= capacity:
+            raise ValueError("Expected 0 <= threshold < turn_on <= capacity.")
+        if macs_per_sample < 1:
+            raise ValueError("macs_per_sample must be at least 1.")
+        # harvested energy during every MAC
+        self.harvest = np.repeat(trace / macs_per_sample, macs_per_sample)
+        self.capacity = capacity
+        self.threshold = threshold
+        self.turn_on = turn_on
+        self.initial = turn_on if initial is None else initial
+        self.reset()
+
+    @classmethod
+    def from_file(cls, path: str, column: int = -1, **kwargs) -> "HarvestingPowerModel":
+        return cls(load_trace(path, column), **kwargs)
+
+    def __repr__(self) -> str:
+        return (
+            f"HarvestingPowerModel({self.harvest.size} MACs, capacity={self.capacity}, "
+            f"threshold={self.threshold}, turn_on={self.turn_on})"
+        )
+
+    def reset(self) -> None:
+        self.position = 0
+        self.energy = self.initial
+        self.failures = 0
+        self.off_macs = 0
+        self.harvested = 0.0
+        self.consumed = 0.0
+
+    def window(self, length: int) -> np.ndarray:
+        # harvested energy of the next length MACs from the current position
+        return np.take(self.harvest, np.arange(self.position, self.position + length), mode="wrap")
+
+    def stored_energy(self, start: float, net: np.ndarray) -> np.ndarray:
+        # energy after every step of the window: E_t = min(capacity, E_t-1 + net_t),
+        # unrolled as S_t - max(0, max_s<=t S_s - capacity) with S the unclipped sum
+        running = start + np.cumsum(net)
+        overflow = np.maximum.accumulate(running) - self.capacity
+        return running - np.maximum(overflow, 0)
+
+    def macs_to_failure(self, energy_per_mac: float, rng: np.random.Generator) -> float:
+        # whole periods of the trace, so that a window ending with the energy it started
+        # with proves the device never fails
+        length = self.harvest.size * -(-4096 // self.harvest.size)
+        start, offset, position = self.energy, 0, self.position
+        while True:
+            harvest = np.take(self.harvest, np.arange(position, position + length), mode="wrap")
+            energy = self.stored_energy(start, harvest - energy_per_mac)
+            below = np.flatnonzero(energy < self.threshold)
+            if below.size > 0:
+                return offset + int(below[0]) + 1
+            if energy[-1] >= start:
+                # a whole window without losing energy, the trace keeps the device alive
+                return np.inf
+            start, offset, position = energy[-1], offset + length, position + length
+
+    def advance(self, macs: int, energy: float) -> None:
+        if macs <= 0:
+            return
+        harvest = self.window(macs)
+        stored = self.stored_energy(self.energy, harvest - energy / macs)
+        self.energy = max(float(stored[-1]), 0.0)
+        self.position = (self.position + macs) % self.harvest.size
+        self.harvested += float(harvest.sum())
+        self.consumed += energy
+
+    def power_failure(self) -> None:
+        # nothing runs while the capacitor charges back to turn_on
+        self.failures += 1
+        if not self.harvest.any():
+            raise ValueError("The energy trace never recharges the capacitor.")
+        waited = 0
+        while True:
+            harvest = self.window(self.harvest.size)
+            stored = np.minimum(self.energy + np.cumsum(harvest), self.capacity)
+            on = np.flatnonzero(stored >= self.turn_on)
+            if on.size > 0:
+                steps = int(on[0]) + 1
+                self.energy = float(stored[on[0]])
+                self.harvested += float(harvest[:steps].sum())
+                self.position = (self.position + steps) % self.harvest.size
+                self.off_macs += waited + steps
+                return
+            self.energy = float(stored[-1])
+            self.harvested += float(harvest.sum())
+            waited += self.harvest.size
+
+    def get_statistics(self) -> Dict[str, float]:
+        return {
+            "failures": self.failures,
+            "off_macs": self.off_macs,
+            "harvested": self.harvested,
+            "consumed": self.consumed,
+            "stored": self.energy,
+        }
@@ -1,19 +1,58 @@
-from classes.consts import MemoryModel as mm, UnitModel as um
+from classes.config import Config
 from classes.filter import Filter
 from classes.InputFeatureMap import InputFeatureMap
-from typing import List, Dict, Any, Union
+from classes.allocation import Allocation, allocation_key, sizeof
+from classes.schedule import TENSOR_LOOPS, Schedule
+from classes.cache import Cache
+from classes.checkpoint import CheckpointPolicy, ExecutionProgress, OnFailure
+from classes.harvester import PowerModel
+from classes.counters import (
+    ROLES,
+    LEVELS,
+    OPERATIONS,
+    ROLE_INDEX,
+    KINDS,
+    EXTRA_BITS,
+    EXTRA_TRANSACTIONS,
+    CounterSnapshot,
+)
+from classes.sink import ResultsSink
+from classes.events import EVENTS, Callback, ConsoleLogger, Subscription
+from classes.trace import TraceRecorder, convolution_trace
+from classes.quantization import Requantizer
+from classes.operators import IDENTITY, Epilogue
+from typing import List, Dict, Any, Union, Optional, Hashable, Tuple
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from classes.consts import (
-    FilterSize as fs,
-    InputFmapSize as ifs,
-    OutputFmapSize as ofs,
-    U as stride,
-    EnergyModel as em,
+from tools.convolution import (
+    CONVOLUTION_ENGINES,
+    convolve_arrays,
+    quantized_convolution,
+    quantized_convolve_arrays,
 )
 
 
 class Memory:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        reference_engine: str = "vectorized",
+        fast_counting: bool = False,
+        seed: Optional[int] = None,
+        config: Optional[Config] = None,
+        cache: Optional[Cache] = None,
+        checkpoint_policy: Optional[CheckpointPolicy] = None,
+        rollback: bool = False,
+        max_replays: int = 100,
+        power_model: Optional[PowerModel] = None,
+        verbosity: int = 1,
+        trace: Optional[TraceRecorder] = None,
+        requantizer: Optional[Requantizer] = None,
+        epilogue: Optional[Epilogue] = None,
+    ) -> None:
+        # layer shape, stride and memory/energy models of this simulation
+        self.config = config or Config()
+        mm = self.config.memory_model
+
         # Initialize the costs and sizes for both types of memory
         self.volatile_read_cost = mm.VOLATILE_READ
         self.volatile_write_cost = mm.VOLATILE_WRITE
@@ -22,243 +61,409 @@ class Memory:
         self.nonvolatile_write_cost = mm.NONVOLATILE_WRITE
         self.nonvolatile_memory_size = mm.NONVOLATILE_MEMORY_SIZE
 
-        # Initialize counters for reads and writes
-        self.volatile_reads = 0
-        self.volatile_writes = 0
-        self.nonvolatile_reads = 0
-        self.nonvolatile_writes = 0
+        # Initialize counters for reads and writes, bulk updates go through the array,
+        # single accesses through a flat view of the same buffer (much cheaper than
+        # indexing the array element by element). The counters are the first kind of
+        # the ledger, the others track bits and transactions (see classes/counters.py)
+        self.ledger = np.zeros(
+            (len(KINDS), len(ROLES), len(LEVELS), len(OPERATIONS)), dtype=np.int64
+        )
+        self.counters = self.ledger[0]
+        self.flat_counters = memoryview(self.ledger).cast("B").cast("q")
+        # with fixed-point data (classes/quantization.py) the work items run on integer
+        # fmaps and filters, accumulate in requantizer.accumulator_bits and requantize
+        # every output. None keeps the float data path
+        self.requantizer = requantizer
+        # activation applied to every output (ReLU unless the epilogue says otherwise),
+        # on fixed-point data it works on the requantized integers. With pooling only
+        # the pooled outputs are stored to FRAM, the pooled fmaps of the last
+        # perform_all_convolutions are in pooled_fmaps
+        self.epilogue = epilogue or Epilogue()
+        self.activation = (
+            self.epilogue.activation
+            if requantizer is None
+            else self.epilogue.activation.scaled(requantizer.output_scale)
+        )
+        self.pooled_fmaps: Optional[np.ndarray] = None
+        # bits of an access of every role, and the energy of every kind of the ledger
+        self.widths = self.role_bits()
+        self.role_widths = self.widths.tolist()
+        self.costs = self.energy_costs()
 
         # Initialize memory usage and memory allocator
         self.volatile_memory_usage = 0
         self.nonvolatile_memory_usage = 0
-        self.volatile_allocator: List[Any] = []
-        self.nonvolatile_allocator: List[Any] = []
+        # allocations are indexed by identity (see allocation_key), so alloc, free
+        # and residency checks are constant time
+        self.volatile_allocator: Dict[Hashable, Allocation] = {}
+        self.nonvolatile_allocator: Dict[Hashable, Allocation] = {}
 
-    def read(self, volatile: bool = False) -> None:
-        if volatile:
-            self.volatile_reads += 1
-        else:
-            self.nonvolatile_reads += 1
+        # engine used to compute the expected outputs the monitored paths are validated against
+        if reference_engine not in CONVOLUTION_ENGINES:
+            raise ValueError(f"Unknown reference engine: {reference_engine}")
+        self.reference_engine_name = reference_engine
+        self.reference_engine = CONVOLUTION_ENGINES[reference_engine]
 
-    def write(self, volatile: bool = False) -> None:
-        if volatile:
-            self.volatile_writes += 1
-        else:
-            self.nonvolatile_writes += 1
+        # generator used to draw power failures
+        self.rng = np.random.default_rng(seed)
+
+        # in fast counting mode the monitored convolutions derive the access counts
+        # in closed form instead of calling read()/write() once per access, the
+        # step-by-step simulation is kept only when power failures can be injected
+        self.fast_counting = fast_counting
+
+        # with a cache the volatile memory is no longer managed by alloc/free: data stays
+        # in FRAM and the monitored loops go through the cache model, so nothing overflows
+        self.cache = cache
+        if cache is not None:
+            self.words_per_line = max(1, cache.line_size // self.config.unit_model.SIZE_OF_FLOAT)
+            # a line fill or write-back moves line_size bytes of the data of the role
+            self.line_elements = {
+                role: max(1, 8 * cache.line_size // int(width))
+                for role, width in zip(ROLES, self.widths)
+            }
+        # simulated address space of the cached loops: every array (the whole array a
+        # view belongs to) gets a line-aligned base the first time it is touched, so set
+        # indices don't depend on where the process heap put it. The arrays are kept
+        # alive so their ids are not reused while they have an address
+        self.address_space: Dict[int, Tuple[Any, int]] = {}
+        self.next_address = 0
+
+        # when the volatile state is saved and at which granularity, the monitored loops
+        # mark the blocks they write so that only those are saved (see classes/checkpoint.py)
+        self.checkpoint_policy = checkpoint_policy or OnFailure()
+        self.dirty_blocks: Dict[Hashable, set] = {}
+        self.macs_since_checkpoint = 0
+
+        # with rollback a power failure loses the work done since the last checkpoint,
+        # which is executed again (and can be interrupted again, up to max_replays times).
+        # committed_counters are the counters at the last checkpoint
+        self.rollback = rollback
+        self.max_replays = max_replays
+        self.progress = ExecutionProgress()
+        self.committed_counters = self.ledger.copy()
+
+        # one record with the counter deltas of every work item of perform_all_convolutions,
+        # kept in memory unless perform_all_convolutions writes them to a file
+        self.records = ResultsSink()
+        # set while a layer of a network writes its outputs into a buffer that stays in
+        # SRAM for the next layer (tools/pipeline.py): nothing is stored to FRAM
+        self.keep_outputs = False
+        # set while the input fmaps of a layer are already in SRAM, left there by the
+        # previous layer: the conv loops only load their kernels
+        self.keep_inputs = False
+
+        # without a power model every MAC draws a failure with POWER_FAILURE_PROBABILITY,
+        # with one (e.g. classes/harvester.py) the distance to the next failure is computed
+        # once and counted down. power_marks are the MACs and energy already reported to it
+        self.power_model = power_model
+        self.macs_to_failure: Optional[float] = None
+        self.power_marks = (0, 0.0)
+
+        # callbacks subscribed to the events of the simulation (see classes/events.py),
+        # the console output is one of them and prints up to the given verbosity
+        self.subscribers: Dict[str, List[Subscription]] = {event: [] for event in EVENTS}
+        ConsoleLogger(verbosity).attach(self)
+
+        # optional recorder of the element touched by every access of the work items
+        # (see classes/trace.py and tools/reuse_distance.py)
+        self.trace = trace
+        if trace is not None:
+            trace.itemsizes = self.widths // 8
+
+    def role_bits(self) -> np.ndarray:
+        # width in bits of the data every role moves: fixed-point fmaps and filters,
+        # biases and partial sums in the accumulator, checkpoints in whole words
+        bits = np.full(len(ROLES), 8 * self.config.unit_model.SIZE_OF_FLOAT)
+        if self.requantizer is not None:
+            bits[[ROLE_INDEX["input"], ROLE_INDEX["filters"]]] = self.requantizer.bits
+            bits[[ROLE_INDEX["biases"], ROLE_INDEX["output"]]] = self.requantizer.accumulator_bits
+        return bits
+
+    def energy_costs(self) -> np.ndarray:
+        # energy per access, per extra bit and per extra transaction of every role,
+        # level and operation. The memory costs are per bit moved, or per access of a
+        # float word (SIZE_OF_FLOAT bytes) in the "word" unit, then accesses to narrower
+        # data cost in proportion to their bits but transfers wider than one access are
+        # charged as that access only, as the benchmarks always counted them.
+        # Every transaction (one per access unless in bursts) has a fixed cost on top
+        mm = self.config.memory_model
+        if mm.COST_UNIT not in ("word", "bit"):
+            raise ValueError(f"Unknown cost unit: {mm.COST_UNIT} (expected word or bit)")
+        bit_costs = np.array(
+            [
+                [self.volatile_read_cost, self.volatile_write_cost],
+                [self.nonvolatile_read_cost, self.nonvolatile_write_cost],
+            ]
+        )
+        if mm.COST_UNIT == "word":
+            bit_costs = bit_costs / (8 * self.config.unit_model.SIZE_OF_FLOAT)
+        transaction_costs = np.array(
+            [mm.VOLATILE_TRANSACTION, mm.NONVOLATILE_TRANSACTION]
+        )[:, None].repeat(len(OPERATIONS), axis=1)
+        costs = np.empty((len(KINDS), len(ROLES), len(LEVELS), len(OPERATIONS)))
+        costs[0] = bit_costs * self.widths[:, None, None] + transaction_costs
+        costs[1] = 0 if mm.COST_UNIT == "word" else bit_costs
+        costs[2] = transaction_costs
+        return costs
+
+    def element_size(self) -> int:
+        # bytes of an fmap or filter element
+        if self.requantizer is None:
+            return self.config.unit_model.SIZE_OF_FLOAT
+        return self.requantizer.bits // 8
+
+    def accumulator_values(self, data: np.ndarray) -> np.ndarray:
+        # fixed-point data is read as wide integers, so products and sums don't overflow
+        return data if self.requantizer is None else data.astype(np.int64)
+
+    def subscribe(self, event: str, callback: Callback, every: int = 1) -> Subscription:
+        subscription = Subscription(event, callback, every)
+        self.subscribers[event].append(subscription)
+        self.bind_access_hooks()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers[subscription.event].remove(subscription)
+        self.bind_access_hooks()
+
+    def emit(self, event: str, **payload: Any) -> None:
+        for subscription in self.subscribers[event]:
+            subscription(self, payload)
+
+    def bind_access_hooks(self) -> None:
+        # read() and write() run once per access, so they only notify when someone is
+        # subscribed: the instance gets the notifying version, otherwise the plain one.
+        # Bulk updates of the closed-form paths go straight to the counters array
+        for event, hooked in (("read", self.hooked_read), ("write", self.hooked_write)):
+            if self.subscribers[event]:
+                setattr(self, event, hooked)
+            else:
+                self.__dict__.pop(event, None)
+
+    def hooked_read(
+        self, volatile: bool = False, count: int = 1, role: str = "other", bits: Optional[int] = None
+    ) -> None:
+        Memory.read(self, volatile, count, role, bits)
+        self.emit("read", volatile=volatile, count=count, role=role)
+
+    def hooked_write(
+        self, volatile: bool = False, count: int = 1, role: str = "other", bits: Optional[int] = None
+    ) -> None:
+        Memory.write(self, volatile, count, role, bits)
+        self.emit("write", volatile=volatile, count=count, role=role)
+
+    def read(
+        self, volatile: bool = False, count: int = 1, role: str = "other", bits: Optional[int] = None
+    ) -> None:
+        # count accesses of bits bits each, by default the width of the role
+        index = ROLE_INDEX[role] * 4 + (0 if volatile else 2)
+        self.flat_counters[index] += count
+        if bits is not None:
+            self.flat_counters[EXTRA_BITS + index] += count * (bits - self.role_widths[index >> 2])
+
+    def write(
+        self, volatile: bool = False, count: int = 1, role: str = "other", bits: Optional[int] = None
+    ) -> None:
+        index = ROLE_INDEX[role] * 4 + (1 if volatile else 3)
+        self.flat_counters[index] += count
+        if bits is not None:
+            self.flat_counters[EXTRA_BITS + index] += count * (bits - self.role_widths[index >> 2])
+
+    def transfer(
+        self,
+        volatile: bool,
+        write: bool,
+        elements: int,
+        role: str = "other",
+        bits: Optional[int] = None,
+        accesses: Optional[int] = None,
+        runs: int = 1,
+    ) -> None:
+        # contiguous transfer of elements elements of bits bits each (the role width by
+        # default), e.g. a line fill, a checkpoint or an output row stored to FRAM,
+        # repeated for runs separate runs (e.g. the rows of a tile).
+        # Every run counts as accesses accesses (one per element by default) and, with
+        # BURST_SIZE, takes one transaction per burst instead of one per element
+        index = ROLE_INDEX[role] * 4 + (0 if volatile else 2) + write
+        width = self.role_widths[index >> 2]
+        bits = width if bits is None else bits
+        accesses = elements if accesses is None else accesses
+        burst = self.config.memory_model.BURST_SIZE
+        transactions = -(-elements * bits // (8 * burst)) if burst else elements
+        self.flat_counters[index] += runs * accesses
+        self.flat_counters[EXTRA_BITS + index] += runs * (elements * bits - accesses * width)
+        self.flat_counters[EXTRA_TRANSACTIONS + index] += runs * (transactions - accesses)
+        event = "write" if write else "read"
+        if self.subscribers[event]:
+            self.emit(event, volatile=volatile, count=runs * accesses, role=role)
+
+    @property
+    def volatile_reads(self) -> int:
+        return int(self.counters[:, 0, 0].sum())
+
+    @property
+    def volatile_writes(self) -> int:
+        return int(self.counters[:, 0, 1].sum())
+
+    @property
+    def nonvolatile_reads(self) -> int:
+        return int(self.counters[:, 1, 0].sum())
+
+    @property
+    def nonvolatile_writes(self) -> int:
+        return int(self.counters[:, 1, 1].sum())
 
     def reset(self) -> None:
-        self.volatile_reads = 0
-        self.volatile_writes = 0
-        self.nonvolatile_reads = 0
-        self.nonvolatile_writes = 0
+        self.ledger[:] = 0
         self.volatile_memory_usage = 0
         self.nonvolatile_memory_usage = 0
+        self.dirty_blocks.clear()
+        self.macs_since_checkpoint = 0
+        self.checkpoint_policy.reset()
+        self.progress.reset()
+        self.committed_counters = self.ledger.copy()
+        self.macs_to_failure = None
+        self.power_marks = (0, 0.0)
+        self.records = ResultsSink()
+        self.address_space.clear()
+        self.next_address = 0
+
+    def simulated_address(self, data: Union[np.ndarray, Dict]) -> int:
+        # address of the first element of data in the simulated address space
+        if isinstance(data, np.ndarray):
+            root = data
+            while isinstance(root.base, np.ndarray):
+                root = root.base
+            offset = data.__array_interface__["data"][0] - root.__array_interface__["data"][0]
+            nbytes = root.nbytes
+        else:
+            root, offset, nbytes = data, 0, sizeof(data, self.config.unit_model)
+        entry = self.address_space.get(id(root))
+        if entry is None:
+            line = self.cache.line_size if self.cache is not None else 1
+            entry = self.address_space[id(root)] = (root, self.next_address)
+            self.next_address += -(-max(1, nbytes) // line) * line
+        return entry[1] + offset
 
     # this method lets us both know what we are allocating and also how much memory we are using
     def update_memory_usage(
         self,
-        data: Union[np.ndarray, List, Dict, Filter, InputFeatureMap],
+        data: Union[Allocation, np.ndarray, List, Dict, Filter, InputFeatureMap],
         adding: bool = True,
         volatile: bool = False,
     ) -> None:
-        if isinstance(data, np.ndarray):
-            size = data.size * data.itemsize
-            if adding:
-                if volatile:
-                    if self.volatile_memory_usage + size > self.volatile_memory_size:
-                        raise ValueError("Volatile memory overflow.")
-                    self.volatile_memory_usage += size
-                else:
-                    if (
-                        self.nonvolatile_memory_usage + size
-                        > self.nonvolatile_memory_size
-                    ):
-                        raise ValueError("Non-volatile memory overflow.")
-                    self.nonvolatile_memory_usage += size
-            else:
-                if volatile:
-                    if size > self.volatile_memory_usage:
-                        raise ValueError(
-                            "Invalid operation: size to remove exceeds volatile memory usage."
-                        )
-                    self.volatile_memory_usage -= size
-                else:
-                    if size > self.nonvolatile_memory_usage:
-                        raise ValueError(
-                            "Invalid operation: size to remove exceeds non-volatile memory usage."
-                        )
-                    self.nonvolatile_memory_usage -= size
-        elif isinstance(data, list):
-            for item in data:
-                self.update_memory_usage(item, adding, volatile)
-        elif isinstance(data, dict):
-            for key, value in data.items():
-                size = um.SIZE_OF_INT if isinstance(key, int) else len(str(key))
-                if adding:
-                    if volatile:
-                        if (
-                            self.volatile_memory_usage + size
-                            > self.volatile_memory_size
-                        ):
-                            raise ValueError("Volatile memory overflow.")
-                        self.volatile_memory_usage += size
-                    else:
-                        if (
-                            self.nonvolatile_memory_usage + size
-                            > self.nonvolatile_memory_size
-                        ):
-                            raise ValueError("Non-volatile memory overflow.")
-                        self.nonvolatile_memory_usage += size
-                else:
-                    if volatile:
-                        if size > self.volatile_memory_usage:
-                            raise ValueError(
-                                "Invalid operation: size to remove exceeds volatile memory usage."
-                            )
-                        self.volatile_memory_usage -= size
-                    else:
-                        if size > self.nonvolatile_memory_usage:
-                            raise ValueError(
-                                "Invalid operation: size to remove exceeds non-volatile memory usage."
-                            )
-                        self.nonvolatile_memory_usage -= size
-
-                if isinstance(value, int):
-                    size = um.SIZE_OF_INT
-                elif isinstance(value, float):
-                    size = um.SIZE_OF_FLOAT
-                elif isinstance(value, Filter):
-                    size = value.kernel.size * um.SIZE_OF_FLOAT
-                elif isinstance(value, InputFeatureMap):
-                    size = value.fmap.size * um.SIZE_OF_FLOAT
-                else:
-                    self.update_memory_usage(value, adding, volatile)
-                    continue
-
-                if adding:
-                    if volatile:
-                        if (
-                            self.volatile_memory_usage + size
-                            > self.volatile_memory_size
-                        ):
-                            raise ValueError("Volatile memory overflow.")
-                        self.volatile_memory_usage += size
-                    else:
-                        if (
-                            self.nonvolatile_memory_usage + size
-                            > self.nonvolatile_memory_size
-                        ):
-                            raise ValueError("Non-volatile memory overflow.")
-                        self.nonvolatile_memory_usage += size
-                else:
-                    if volatile:
-                        if size > self.volatile_memory_usage:
-                            raise ValueError(
-                                "Invalid operation: size to remove exceeds volatile memory usage."
-                            )
-                        self.volatile_memory_usage -= size
-                    else:
-                        if size > self.nonvolatile_memory_usage:
-                            raise ValueError(
-                                "Invalid operation: size to remove exceeds non-volatile memory usage."
-                            )
-                        self.nonvolatile_memory_usage -= size
-        elif isinstance(data, InputFeatureMap):
-            size = data.fmap.size * um.SIZE_OF_FLOAT
-            if adding:
-                if volatile:
-                    if self.volatile_memory_usage + size > self.volatile_memory_size:
-                        raise ValueError("Volatile memory overflow.")
-                    self.volatile_memory_usage += size
-                else:
-                    if (
-                        self.nonvolatile_memory_usage + size
-                        > self.nonvolatile_memory_size
-                    ):
-                        raise ValueError("Non-volatile memory overflow.")
-                    self.nonvolatile_memory_usage += size
+        if volatile and self.cache is not None:
+            # in cache mode residency is decided by the cache, not by the allocator
+            return
+        # handles already carry their size, raw data is measured on the fly
+        size = (
+            data.nbytes
+            if isinstance(data, Allocation)
+            else sizeof(data, self.config.unit_model)
+        )
+        if adding:
+            if volatile:
+                if self.volatile_memory_usage + size > self.volatile_memory_size:
+                    raise ValueError("Volatile memory overflow.")
+                self.volatile_memory_usage += size
             else:
-                if volatile:
-                    if size > self.volatile_memory_usage:
-                        raise ValueError(
-                            "Invalid operation: size to remove exceeds volatile memory usage."
-                        )
-                    self.volatile_memory_usage -= size
-                else:
-                    if size > self.nonvolatile_memory_usage:
-                        raise ValueError(
-                            "Invalid operation: size to remove exceeds non-volatile memory usage."
-                        )
-                    self.nonvolatile_memory_usage -= size
+                if self.nonvolatile_memory_usage + size > self.nonvolatile_memory_size:
+                    raise ValueError("Non-volatile memory overflow.")
+                self.nonvolatile_memory_usage += size
         else:
-            raise ValueError("Unsupported data type for memory update.")
-        print(f"Current volatile memory usage: {self.volatile_memory_usage} bytes")
-        print(
-            f"Current non-volatile memory usage: {self.nonvolatile_memory_usage} bytes"
-        )
+            if volatile:
+                if size > self.volatile_memory_usage:
+                    raise ValueError(
+                        "Invalid operation: size to remove exceeds volatile memory usage."
+                    )
+                self.volatile_memory_usage -= size
+            else:
+                if size > self.nonvolatile_memory_usage:
+                    raise ValueError(
+                        "Invalid operation: size to remove exceeds non-volatile memory usage."
+                    )
+                self.nonvolatile_memory_usage -= size
+        event = "alloc" if adding else "free"
+        if self.subscribers[event]:
+            self.emit(
+                event,
+                nbytes=size,
+                volatile=volatile,
+                volatile_usage=self.volatile_memory_usage,
+                nonvolatile_usage=self.nonvolatile_memory_usage,
+            )
 
     def alloc(
         self,
         data: Union[np.ndarray, List, Dict, Filter, InputFeatureMap],
         volatile: bool = False,
-    ) -> None:
-        if volatile:
-            self.volatile_allocator.append(data)
-        else:
-            self.nonvolatile_allocator.append(data)
-        self.update_memory_usage(data, adding=True, volatile=volatile)
+    ) -> Allocation:
+        handle = Allocation(data, volatile, self.config.unit_model)
+        allocator = self.volatile_allocator if volatile else self.nonvolatile_allocator
+        if handle.key in allocator:
+            raise ValueError("Data is already allocated in this memory.")
+        self.update_memory_usage(handle, adding=True, volatile=volatile)
+        allocator[handle.key] = handle
+        return handle
 
     def free(
         self,
-        data: Union[np.ndarray, List, Dict, Filter, InputFeatureMap],
+        data: Union[Allocation, np.ndarray, List, Dict, Filter, InputFeatureMap],
         volatile: bool = False,
     ) -> None:
+        key = data.key if isinstance(data, Allocation) else allocation_key(data)
+        allocator = self.volatile_allocator if volatile else self.nonvolatile_allocator
+        handle = allocator.pop(key, None)
+        if handle is None:
+            raise ValueError("Data is not allocated in this memory.")
         if volatile:
-            if isinstance(data, np.ndarray):
-                for el in self.volatile_allocator:
-                    if isinstance(el, np.ndarray) and np.array_equal(el, data):
-                        self.volatile_allocator.remove(el)
-                        break  # Break after removing to avoid modifying the list during iteration
-            else:
-                self.volatile_allocator.remove(data)
-        else:
-            if isinstance(data, np.ndarray):
-                for el in self.nonvolatile_allocator:
-                    if isinstance(el, np.ndarray) and np.array_equal(el, data):
-                        self.nonvolatile_allocator.remove(el)
-                        break  # Break after removing to avoid modifying the list during iteration
-            else:
-                self.nonvolatile_allocator.remove(data)
-        self.update_memory_usage(data, adding=False, volatile=volatile)
+            self.dirty_blocks.pop(key, None)
+        self.update_memory_usage(handle, adding=False, volatile=volatile)
 
     def check_if_volatile(
-        self, data: Union[np.ndarray, List, Dict, Filter, InputFeatureMap]
+        self, data: Union[Allocation, np.ndarray, List, Dict, Filter, InputFeatureMap]
     ) -> bool:
-        def compare_data(item, data):
-            if isinstance(item, np.ndarray) and isinstance(data, np.ndarray):
-                return np.array_equal(item, data)
-            elif isinstance(item, list) and isinstance(data, list):
-                return all(compare_data(i, d) for i, d in zip(item, data)) and len(
-                    item
-                ) == len(data)
-            elif isinstance(item, dict) and isinstance(data, dict):
-                return all(
-                    key in item and compare_data(item[key], data[key]) for key in data
-                ) and len(item) == len(data)
-            elif isinstance(item, Filter) and isinstance(data, Filter):
-                return compare_data(item.kernel, data.kernel)
-            elif isinstance(item, InputFeatureMap) and isinstance(
-                data, InputFeatureMap
-            ):
-                return compare_data(item.fmap, data.fmap)
-            else:
-                return item == data
+        key = data.key if isinstance(data, Allocation) else allocation_key(data)
+        return key in self.volatile_allocator
 
-        for item in self.volatile_allocator:
-            if type(data) == type(item):
-                if compare_data(item, data):
-                    return True
-        return False
+    def get_counters(self) -> Tuple[int, int, int, int]:
+        # volatile reads, volatile writes, non-volatile reads, non-volatile writes
+        return tuple(int(count) for count in self.counters.sum(axis=0).ravel())
+
+    def get_access_breakdown(self) -> Dict[str, Dict[str, int]]:
+        # role -> counters of that role
+        return {
+            role: {
+                f"{'' if level == 'volatile' else 'non'}volatile_{operation}s": int(
+                    self.counters[r, l, o]
+                )
+                for l, level in enumerate(LEVELS)
+                for o, operation in enumerate(OPERATIONS)
+            }
+            for r, role in enumerate(ROLES)
+        }
+
+    def get_energy_by_role(self) -> Dict[str, float]:
+        return self.snapshot().get_energy_by_role()
+
+    def get_energy_by_level(self) -> Dict[str, float]:
+        return self.snapshot().get_energy_by_level()
+
+    def snapshot(self) -> CounterSnapshot:
+        # copy of the counters, subtract two snapshots to get the accesses in between
+        return CounterSnapshot(self.ledger.copy(), self.costs, self.widths)
+
+    def get_cache_statistics(self) -> Dict[str, float]:
+        if self.cache is None:
+            raise ValueError("Memory is not running in cache mode.")
+        return self.cache.get_statistics()
+
+    def get_checkpoint_statistics(self) -> Dict[str, float]:
+        return self.checkpoint_policy.get_statistics(*self.costs[0, ROLE_INDEX["checkpoint"]].ravel())
+
+    def get_progress_statistics(self) -> Dict[str, float]:
+        return self.progress.get_statistics(self.get_total_energy_cost(), self.costs)
 
     def get_volatile_memory_accesses(self) -> int:
         return self.volatile_reads + self.volatile_writes
@@ -272,46 +477,390 @@ class Memory:
         )
 
     def get_volatile_energy_cost(self) -> int:
-        return (self.volatile_reads * self.volatile_read_cost) + (
-            self.volatile_writes * self.volatile_write_cost
-        )
+        return self.get_energy_by_level()["volatile"]
 
     def get_nonvolatile_energy_cost(self) -> int:
-        return (self.nonvolatile_reads * self.nonvolatile_read_cost) + (
-            self.nonvolatile_writes * self.nonvolatile_write_cost
-        )
+        return self.get_energy_by_level()["nonvolatile"]
 
     def get_total_energy_cost(self) -> float:
         return self.get_volatile_energy_cost() + self.get_nonvolatile_energy_cost()
 
+    def can_count_in_closed_form(self, nonVolatile: bool) -> bool:
+        # closed form counting is exact only if no power failure can happen,
+        # otherwise checkpoints have to be injected step by step
+        probability = 0 if nonVolatile else self.config.energy_model.POWER_FAILURE_PROBABILITY
+        if self.cache is not None and not nonVolatile:
+            # hits and misses depend on the access order
+            return False
+        if self.checkpoint_policy.counts_macs and not nonVolatile:
+            return False
+        if self.power_model is not None and not nonVolatile:
+            return False
+        return self.fast_counting and probability == 0
+
+    def cached_access(self, address: int, write: bool = False, role: str = "other") -> None:
+        # one access through the cache: a miss fills the line from FRAM, a dirty
+        # eviction writes the victim back, write-through also updates FRAM every time.
+        # Line transfers are charged to the role of the access that caused them
+        hit, dirty_eviction = self.cache.access(address, write)
+        elements = self.line_elements[role]
+        if dirty_eviction:
+            self.transfer(True, False, elements, role)
+            self.transfer(False, True, elements, role)
+        if not hit:
+            self.transfer(False, False, elements, role)
+            self.transfer(True, True, elements, role)
+        if write:
+            self.write(volatile=True, role=role)
+            if not self.cache.write_back:
+                self.write(volatile=False, role=role)
+        else:
+            self.read(volatile=True, role=role)
+
+    def flush_cache(self, invalidate: bool = False, role: str = "output") -> None:
+        # write every dirty line back to FRAM
+        dirty_lines = self.cache.flush(invalidate)
+        self.transfer(True, False, self.line_elements[role], role, runs=dirty_lines)
+        self.transfer(False, True, self.line_elements[role], role, runs=dirty_lines)
+
+    def validate_convolution(
+        self,
+        outputFmaps: List[Any],
+        inputFmaps: List[InputFeatureMap],
+        filters: Dict[int, Filter],
+        biases: Dict[int, float],
+        P: int,
+        Q: int,
+        n: Optional[int] = None,
+        m: Optional[int] = None,
+        channels: Optional[List[int]] = None,
+        exact: bool = True,
+    ) -> None:
+        # compare what the monitored path produced with the reference engine,
+        # n and m restrict the check to a single output fmap (one-by-one path).
+        # exact=False allows the rounding of another summation order over the channels
+        fs, ifs = self.config.filter_size, self.config.input_fmap_size
+        if self.requantizer is not None:
+            expected = quantized_convolution(
+                np.zeros((ifs.N, fs.M, P, Q), dtype=np.int64), inputFmaps, filters, biases,
+                P, Q, channels, config=self.config, requantizer=self.requantizer,
+                activation=self.activation,
+            )
+        else:
+            expected = self.reference_engine(
+                np.zeros((ifs.N, fs.M, P, Q)), inputFmaps, filters, biases, P, Q, channels,
+                config=self.config, activation=self.activation,
+            )
+        ns = range(ifs.N) if n is None else [n]
+        ms = range(fs.M) if m is None else [m]
+        for n in ns:
+            for m in ms:
+                output = np.asarray(outputFmaps[n][m])[:P, :Q]
+                same = (
+                    np.array_equal(output, expected[n][m])
+                    if exact
+                    else np.allclose(output, expected[n][m])
+                )
+                if not same:
+                    raise ValueError(
+                        f"Monitored convolution differs from the reference engine for fmap {n}, filter {m}."
+                    )
+
+    def compute_outputs(
+        self,
+        outputFmaps: List[Any],
+        inputFmaps: List[InputFeatureMap],
+        filters: Dict[int, Filter],
+        biases: Dict[int, float],
+        P: int,
+        Q: int,
+    ) -> List[Any]:
+        # output values of the closed-form whole-layer paths, in the data type of memory
+        if self.requantizer is not None:
+            return quantized_convolution(
+                outputFmaps, inputFmaps, filters, biases, P, Q, config=self.config,
+                requantizer=self.requantizer, activation=self.activation,
+            )
+        return CONVOLUTION_ENGINES["vectorized"](
+            outputFmaps, inputFmaps, filters, biases, P, Q, config=self.config,
+            activation=self.activation,
+        )
+
+    def convolve_arrays(
+        self,
+        fmaps: np.ndarray,
+        kernels: np.ndarray,
+        bias: float,
+        P: int,
+        Q: int,
+        channels: Optional[List[int]] = None,
+        initial: Optional[np.ndarray] = None,
+        activate: bool = True,
+    ) -> np.ndarray:
+        # output values of the closed-form paths, single filter with the given bias.
+        # On floats the sums can continue from initial and stop before the activation
+        # (channel accumulation, see perform_all_convolutions)
+        if self.requantizer is None:
+            return convolve_arrays(
+                fmaps, kernels, np.array([bias], dtype=np.float64), P, Q, channels,
+                stride=self.config.stride,
+                activation=self.activation if activate else IDENTITY, initial=initial,
+            )
+        return quantized_convolve_arrays(
+            fmaps, kernels, np.array([bias], dtype=np.int64), P, Q, self.requantizer,
+            channels, self.config.stride, self.activation,
+        )
+
+    def count_output_accesses(
+        self, outputs: int, volatile: bool, taps: Optional[int] = None, first: bool = True
+    ) -> None:
+        # accesses of the monitored loops for outputs output elements of one channel,
+        # in bulk: per output the bias read, the partial sum initialisation and the
+        # activation, per MAC an input, a filter and a partial sum read and a partial sum write.
+        # taps is the number of MACs per output, R * S by default. Unless first, every
+        # output starts from its partial sum of the previous channels instead of the bias
+        if taps is None:
+            taps = self.config.filter_size.R * self.config.filter_size.S
+        macs = outputs * taps
+        level = 0 if volatile else 1
+        accesses = np.zeros_like(self.counters)
+        accesses[ROLE_INDEX["input"], level, 0] = macs
+        accesses[ROLE_INDEX["filters"], level, 0] = macs
+        accesses[ROLE_INDEX["output"], level, 0] = macs + outputs
+        accesses[ROLE_INDEX["biases" if first else "output"], level, 0] += outputs
+        accesses[ROLE_INDEX["output"], level, 1] = macs + 2 * outputs
+        self.counters += accesses
+
+    def store_outputs(self, outputs: int, runs: int = 1) -> None:
+        # outputs consecutive output elements saved to FRAM (runs times), in the
+        # storage type of the outputs: one access per element, or per burst with
+        # BURST_SIZE, so a store costs what it moves in the word unit too
+        if self.keep_outputs:
+            return
+        bits = 8 * self.element_size()
+        burst = self.config.memory_model.BURST_SIZE
+        accesses = -(-outputs * bits // (8 * burst)) if burst else outputs
+        self.transfer(False, True, outputs, "output", bits, accesses=accesses, runs=runs)
+
+    def load_operands(self, rows: int, columns: int, volatile: bool) -> None:
+        # the kernel channel and a rows x columns input (a tile with its halo, or the
+        # whole fmap) copied from FRAM into SRAM before they are convolved, one run
+        # per input row. Nothing moves when the loops work on FRAM directly, and only
+        # the kernel when the inputs are resident (keep_inputs)
+        if not volatile:
+            return
+        fs = self.config.filter_size
+        loads = [("filters", fs.S, fs.R)]
+        if not self.keep_inputs:
+            loads.append(("input", columns, rows))
+        for role, elements, runs in loads:
+            self.transfer(False, False, elements, role, runs=runs)
+            self.transfer(True, True, elements, role, runs=runs)
+
+    def load_partial_sums(self, rows: int, columns: int, volatile: bool) -> None:
+        # rows x columns partial sums of the previous channels copied back from FRAM
+        # into SRAM, one run per row, unless the outputs never left SRAM
+        if not volatile or self.keep_outputs:
+            return
+        bits = 8 * self.element_size()
+        self.transfer(False, False, columns, "output", bits, runs=rows)
+        self.transfer(True, True, columns, "output", bits, runs=rows)
+
+    def store_output_block(
+        self, rows: int, width: int, volatile: bool, row_by_row: bool = False
+    ) -> None:
+        # rows x width finished outputs leave SRAM through the epilogue: with pooling
+        # every window is read back and its result written once, and only the pooled
+        # outputs are stored to FRAM. Row by row (tiled paths) is one store per row,
+        # otherwise the whole block is stored at once
+        pooling = self.epilogue.pooling
+        if pooling is not None:
+            rows, width = pooling.output_size(rows, width)
+            self.read(volatile=volatile, count=rows * width * pooling.size**2, role="output")
+            self.write(volatile=volatile, count=rows * width, role="output")
+        if row_by_row:
+            self.store_outputs(width, runs=rows)
+        else:
+            self.store_outputs(rows * width)
+
+    def mark_dirty(self, key: Hashable, element: int, itemsize: int) -> None:
+        # element (flat index, elements of itemsize bytes) of the volatile object key
+        # has been written
+        block = element * itemsize // self.checkpoint_policy.block_size
+        self.dirty_blocks.setdefault(key, set()).add(block)
+
     def power_failure(self, nonVolatile: bool) -> None:
-        # Power failure policy : If it happens, save the volatile memory to non-volatile memory and restore it back
-        # generate a random number, if it is less than constant, we perform a power failure
-        probability = 0 if nonVolatile else em.POWER_FAILURE_PROBABILITY
-        if np.random.rand() < probability:
-            # Create a backup of the volatile allocator
-            self.checkpoint()
+        # called before every MAC: gives the checkpoint policy a chance to save the state,
+        # then draws the power failure. When it happens the supply first raises the
+        # low-energy signal, then the volatile memory is lost and restored from FRAM
+        probability = 0 if nonVolatile else self.config.energy_model.POWER_FAILURE_PROBABILITY
+        policy = self.checkpoint_policy
+        self.progress.macs += 1
+        self.macs_since_checkpoint += 1
+        if not nonVolatile and policy.on_mac(self.macs_since_checkpoint):
+            self.save_checkpoint()
+        if self.power_model is None:
+            # generate a random number, if it is less than constant, we perform a power failure
+            failure = self.rng.random() < probability
+        else:
+            failure = not nonVolatile and self.count_down_to_failure()
+        if failure:
+            self.progress.failures += 1
+            self.low_energy_signal()
+            if policy.on_failure():
+                self.save_checkpoint()
+            # what was computed after the last checkpoint is gone with the volatile memory
+            lost_macs = self.macs_since_checkpoint
+            lost_accesses = self.ledger - self.committed_counters
+            self.restore_checkpoint()
+            if self.subscribers["power_failure"]:
+                self.emit("power_failure", lost_macs=lost_macs, failures=self.progress.failures)
+            if self.rollback and lost_macs > 0:
+                self.replay(lost_macs, lost_accesses, probability)
             return True
         return False
 
-    def checkpoint(self) -> None:
-        backup_volatile_allocator = list(self.volatile_allocator)
+    def replay(
+        self,
+        lost_macs: int,
+        lost_accesses: np.ndarray,
+        probability: float,
+    ) -> None:
+        # execute again the lost_macs MACs since the last checkpoint, charging the same
+        # accesses they cost the first time. The number of MACs before the next failure
+        # is geometric, if it comes before the end the partial replay is lost as well
+        self.progress.lost_macs += lost_macs
+        self.progress.waste(lost_accesses)
+        for _ in range(self.max_replays):
+            self.progress.replays += 1
+            survived = self.macs_until_failure(probability) - 1
+            done = min(survived, lost_macs)
+            # every role is replayed in proportion
+            accesses = lost_accesses * done // lost_macs
+            self.ledger += accesses
+            self.progress.replayed_macs += done
+            if survived >= lost_macs:
+                # back at the point of the failure, with the same work still uncommitted
+                self.macs_since_checkpoint = lost_macs
+                self.committed_counters = self.ledger - lost_accesses
+                self.macs_to_failure = None
+                return
+            self.progress.failures += 1
+            self.progress.lost_macs += done
+            self.progress.waste(accesses)
+            if self.power_model is not None:
+                self.update_power_model()
+                self.power_model.power_failure()
+            self.restore_checkpoint()
+        raise RuntimeError(
+            f"No forward progress: {self.max_replays} replays of {lost_macs} MACs were interrupted."
+        )
 
-        for data in backup_volatile_allocator:
-            self.free(data, volatile=True)
+    def energy_per_mac(self) -> float:
+        # average energy of a MAC so far, used by the power model to look ahead
+        executed = self.progress.macs + self.progress.replayed_macs
+        if executed == 0:
+            reads = self.costs[0, [ROLE_INDEX["input"], ROLE_INDEX["filters"], ROLE_INDEX["output"]], 0, 0]
+            return reads.sum() + self.costs[0, ROLE_INDEX["output"], 0, 1]
+        return self.get_total_energy_cost() / executed
 
-        # Write the backup data to non-volatile memory and then read it back
-        for data in backup_volatile_allocator:
-            self.read(volatile=True)  # Reading from volatile memory the value that I have to save
-            self.write(volatile=False)  # Writing to non-volatile memory
-            self.read(volatile=False)  # Reading from non-volatile memory
+    def update_power_model(self) -> None:
+        # report to the power model the MACs executed and the energy spent since last time
+        macs = self.progress.macs + self.progress.replayed_macs
+        energy = self.get_total_energy_cost()
+        self.power_model.advance(macs - self.power_marks[0], energy - self.power_marks[1])
+        self.power_marks = (macs, energy)
 
-            # Re-allocate the data back to volatile memory
+    def macs_until_failure(self, probability: float) -> float:
+        # MAC on which the next failure happens, 1 being the next one
+        if self.power_model is None:
+            return int(self.rng.geometric(probability)) if probability > 0 else np.inf
+        self.update_power_model()
+        return self.power_model.macs_to_failure(self.energy_per_mac(), self.rng)
 
-            self.alloc(data, volatile=True)
-        print(
-            "Power failure occurred. Data has been restored from non-volatile memory."
-        )
+    def count_down_to_failure(self) -> bool:
+        if self.macs_to_failure is None:
+            self.macs_to_failure = self.macs_until_failure(0)
+        self.macs_to_failure -= 1
+        if self.macs_to_failure > 0:
+            return False
+        # the stored energy is gone, the device waits for power to come back
+        self.update_power_model()
+        self.power_model.power_failure()
+        self.macs_to_failure = None
+        return True
+
+    def get_power_statistics(self) -> Dict[str, float]:
+        if self.power_model is None:
+            raise ValueError("Memory has no power model.")
+        return self.power_model.get_statistics()
+
+    def low_energy_signal(self) -> None:
+        if self.checkpoint_policy.on_low_energy():
+            self.save_checkpoint()
+
+    def save_checkpoint(self) -> None:
+        # write the volatile state to FRAM: the dirty blocks, or every object as a whole
+        # when the policy has no block size
+        policy = self.checkpoint_policy
+        policy.checkpoints += 1
+        self.macs_since_checkpoint = 0
+        if self.cache is not None:
+            # the cache already knows which lines are dirty
+            lines = self.cache.flush()
+            words = lines * self.words_per_line
+            policy.blocks_written += lines
+        elif policy.block_size is None:
+            words = self.resident_words()
+            policy.blocks_written += len(self.volatile_allocator)
+        else:
+            blocks_per_key = {
+                handle.key: -(-handle.nbytes // policy.block_size)
+                for handle in self.volatile_allocator.values()
+            }
+            written = sum(len(blocks) for blocks in self.dirty_blocks.values())
+            for key, blocks in self.dirty_blocks.items():
+                blocks_per_key.setdefault(key, len(blocks))
+            words = written * max(1, policy.block_size // self.config.unit_model.SIZE_OF_FLOAT)
+            policy.blocks_written += written
+            policy.blocks_skipped += sum(blocks_per_key.values()) - written
+            self.dirty_blocks.clear()
+        self.transfer(True, False, words, "checkpoint")  # Reading from volatile memory the value that I have to save
+        self.transfer(False, True, words, "checkpoint")  # Writing to non-volatile memory
+        policy.record(volatile_reads=words, nonvolatile_writes=words)
+        self.committed_counters = self.ledger.copy()
+        if self.subscribers["checkpoint"]:
+            self.emit("checkpoint", words=words)
+
+    def restore_checkpoint(self) -> None:
+        # the volatile memory is empty after a failure, read back from FRAM what was resident
+        policy = self.checkpoint_policy
+        policy.restores += 1
+        self.macs_since_checkpoint = 0
+        if self.cache is not None:
+            # lines are fetched again on demand, unsaved dirty lines are lost
+            self.cache.invalidate()
+            words = 0
+        else:
+            # whole objects or dirty blocks, everything that was resident comes back
+            words = self.resident_words()
+            self.transfer(False, False, words, "checkpoint")
+            self.transfer(True, True, words, "checkpoint")
+            policy.record(volatile_writes=words, nonvolatile_reads=words)
+            self.dirty_blocks.clear()
+        if self.subscribers["restore"]:
+            self.emit("restore", words=words)
+
+    def resident_words(self) -> int:
+        # checkpoint words (SIZE_OF_FLOAT bytes, the unit of the block path) of
+        # everything in the volatile allocator
+        word = self.config.unit_model.SIZE_OF_FLOAT
+        return sum(-(-handle.nbytes // word) for handle in self.volatile_allocator.values())
+
+    def checkpoint(self) -> None:
+        # save and restore around a power failure
+        self.save_checkpoint()
+        self.restore_checkpoint()
 
     def monitor_convolution(
         self,
@@ -321,8 +870,11 @@ class Memory:
         biases: Dict[int, float],
         P: int,
         Q: int,
+        validate: bool = False,
     ) -> None:
         # self.reset()  # Reset the operation counters before starting the convolution
+        fs, ifs = self.config.filter_size, self.config.input_fmap_size
+        stride = self.config.stride
 
         # Define the monitored convolution function
         def monitored_convolution(
@@ -346,9 +898,9 @@ class Memory:
                             # Load the bias value for the current filter
                             output_value = biases[m]  # No additional load/store
                             self.read(
-                                volatile=volatile_biases
+                                volatile=volatile_biases, role="biases"
                             )  # Track the memory read operation
-                            self.write(volatile=volatile_biases)
+                            self.write(volatile=volatile_biases, role="output")
                             # Perform the convolution operation
                             for i in range(fs.R):
                                 for j in range(fs.S):
@@ -364,13 +916,13 @@ class Memory:
                                         input_value = inputFmaps[n].fmap[k][
                                             x * stride + i
                                         ][y * stride + j]
-                                        self.read(volatile=volatile_input_fmap)
+                                        self.read(volatile=volatile_input_fmap, role="input")
                                         # Load the filter kernel value
                                         filter_value = filters[m].kernel[k][i][
                                             j
                                         ]  # 1 load
                                         self.read(
-                                            volatile=volatile_filters
+                                            volatile=volatile_filters, role="filters"
                                         )  # Track the memory read operation
                                         # Multiply input and filter values
                                         product = (
@@ -379,21 +931,20 @@ class Memory:
                                         # Accumulate the result
                                         output_value += product  # 1 load (for output_value) + 1 store (for output_value)
                                         self.read(
-                                            volatile=volatile_output_fmap
+                                            volatile=volatile_output_fmap, role="output"
                                         )  # read output value from memory
                                         self.write(
-                                            volatile=volatile_output_fmap
+                                            volatile=volatile_output_fmap, role="output"
                                         )  # update output value to memory
 
-                            # Apply activation function (ReLU)
+                            # Apply activation function (ReLU by default)
                             self.read(
-                                volatile=volatile_output_fmap
+                                volatile=volatile_output_fmap, role="output"
                             )  # we have to read the output value
-                            if output_value < 0:
-                                output_value = 0
+                            output_value = self.activation(output_value)
                             outputFmaps[n][m][x][y] = output_value
                             self.write(
-                                volatile=volatile_output_fmap
+                                volatile=volatile_output_fmap, role="output"
                             )  # Track the memory write operation as store
             # print("Number of iterations: ", number_of_iterations, " Total failures: ", total_failures)
             return outputFmaps
@@ -409,42 +960,108 @@ class Memory:
         volatile_output_fmap = (
             True  # for now we assume to always save everything into Volatile!
         )
-        result = monitored_convolution(
-            outputFmaps,
-            inputFmaps,
-            filters,
-            biases,
-            P,
-            Q,
-            volatile_filters,
-            volatile_input_fmap,
-            volatile_biases,
-            volatile_output_fmap,
-        )
-        volatile_energy_cost = self.get_volatile_energy_cost()
-        nonvolatile_energy_cost = self.get_nonvolatile_energy_cost()
-        volatile_memory_accesses = self.get_volatile_memory_accesses()
-        nonvolatile_memory_accesses = self.get_nonvolatile_memory_accesses()
-        total_energy_cost = self.get_total_energy_cost()
-        total_memory_accesses = self.get_total_memory_accesses()
-        print(
-            "Total energy cost: ",
-            total_energy_cost,
-            " In volatile : ",
-            volatile_energy_cost,
-            " In non-volatile : ",
-            nonvolatile_energy_cost,
-        )
-        print(
-            "Total memory accesses: ",
-            total_memory_accesses,
-            " In volatile : ",
-            volatile_memory_accesses,
-            " In non-volatile : ",
-            nonvolatile_memory_accesses,
-        )
+        if self.can_count_in_closed_form(True):
+            NMPQ = ifs.N * fs.M * P * Q
+            RSC = fs.R * fs.S * fs.C
+            # bias load
+            self.read(volatile=volatile_biases, count=NMPQ, role="biases")
+            self.write(volatile=volatile_biases, count=NMPQ, role="output")
+            # inner loop
+            self.read(volatile=volatile_input_fmap, count=NMPQ * RSC, role="input")
+            self.read(volatile=volatile_filters, count=NMPQ * RSC, role="filters")
+            self.read(volatile=volatile_output_fmap, count=NMPQ * RSC, role="output")
+            self.write(volatile=volatile_output_fmap, count=NMPQ * RSC, role="output")
+            # activation function
+            self.read(volatile=volatile_output_fmap, count=NMPQ, role="output")
+            self.write(volatile=volatile_output_fmap, count=NMPQ, role="output")
+            self.progress.macs += NMPQ * RSC
+            result = self.compute_outputs(outputFmaps, inputFmaps, filters, biases, P, Q)
+        else:
+            result = monitored_convolution(
+                outputFmaps,
+                inputFmaps,
+                filters,
+                biases,
+                P,
+                Q,
+                volatile_filters,
+                volatile_input_fmap,
+                volatile_biases,
+                volatile_output_fmap,
+            )
+        self.progress.completed_outputs += ifs.N * fs.M * P * Q
+        if validate:
+            self.validate_convolution(result, inputFmaps, filters, biases, P, Q)
+        if self.subscribers["summary"]:
+            self.emit("summary")
         return result
 
+    def monitor_schedule(
+        self,
+        outputFmaps: List[Any],
+        inputFmaps: List[InputFeatureMap],
+        filters: Dict[int, Filter],
+        biases: Dict[int, float],
+        P: int,
+        Q: int,
+        schedule: Schedule,
+    ) -> Dict[str, Dict[str, int]]:
+        # count the accesses of the whole layer under the given dataflow schedule,
+        # the output values do not depend on the schedule so numpy computes them,
+        # fixed-point data is sized with its own element widths
+        itemsizes = {role: self.role_widths[ROLE_INDEX[role]] // 8 for role in TENSOR_LOOPS}
+        counts = schedule.count_accesses(P, Q, self.config, itemsizes)
+        footprint = sum(tensor["tile_bytes"] for tensor in counts.values())
+        if self.volatile_memory_usage + footprint > self.volatile_memory_size:
+            raise ValueError("Volatile memory overflow.")
+        for role, tensor in counts.items():
+            self.read(volatile=True, count=tensor["sram_reads"], role=role)
+            self.write(volatile=True, count=tensor["sram_writes"], role=role)
+            self.read(volatile=False, count=tensor["nvm_reads"], role=role)
+            self.write(volatile=False, count=tensor["nvm_writes"], role=role)
+        self.compute_outputs(outputFmaps, inputFmaps, filters, biases, P, Q)
+        fs, ifs = self.config.filter_size, self.config.input_fmap_size
+        self.progress.macs += ifs.N * fs.M * fs.C * P * Q * fs.R * fs.S
+        self.progress.completed_outputs += ifs.N * fs.M * P * Q
+
+        if self.subscribers["summary"]:
+            self.emit("summary", schedule=schedule.name, footprint=footprint, counts=counts)
+        return counts
+
+    def monitor_pooling(
+        self, fmaps: np.ndarray, size: int, stride: int, mode: str = "max"
+    ) -> np.ndarray:
+        # size x size pooling of every channel of fmaps (N x C x H x W) staged in SRAM:
+        # per output size * size input reads and one output write, then every output
+        # fmap is stored to FRAM (unless keep_outputs)
+        N, C, H, W = fmaps.shape
+        P = (H - size) // stride + 1
+        Q = (W - size) // stride + 1
+        windows = np.lib.stride_tricks.sliding_window_view(fmaps, (size, size), axis=(2, 3))
+        windows = windows[:, :, ::stride, ::stride][:, :, :P, :Q]
+        if mode == "max":
+            pooled = windows.max(axis=(4, 5))
+        elif mode == "avg":
+            pooled = windows.mean(axis=(4, 5))
+        else:
+            raise ValueError(f"Unknown pooling mode: {mode}")
+        outputs = N * C * P * Q
+        self.read(volatile=True, count=outputs * size * size, role="input")
+        self.write(volatile=True, count=outputs, role="output")
+        self.store_outputs(P * Q, runs=N * C)
+        self.progress.completed_outputs += outputs
+        return pooled
+
+    def monitor_activation(self, fmaps: np.ndarray) -> np.ndarray:
+        # activation of every element of fmaps staged in SRAM as a pass of its own (the
+        # conv loops already apply it to their outputs): one read and one write per element
+        N, C, H, W = fmaps.shape
+        self.read(volatile=True, count=fmaps.size, role="input")
+        self.write(volatile=True, count=fmaps.size, role="output")
+        self.store_outputs(H * W, runs=N * C)
+        self.progress.completed_outputs += fmaps.size
+        return self.activation(fmaps)
+
     # in this version of the monitor we will perform the convolution one by one
     def perform_all_convolutions(
         self,
@@ -456,38 +1073,151 @@ class Memory:
         Q: int,
         tiling: bool,
         all_nonvolatile: bool,
+        validate: bool = False,
+        tile_shape: Optional[Tuple[int, int]] = None,
+        workers: int = 1,
+        seed: Optional[int] = None,
+        record: bool = True,
+        accumulate_channels: bool = False,
     ) -> None:
-        # wipe the content of the file
+        fs, ifs = self.config.filter_size, self.config.input_fmap_size
+        # tile_shape is the output tile (height, width) of the tiled path,
+        # if it is not given the autotuner picks the one with the lowest energy.
+        # workers > 1 fans the work items out to a process pool, the merged
+        # counters and benchmark records are the same as a serial run with the same seed.
+        # record=False skips the benchmark file (sweeps only need the totals).
+        # accumulate_channels runs the convolution of a network layer: one pass over the
+        # C channels per output fmap, channel c of the kernels over channel c of the
+        # input, with the partial sums kept in the output and activated after the last
         file = (
-            "data/benchmarks_all_nonvolatile.txt"
+            "data/benchmarks_all_nonvolatile.csv"
             if all_nonvolatile
-            else "data/benchmarks.txt" if not tiling else "data/benchmarks_tiling.txt"
+            else "data/benchmarks.csv" if not tiling else "data/benchmarks_tiling.csv"
         )
         if tiling and all_nonvolatile:
             raise ValueError(
                 "You can't have tiling and all nonvolatile at the same time"
             )
-        with open(file, "w") as f:
-            f.close()
-        for n in range(ifs.N):
-            for m in range(fs.M):
-                # Perform the monitored convolution for each channel
-                for k in range(fs.C):
-                    for channel in range(fs.C):
-                        self.monitor_convolution_one_by_one(
-                            outputFmaps,
-                            inputFmaps,
-                            filters,
-                            biases,
-                            P,
-                            Q,
-                            n,
-                            m,
-                            k,
-                            channel,
-                            tiling,
-                            all_nonvolatile,
-                        )
+        if record:
+            # the records of this run replace the previous file, written in bulk
+            self.records = ResultsSink(file)
+        # every work item draws its power failures from its own generator, so the
+        # result for a given seed does not depend on how items are spread over workers
+        if seed is None:
+            seed = int(self.rng.integers(2**63))
+        if accumulate_channels:
+            if self.requantizer is not None or self.epilogue.pooling is not None:
+                raise ValueError("Channel accumulation needs float outputs without pooling.")
+            if self.cache is not None or self.trace is not None or workers > 1:
+                raise ValueError(
+                    "Channel accumulation needs the uncached, untraced, serial conv loops."
+                )
+            work_items = [
+                (n, m, c, c) for n in range(ifs.N) for m in range(fs.M) for c in range(fs.C)
+            ]
+        else:
+            work_items = [
+                (n, m, k, channel)
+                for n in range(ifs.N)
+                for m in range(fs.M)
+                for k in range(fs.C)
+                for channel in range(fs.C)
+            ]
+        seeds = np.random.SeedSequence(seed).spawn(len(work_items))
+        pooling = self.epilogue.pooling
+        if pooling is not None:
+            if self.cache is not None or self.trace is not None:
+                raise ValueError("Pooling epilogues need the uncached, untraced conv loops.")
+            explicit = tiling and tile_shape is not None
+            if explicit and tuple(tile_shape) != self.epilogue.align(tile_shape):
+                raise ValueError(
+                    f"Tile shape {tuple(tile_shape)} does not hold whole {pooling} windows."
+                )
+        if workers > 1 and self.cache is not None:
+            # hits depend on what the previous work items left in the cache
+            raise ValueError("Cache mode cannot be split over parallel workers.")
+        if workers > 1 and self.trace is not None:
+            raise ValueError("Traced runs cannot be split over parallel workers.")
+        if workers > 1 and self.power_model is not None and self.power_model.stateful:
+            raise ValueError("Stateful power models cannot be split over parallel workers.")
+        if workers <= 1:
+            # the generator of the memory is only lent to the work items
+            rng = self.rng
+            try:
+                for (n, m, k, channel), item_seed in zip(work_items, seeds):
+                    self.rng = np.random.default_rng(item_seed)
+                    self.monitor_convolution_one_by_one(
+                        outputFmaps,
+                        inputFmaps,
+                        filters,
+                        biases,
+                        P,
+                        Q,
+                        n,
+                        m,
+                        k,
+                        channel,
+                        tiling,
+                        all_nonvolatile,
+                        validate,
+                        tile_shape,
+                        record,
+                        accumulate_channels,
+                    )
+            finally:
+                self.rng = rng
+            self.records.close()
+            if self.trace is not None:
+                self.trace.flush()
+            if pooling is not None:
+                self.pooled_fmaps = pooling(np.asarray(outputFmaps))
+            return outputFmaps
+
+        if self.volatile_allocator or self.nonvolatile_allocator:
+            raise ValueError("Parallel execution requires an empty allocator.")
+        if tiling and tile_shape is None:
+            from tools.autotuner import autotune_tiling
+
+            tiling_config = autotune_tiling(config=self.config, memory=self)
+            tile_shape = (tiling_config.tile_height, tiling_config.tile_width)
+        # contiguous chunks, one per worker, so the merge only has to concatenate
+        items = [item + (item_seed,) for item, item_seed in zip(work_items, seeds)]
+        chunk_size = -(-len(items) // workers)
+        chunks = [items[i : i + chunk_size] for i in range(0, len(items), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    run_work_items, chunk, inputFmaps, filters, biases, P, Q, tiling,
+                    all_nonvolatile, validate, tile_shape, self.reference_engine_name,
+                    self.fast_counting, self.config, self.checkpoint_policy,
+                    self.rollback, self.max_replays, self.power_model, self.requantizer,
+                    self.epilogue, self.keep_outputs, self.keep_inputs,
+                )
+                for chunk in chunks
+            ]
+            results = []
+            for future in futures:
+                chunk_results, policy, progress = future.result()
+                results.extend(chunk_results)
+                self.checkpoint_policy.merge(policy)
+                self.progress.merge(progress)
+
+        # merge in work item order, exactly as the serial loop would have produced them
+        for (n, m, k, channel), (deltas, output) in zip(work_items, results):
+            self.ledger += deltas
+            outputFmaps[n][m][:P, :Q] = output
+            self.record_work_item(
+                CounterSnapshot(deltas, self.costs, self.widths), inputFmaps[n].id, filters[m].id, k,
+                channel, tiling, all_nonvolatile,
+            )
+            if record:
+                self.report_work_item(
+                    inputFmaps[n].id, filters[m].id, k, channel, tiling, all_nonvolatile
+                )
+        self.records.close()
+        if pooling is not None:
+            self.pooled_fmaps = pooling(np.asarray(outputFmaps))
+        return outputFmaps
         # N is the number of input feature maps
         # M is the number of output feature maps
         # k is the input fmap considered
@@ -507,7 +1237,30 @@ class Memory:
         channel: int,
         tiling: bool,
         all_nonvolatile: bool = False,
+        validate: bool = False,
+        tile_shape: Optional[Tuple[int, int]] = None,
+        record: bool = True,
+        accumulate: bool = False,
     ) -> None:
+        fs, stride = self.config.filter_size, self.config.stride
+        before = self.snapshot()
+        # with channel accumulation (k == channel, see perform_all_convolutions) the work
+        # item continues the partial sums of the channels before k in the output, and
+        # the activation waits for the last channel
+        first = not accumulate or k == 0
+        last = not accumulate or k == fs.C - 1
+        # the output of the previous work item is already in FRAM
+        self.macs_since_checkpoint = 0
+        self.committed_counters = self.ledger.copy()
+        # the next failure is drawn again with the generator of this work item
+        self.macs_to_failure = None
+        if tiling and tile_shape is None:
+            # imported here because the autotuner evaluates tilings with Memory itself
+            from tools.autotuner import autotune_tiling
+
+            tiling_config = autotune_tiling(config=self.config, memory=self)
+            tile_shape = (tiling_config.tile_height, tiling_config.tile_width)
+
         def monitored_convolution(
             outputFmaps: List[Any],
             inputFmaps: List[InputFeatureMap],
@@ -521,21 +1274,32 @@ class Memory:
             channel: int,
             tiling: bool,
             all_nonvolatile: bool,
+            tile_shape: Optional[Tuple[int, int]],
         ) -> None:
             # I state where all variables reside
             all_volatile: bool = not all_nonvolatile
+            # the partial sums are the only data written in volatile memory
+            track_dirty = all_volatile and self.checkpoint_policy.block_size is not None
+            output_itemsize = np.asarray(outputFmaps[n][m]).itemsize
             if not tiling:
+                output_key = allocation_key(outputFmaps[n][m])
                 # Bring the filter and corresponding input fmap into volatile memory
-                self.alloc(
+                kernel_handle = self.alloc(
                     filters[m].kernel[k], volatile=all_volatile
                 )  # number of : is fs.M - 1
-                self.alloc(inputFmaps[n].fmap[k], volatile=all_volatile)
+                fmap_handle = self.alloc(inputFmaps[n].fmap[k], volatile=all_volatile)
+                self.load_operands(*np.shape(inputFmaps[n].fmap[k]), all_volatile)
+                if not first:
+                    self.load_partial_sums(P, Q, all_volatile)
+                fmap_values = self.accumulator_values(inputFmaps[n].fmap[k])
+                kernel_values = self.accumulator_values(filters[m].kernel[k])
+                partial_values = outputFmaps[n][m]
 
                 for x in range(P):
                     for y in range(Q):
-                        output_value = biases[m]
-                        self.read(volatile=all_volatile)
-                        self.write(volatile=all_volatile)
+                        output_value = biases[m] if first else partial_values[x][y]
+                        self.read(volatile=all_volatile, role="biases" if first else "output")
+                        self.write(volatile=all_volatile, role="output")
 
                         for i in range(fs.R):
                             for j in range(fs.S):
@@ -543,82 +1307,285 @@ class Memory:
                                     all_nonvolatile
                                 )  # if it is true I cannot have power failure
                                 # Load the input feature map value
-                                input_value = inputFmaps[n].fmap[k][x * stride + i][
-                                    y * stride + j
-                                ]
-                                self.read(volatile=all_volatile)
+                                input_value = fmap_values[x * stride + i][y * stride + j]
+                                self.read(volatile=all_volatile, role="input")
 
                                 # Load the filter kernel value
-                                filter_value = filters[m].kernel[k][i][j]
-                                self.read(volatile=all_volatile)
+                                filter_value = kernel_values[i][j]
+                                self.read(volatile=all_volatile, role="filters")
 
                                 # Multiply input and filter values
                                 product = input_value * filter_value
 
                                 # Accumulate the result
                                 output_value += product
-                                self.read(volatile=all_volatile)
-                                self.write(volatile=all_volatile)
+                                self.read(volatile=all_volatile, role="output")
+                                self.write(volatile=all_volatile, role="output")
+                                if track_dirty:
+                                    self.mark_dirty(output_key, x * Q + y, output_itemsize)
 
-                        # Apply activation function (ReLU)
-                        self.read(volatile=all_volatile)
-                        if output_value < 0:
-                            output_value = 0
+                        # Apply activation function (ReLU by default)
+                        self.read(volatile=all_volatile, role="output")
+                        if last:
+                            if self.requantizer is not None:
+                                output_value = self.requantizer(output_value)
+                            output_value = self.activation(output_value)
                         outputFmaps[n][m][x][y] = output_value
-                        self.write(volatile=all_volatile)
+                        self.write(volatile=all_volatile, role="output")
 
                 # Save the output fmap in non-volatile memory
-                self.write(volatile=False)
+                self.store_output_block(P, Q, all_volatile)
+                self.dirty_blocks.pop(output_key, None)
 
                 # Free the filter and input fmap from volatile memory
-                self.free(filters[m].kernel[k], volatile=all_volatile)
-                self.free(inputFmaps[n].fmap[k], volatile=all_volatile)
+                self.free(kernel_handle, volatile=all_volatile)
+                self.free(fmap_handle, volatile=all_volatile)
 
                 return outputFmaps
             else:
-                tiles = inputFmaps[n].perform_tiling(4, 3, channel)
-                print("tiling!")
+                tile_height, tile_width = tile_shape
+                rows_per_store = self.epilogue.rows_per_store
                 # now we convolve 1 tile with the kernel and save to outputFmaps
-                for tile in tiles:
-                    self.alloc(filters[m].kernel[k], volatile=all_volatile)
-                    self.alloc(tile, volatile=all_volatile)
-                    for x in range(P):
-                        for y in range(Q):
-                            output_value = biases[m]
-                            self.read(volatile=all_volatile)
-                            self.write(volatile=all_volatile)
+                for tile in inputFmaps[n].tiles(
+                    tile_height, tile_width, fs.R, fs.S, stride, channel=channel
+                ):
+                    kernel_handle = self.alloc(filters[m].kernel[k], volatile=all_volatile)
+                    tile_handle = self.alloc(tile.data, volatile=all_volatile)
+                    # the partial sums of the output tile live next to the input tile
+                    output_handle = self.alloc(
+                        outputFmaps[n][m][
+                            tile.p0 : tile.p0 + tile.height, tile.q0 : tile.q0 + tile.width
+                        ],
+                        volatile=all_volatile,
+                    )
+                    self.load_operands(*np.shape(tile.data), all_volatile)
+                    if not first:
+                        self.load_partial_sums(tile.height, tile.width, all_volatile)
+                    tile_values = self.accumulator_values(tile.data)
+                    kernel_values = self.accumulator_values(filters[m].kernel[k])
+                    partial_values = outputFmaps[n][m]
+                    for x in range(tile.height):
+                        for y in range(tile.width):
+                            output_value = (
+                                biases[m] if first else partial_values[tile.p0 + x][tile.q0 + y]
+                            )
+                            self.read(
+                                volatile=all_volatile, role="biases" if first else "output"
+                            )
+                            self.write(volatile=all_volatile, role="output")
                             for i in range(fs.R):
                                 for j in range(fs.S):
                                     self.power_failure(all_nonvolatile)
                                     # Load the input feature map value
-                                    input_value = tile.fmap[i][j]
-                                    self.read(volatile=all_volatile)
+                                    input_value = tile_values[x * stride + i][y * stride + j]
+                                    self.read(volatile=all_volatile, role="input")
 
                                     # Load the filter kernel value
-                                    filter_value = filters[m].kernel[k][i][j]
-                                    self.read(volatile=all_volatile)
+                                    filter_value = kernel_values[i][j]
+                                    self.read(volatile=all_volatile, role="filters")
 
                                     # Multiply input and filter values
                                     product = input_value * filter_value
 
                                     # Accumulate the result
                                     output_value += product
-                                    self.read(volatile=all_volatile)
-                                    self.write(volatile=all_volatile)
+                                    self.read(volatile=all_volatile, role="output")
+                                    self.write(volatile=all_volatile, role="output")
+                                    if track_dirty:
+                                        self.mark_dirty(
+                                            output_handle.key, x * tile.width + y, output_itemsize
+                                        )
 
-                            # Apply activation function (ReLU)
-                            self.read(volatile=all_volatile)
-                            if output_value < 0:
-                                output_value = 0
-                            outputFmaps[n][m][x][y] = output_value
-                            self.write(volatile=all_volatile)
-                    # save the output fmap in non-volatile memory
-                        self.write(volatile=False)
-                    self.free(filters[m].kernel[k], volatile=all_volatile)
-                    self.free(tile, volatile=all_volatile)
+                            # Apply activation function (ReLU by default)
+                            self.read(volatile=all_volatile, role="output")
+                            if last:
+                                if self.requantizer is not None:
+                                    output_value = self.requantizer(output_value)
+                                output_value = self.activation(output_value)
+                            outputFmaps[n][m][tile.p0 + x][tile.q0 + y] = output_value
+                            self.write(volatile=all_volatile, role="output")
+                        # save the output row of the tile in non-volatile memory
+                        # (every rows_per_store rows when the epilogue pools them)
+                        if (x + 1) % rows_per_store == 0:
+                            self.store_output_block(
+                                rows_per_store, tile.width, all_volatile, row_by_row=True
+                            )
+                    self.free(kernel_handle, volatile=all_volatile)
+                    self.free(tile_handle, volatile=all_volatile)
+                    self.free(output_handle, volatile=all_volatile)
                 return outputFmaps
 
-        result = monitored_convolution(
+        def counted_convolution(
+            outputFmaps: List[Any],
+            inputFmaps: List[InputFeatureMap],
+            filters: Dict[int, Filter],
+            biases: Dict[int, float],
+            P: int,
+            Q: int,
+            n: int,
+            m: int,
+            k: int,
+            channel: int,
+            tiling: bool,
+            all_nonvolatile: bool,
+            tile_shape: Optional[Tuple[int, int]],
+        ) -> None:
+            # same allocations and counters as monitored_convolution, but every
+            # output element costs (2 + 3 * R * S) reads and (2 + R * S) writes
+            # so we charge them all at once and let numpy produce the values
+            all_volatile: bool = not all_nonvolatile
+            if not tiling:
+                kernel_handle = self.alloc(filters[m].kernel[k], volatile=all_volatile)
+                fmap_handle = self.alloc(inputFmaps[n].fmap[k], volatile=all_volatile)
+                self.load_operands(*np.shape(inputFmaps[n].fmap[k]), all_volatile)
+                if not first:
+                    self.load_partial_sums(P, Q, all_volatile)
+                self.count_output_accesses(P * Q, all_volatile, first=first)
+                outputFmaps[n][m][:P, :Q] = self.convolve_arrays(
+                    inputFmaps[n].fmap[None],
+                    filters[m].kernel[None],
+                    biases[m],
+                    P,
+                    Q,
+                    channels=[k],
+                    initial=None if first else outputFmaps[n][m][:P, :Q],
+                    activate=last,
+                )[0, 0]
+                # Save the output fmap in non-volatile memory
+                self.store_output_block(P, Q, all_volatile)
+                self.free(kernel_handle, volatile=all_volatile)
+                self.free(fmap_handle, volatile=all_volatile)
+                return outputFmaps
+            else:
+                tile_height, tile_width = tile_shape
+                for tile in inputFmaps[n].tiles(
+                    tile_height, tile_width, fs.R, fs.S, stride, channel=channel
+                ):
+                    kernel_handle = self.alloc(filters[m].kernel[k], volatile=all_volatile)
+                    tile_handle = self.alloc(tile.data, volatile=all_volatile)
+                    output_handle = self.alloc(
+                        outputFmaps[n][m][
+                            tile.p0 : tile.p0 + tile.height, tile.q0 : tile.q0 + tile.width
+                        ],
+                        volatile=all_volatile,
+                    )
+                    self.load_operands(*np.shape(tile.data), all_volatile)
+                    if not first:
+                        self.load_partial_sums(tile.height, tile.width, all_volatile)
+                    outputs = tile.height * tile.width
+                    self.count_output_accesses(outputs, all_volatile, first=first)
+                    # one non-volatile write per output row of the tile
+                    self.store_output_block(
+                        tile.height, tile.width, all_volatile, row_by_row=True
+                    )
+                    self.free(kernel_handle, volatile=all_volatile)
+                    self.free(tile_handle, volatile=all_volatile)
+                    self.free(output_handle, volatile=all_volatile)
+                # the tiles cover the whole output, so the values are those of the
+                # full convolution of the tiled channel with kernel channel k
+                outputFmaps[n][m][:P, :Q] = self.convolve_arrays(
+                    inputFmaps[n].fmap[channel][None, None],
+                    filters[m].kernel[k][None, None],
+                    biases[m],
+                    P,
+                    Q,
+                    initial=None if first else outputFmaps[n][m][:P, :Q],
+                    activate=last,
+                )[0, 0]
+                return outputFmaps
+
+        def cached_convolution(
+            outputFmaps: List[Any],
+            inputFmaps: List[InputFeatureMap],
+            filters: Dict[int, Filter],
+            biases: Dict[int, float],
+            P: int,
+            Q: int,
+            n: int,
+            m: int,
+            k: int,
+            channel: int,
+            tiling: bool,
+            all_nonvolatile: bool,
+            tile_shape: Optional[Tuple[int, int]],
+        ) -> None:
+            # same loop nest as monitored_convolution, but input, filter and partial sum
+            # accesses are addresses looked up in the cache, the untiled path is a single
+            # tile covering the whole fmap
+            if tiling:
+                tiles = inputFmaps[n].tiles(
+                    tile_shape[0], tile_shape[1], fs.R, fs.S, stride, channel=channel
+                )
+            else:
+                tiles = inputFmaps[n].tiles(P, Q, fs.R, fs.S, stride, channel=k)
+            kernel = filters[m].kernel[k]
+            output = outputFmaps[n][m]
+            kernel_base = self.simulated_address(kernel)
+            output_base = self.simulated_address(output)
+            # the biases are consecutive elements in the accumulator type
+            bias_address = (
+                self.simulated_address(biases) + m * self.role_widths[ROLE_INDEX["biases"]] // 8
+            )
+            kernel_values = self.accumulator_values(kernel)
+            for tile in tiles:
+                tile_base = self.simulated_address(tile.data)
+                tile_values = self.accumulator_values(tile.data)
+                handles = [
+                    self.alloc(kernel, volatile=True),
+                    self.alloc(tile.data, volatile=True),
+                ]
+                for x in range(tile.height):
+                    for y in range(tile.width):
+                        output_value = biases[m]
+                        self.cached_access(bias_address, role="biases")
+                        output_address = (
+                            output_base
+                            + (tile.p0 + x) * output.strides[0]
+                            + (tile.q0 + y) * output.strides[1]
+                        )
+                        self.cached_access(output_address, write=True, role="output")
+                        for i in range(fs.R):
+                            for j in range(fs.S):
+                                self.power_failure(all_nonvolatile)
+                                # Load the input feature map value
+                                input_value = tile_values[x * stride + i][y * stride + j]
+                                self.cached_access(
+                                    tile_base
+                                    + (x * stride + i) * tile.data.strides[0]
+                                    + (y * stride + j) * tile.data.strides[1],
+                                    role="input",
+                                )
+                                # Load the filter kernel value
+                                filter_value = kernel_values[i][j]
+                                self.cached_access(
+                                    kernel_base + i * kernel.strides[0] + j * kernel.strides[1],
+                                    role="filters",
+                                )
+                                # Accumulate the result
+                                output_value += input_value * filter_value
+                                self.cached_access(output_address, role="output")
+                                self.cached_access(output_address, write=True, role="output")
+
+                        # Apply activation function (ReLU by default)
+                        self.cached_access(output_address, role="output")
+                        if self.requantizer is not None:
+                            output_value = self.requantizer(output_value)
+                        output_value = self.activation(output_value)
+                        output[tile.p0 + x][tile.q0 + y] = output_value
+                        self.cached_access(output_address, write=True, role="output")
+                for handle in handles:
+                    self.free(handle, volatile=True)
+            # Save the output fmap in non-volatile memory
+            self.flush_cache()
+            return outputFmaps
+
+        if self.cache is not None and not all_nonvolatile:
+            convolution_function = cached_convolution
+        elif self.can_count_in_closed_form(all_nonvolatile):
+            convolution_function = counted_convolution
+        else:
+            convolution_function = monitored_convolution
+        result = convolution_function(
             outputFmaps,
             inputFmaps,
             filters,
@@ -631,72 +1598,173 @@ class Memory:
             channel,
             tiling,
             all_nonvolatile,
+            tile_shape,
         )
-
-        volatile_energy_cost = self.get_volatile_energy_cost()
-        nonvolatile_energy_cost = self.get_nonvolatile_energy_cost()
-        volatile_memory_accesses = self.get_volatile_memory_accesses()
-        nonvolatile_memory_accesses = self.get_nonvolatile_memory_accesses()
-        total_energy_cost = self.get_total_energy_cost()
-        total_memory_accesses = self.get_total_memory_accesses()
-
-        file = (
-            "data/benchmarks_all_nonvolatile.txt"
-            if all_nonvolatile
-            else "data/benchmarks.txt" if not tiling else "data/benchmarks_tiling.txt"
-        )
-        with open(file, "a") as f:
-            f.write(
-                "InputFmap #"
-                + str(inputFmaps[n].id)
-                + " Filter #"
-                + str(filters[m].id)
-                + " fmap #"
-                + str(k)
-                + " Channel # "
-                + str(channel)
-                + "\n"
+        if convolution_function is counted_convolution:
+            self.progress.macs += P * Q * fs.R * fs.S
+        self.progress.completed_outputs += P * Q
+        if self.trace is not None:
+            self.trace_work_item(
+                inputFmaps, P, Q, n, m, k, channel, tiling, all_nonvolatile, tile_shape
             )
-            f.write(
-                "Total energy cost: "
-                + str(total_energy_cost)
-                + " In volatile : "
-                + str(volatile_energy_cost)
-                + " In non-volatile : "
-                + str(nonvolatile_energy_cost)
-                + "\n"
+        self.record_work_item(
+            self.snapshot() - before, inputFmaps[n].id, filters[m].id, k, channel,
+            tiling, all_nonvolatile,
+        )
+        if validate and accumulate:
+            if last:
+                # the sums ran channel by channel, the reference runs tap by tap
+                self.validate_convolution(
+                    result, inputFmaps, filters, biases, P, Q, n, m, exact=False
+                )
+        elif validate and (not tiling or channel == k):
+            # both paths convolve channel k of filter m over a single channel of fmap n
+            self.validate_convolution(
+                result, inputFmaps, filters, biases, P, Q, n, m, channels=[k]
             )
-            f.write(
-                "Total memory accesses: "
-                + str(total_memory_accesses)
-                + " In volatile : "
-                + str(volatile_memory_accesses)
-                + " In non-volatile : "
-                + str(nonvolatile_memory_accesses)
-                + "\n"
+
+        if record:
+            self.report_work_item(
+                inputFmaps[n].id, filters[m].id, k, channel, tiling, all_nonvolatile
             )
-            f.write("\n")
+        return result
+
 
-        print(
-            "InputFmap #", inputFmaps[n].id, " Filter #", filters[m].id, " Channel #", k
+    def trace_work_item(
+        self,
+        inputFmaps: List[InputFeatureMap],
+        P: int,
+        Q: int,
+        n: int,
+        m: int,
+        k: int,
+        channel: int,
+        tiling: bool,
+        all_nonvolatile: bool,
+        tile_shape: Optional[Tuple[int, int]],
+    ) -> None:
+        # the accesses of a work item in loop order, without the power failures: the
+        # checkpoints, restores and replayed work are not traced (the trace is about
+        # which data the loop nest reuses, not about what a failure costs)
+        fs, stride = self.config.filter_size, self.config.stride
+        if tiling:
+            tiles = inputFmaps[n].tiles(*tile_shape, fs.R, fs.S, stride, channel=channel)
+        else:
+            tiles = inputFmaps[n].tiles(P, Q, fs.R, fs.S, stride, channel=k)
+        self.trace.record(
+            convolution_trace(
+                list(tiles), n, m, k, channel, inputFmaps[n].channels, inputFmaps[n].h,
+                inputFmaps[n].w, fs.M, fs.R, fs.S, P, Q, stride,
+                volatile=not all_nonvolatile, tiled=tiling,
+            )
         )
-        print(
-            "Total energy cost: ",
-            total_energy_cost,
-            " In volatile : ",
-            volatile_energy_cost,
-            " In non-volatile : ",
-            nonvolatile_energy_cost,
+
+    def record_work_item(
+        self,
+        delta: CounterSnapshot,
+        inputFmap_id: int,
+        filter_id: int,
+        k: int,
+        channel: int,
+        tiling: bool,
+        all_nonvolatile: bool,
+    ) -> None:
+        # structured counterpart of report_work_item: the accesses of this work item only
+        self.records.append(
+            delta.to_record(
+                inputFmap=inputFmap_id,
+                filter=filter_id,
+                fmap=k,
+                channel=channel,
+                tiling=tiling,
+                all_nonvolatile=all_nonvolatile,
+            )
         )
-        print(
-            "Total memory accesses: ",
-            total_memory_accesses,
-            " In volatile : ",
-            volatile_memory_accesses,
-            " In non-volatile : ",
-            nonvolatile_memory_accesses,
+
+    def report_work_item(
+        self,
+        inputFmap_id: int,
+        filter_id: int,
+        k: int,
+        channel: int,
+        tiling: bool,
+        all_nonvolatile: bool,
+    ) -> None:
+        # notify the end of a work item (the console logger prints the cumulative
+        # counters), the counters of the work item itself are in self.records
+        if self.subscribers["work_item"]:
+            self.emit(
+                "work_item",
+                inputFmap=inputFmap_id,
+                filter=filter_id,
+                fmap=k,
+                channel=channel,
+                tiling=tiling,
+                all_nonvolatile=all_nonvolatile,
+            )
+
+
+def run_work_items(
+    work_items: List[Tuple[int, int, int, int, np.random.SeedSequence]],
+    inputFmaps: List[InputFeatureMap],
+    filters: Dict[int, Filter],
+    biases: Dict[int, float],
+    P: int,
+    Q: int,
+    tiling: bool,
+    all_nonvolatile: bool,
+    validate: bool,
+    tile_shape: Optional[Tuple[int, int]],
+    reference_engine: str,
+    fast_counting: bool,
+    config: Config,
+    checkpoint_policy: Optional[CheckpointPolicy] = None,
+    rollback: bool = False,
+    max_replays: int = 100,
+    power_model: Optional[PowerModel] = None,
+    requantizer: Optional[Requantizer] = None,
+    epilogue: Optional[Epilogue] = None,
+    keep_outputs: bool = False,
+    keep_inputs: bool = False,
+) -> Tuple[
+    List[Tuple[np.ndarray, np.ndarray]], CheckpointPolicy, ExecutionProgress
+]:
+    # body of a perform_all_convolutions worker: every worker owns a Memory, so its
+    # counters start from zero, and every work item gets its own seeded generator
+    # for the power failures. Returns the counter deltas and output of every item,
+    # plus the checkpoint and progress statistics of the whole chunk
+    if checkpoint_policy is not None:
+        # the policy arrives pickled, its statistics start from zero in the worker
+        checkpoint_policy.reset()
+    memory = Memory(
+        reference_engine,
+        fast_counting,
+        config=config,
+        checkpoint_policy=checkpoint_policy,
+        rollback=rollback,
+        max_replays=max_replays,
+        power_model=power_model,
+        # the parent reports each work item once everything is merged
+        verbosity=0,
+        requantizer=requantizer,
+        epilogue=epilogue,
+    )
+    # outputs that stay in SRAM for the next layer are not stored by the workers either,
+    # nor are resident inputs loaded
+    memory.keep_outputs = keep_outputs
+    memory.keep_inputs = keep_inputs
+    outputFmaps = np.zeros((config.input_fmap_size.N, config.filter_size.M, P, Q))
+    results = []
+    for n, m, k, channel, seed in work_items:
+        memory.rng = np.random.default_rng(seed)
+        before = memory.ledger.copy()
+        memory.monitor_convolution_one_by_one(
+            outputFmaps, inputFmaps, filters, biases, P, Q, n, m, k, channel,
+            tiling, all_nonvolatile, validate, tile_shape, record=False,
         )
-        return result
+        deltas = memory.ledger - before
+        results.append((deltas, outputFmaps[n][m].copy()))
+    return results, memory.checkpoint_policy, memory.progress
 
 
 if __name__ == "main":
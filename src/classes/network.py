@@ -0,0 +1,138 @@
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+from classes.config import Config
+from classes.filter import Filter
+from classes.InputFeatureMap import InputFeatureMap
+
+# fmap shape of a whole layer: fmaps, channels, height, width
+Shape = Tuple[int, int, int, int]
+POOLING_MODES = ("max", "avg")
+
+
+class ConvLayer:
+    # filters x kernel_size convolution with its own filter set, the conv loops of
+    # Memory apply their activation (ReLU by default) to every output
+    def __init__(
+        self,
+        filters: int,
+        kernel_size: Tuple[int, int] = (3, 3),
+        stride: int = 1,
+        name: Optional[str] = None,
+    ) -> None:
+        if filters < 1 or min(kernel_size) < 1 or stride < 1:
+            raise ValueError("Filters, kernel size and stride must be positive.")
+        self.filters = filters
+        self.kernel_size = tuple(kernel_size)
+        self.stride = stride
+        self.name = name or f"conv{kernel_size[0]}x{kernel_size[1]}"
+
+    def __repr__(self) -> str:
+        return f"ConvLayer({self.name}, {self.filters} filters, {self.kernel_size}, stride={self.stride})"
+
+    def output_shape(self, shape: Shape) -> Shape:
+        N, C, H, W = shape
+        R, S = self.kernel_size
+        if R > H or S > W:
+            raise ValueError(f"{self.name}: kernel {self.kernel_size} does not fit in {H}x{W}.")
+        return (N, self.filters, (H - R) // self.stride + 1, (W - S) // self.stride + 1)
+
+
+class ReLULayer:
+    def __init__(self, name: str = "relu") -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"ReLULayer({self.name})"
+
+    def output_shape(self, shape: Shape) -> Shape:
+        return shape
+
+
+class PoolLayer:
+    # size x size max or average pooling of every channel, stride defaults to size
+    def __init__(
+        self,
+        size: int = 2,
+        stride: Optional[int] = None,
+        mode: str = "max",
+        name: Optional[str] = None,
+    ) -> None:
+        if mode not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling mode: {mode} (expected one of {POOLING_MODES})")
+        if size < 1 or (stride is not None and stride < 1):
+            raise ValueError("Pooling size and stride must be positive.")
+        self.size = size
+        self.stride = stride or size
+        self.mode = mode
+        self.name = name or f"{mode}pool{size}"
+
+    def __repr__(self) -> str:
+        return f"PoolLayer({self.name}, {self.size}x{self.size}, stride={self.stride})"
+
+    def output_shape(self, shape: Shape) -> Shape:
+        N, C, H, W = shape
+        if self.size > H or self.size > W:
+            raise ValueError(f"{self.name}: window {self.size} does not fit in {H}x{W}.")
+        return (N, C, (H - self.size) // self.stride + 1, (W - self.size) // self.stride + 1)
+
+
+Layer = Union[ConvLayer, ReLULayer, PoolLayer]
+
+
+class Network:
+    # a sequence of layers applied to N input fmaps of C x H x W, the output fmaps of a
+    # layer are the input fmaps of the next one
+    def __init__(self, input_shape: Shape, layers: List[Layer], name: str = "network") -> None:
+        if not layers:
+            raise ValueError("A network needs at least one layer.")
+        self.input_shape = tuple(input_shape)
+        self.layers = list(layers)
+        self.name = name
+        # validates every layer against the shape it receives
+        self.shapes()
+
+    def __repr__(self) -> str:
+        return f"Network({self.name}, {self.input_shape}, {len(self.layers)} layers)"
+
+    def __len__(self) -> int:
+        return len(self.layers)
+
+    def shapes(self) -> List[Shape]:
+        # input shape of every layer followed by the output shape of the network
+        shapes = [self.input_shape]
+        for layer in self.layers:
+            shapes.append(layer.output_shape(shapes[-1]))
+        return shapes
+
+    def layer_config(self, index: int, base: Optional[Config] = None) -> Config:
+        # config of a conv layer: its filters and input shape on top of base,
+        # which provides the memory and energy models
+        layer = self.layers[index]
+        if not isinstance(layer, ConvLayer):
+            raise ValueError(f"Layer {index} ({layer.name}) is not a convolution.")
+        N, C, H, W = self.shapes()[index]
+        R, S = layer.kernel_size
+        return (base or Config()).replace(
+            layer.stride,
+            filter_size={"M": layer.filters, "C": C, "R": R, "S": S},
+            input_fmap_size={"N": N, "C": C, "H": H, "W": W},
+        )
+
+    def generate_weights(
+        self, base: Optional[Config] = None
+    ) -> List[Optional[Tuple[Dict[int, Filter], Dict[int, float]]]]:
+        # random filters and biases of every conv layer, None for the other layers
+        weights: List[Optional[Tuple[Dict[int, Filter], Dict[int, float]]]] = []
+        for index, layer in enumerate(self.layers):
+            if not isinstance(layer, ConvLayer):
+                weights.append(None)
+                continue
+            config = self.layer_config(index, base)
+            filters = {m: Filter(config=config) for m in range(layer.filters)}
+            biases = {m: filters[m].get_bias() for m in range(layer.filters)}
+            weights.append((filters, biases))
+        return weights
+
+    def generate_inputs(self) -> List[InputFeatureMap]:
+        N, C, H, W = self.input_shape
+        return [InputFeatureMap(np.random.rand(C, H, W)) for _ in range(N)]
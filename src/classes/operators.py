@@ -0,0 +1,155 @@
+from typing import Dict, Optional, Tuple, Union
+import numpy as np
+
+Value = Union[int, float, np.ndarray]
+POOLING_MODES = ("max", "avg")
+
+
+class ReLU:
+    # activations work on a single output value (scalar loops) or on whole arrays
+    # (closed-form paths) and give the same result on both
+    name = "relu"
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+    def __call__(self, value: Value) -> Value:
+        # written as a select to keep -0.0 untouched like the scalar version
+        if isinstance(value, np.ndarray):
+            return np.where(value < 0, 0, value)
+        return 0 if value < 0 else value
+
+    def scaled(self, scale: float) -> "ReLU":
+        # the same activation on fixed-point values (real value = value * scale)
+        return self
+
+
+class ClippedReLU(ReLU):
+    # ReLU saturating at ceiling
+    name = "clipped_relu"
+
+    def __init__(self, ceiling: float) -> None:
+        if ceiling <= 0:
+            raise ValueError("Activation ceiling must be positive.")
+        self.ceiling = ceiling
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.ceiling})"
+
+    def __call__(self, value: Value) -> Value:
+        if isinstance(value, np.ndarray):
+            return np.where(value < 0, 0, np.where(value > self.ceiling, self.ceiling, value))
+        return 0 if value < 0 else self.ceiling if value > self.ceiling else value
+
+    def scaled(self, scale: float) -> "ClippedReLU":
+        return ClippedReLU(int(round(self.ceiling / scale)))
+
+
+class Identity(ReLU):
+    # no activation: the partial sums of a convolution that goes on over more channels
+    name = "identity"
+
+    def __call__(self, value: Value) -> Value:
+        return value
+
+
+class ReLU6(ClippedReLU):
+    name = "relu6"
+
+    def __init__(self) -> None:
+        super().__init__(6.0)
+
+    def __repr__(self) -> str:
+        return "ReLU6()"
+
+
+class QuantizedReLU(ClippedReLU):
+    # clipped ReLU whose output takes only 2^bits evenly spaced levels in [0, ceiling]
+    name = "quantized_relu"
+
+    def __init__(self, ceiling: float, bits: int = 4) -> None:
+        super().__init__(ceiling)
+        if bits < 1:
+            raise ValueError("Activation bits must be positive.")
+        self.bits = bits
+        self.step = ceiling / ((1 << bits) - 1)
+
+    def __repr__(self) -> str:
+        return f"QuantizedReLU({self.ceiling}, bits={self.bits})"
+
+    def __call__(self, value: Value) -> Value:
+        clipped = super().__call__(value)
+        if isinstance(value, np.ndarray):
+            levels = np.rint(clipped / self.step) * self.step
+            if np.issubdtype(value.dtype, np.integer):
+                return np.rint(levels).astype(value.dtype)
+            return levels
+        levels = round(clipped / self.step) * self.step
+        return int(round(levels)) if isinstance(value, (int, np.integer)) else levels
+
+    def scaled(self, scale: float) -> "QuantizedReLU":
+        return QuantizedReLU(self.ceiling / scale, self.bits)
+
+
+ACTIVATIONS: Dict[str, type] = {
+    activation.name: activation for activation in (ReLU, ClippedReLU, ReLU6, QuantizedReLU)
+}
+RELU = ReLU()
+IDENTITY = Identity()
+
+
+class Pooling:
+    # non-overlapping size x size max or average pooling of output fmaps, the rows and
+    # columns that don't fill a whole window are dropped
+    def __init__(self, size: int = 2, mode: str = "max") -> None:
+        if mode not in POOLING_MODES:
+            raise ValueError(f"Unknown pooling mode: {mode} (expected one of {POOLING_MODES})")
+        if size < 1:
+            raise ValueError("Pooling size must be positive.")
+        self.size = size
+        self.mode = mode
+
+    def __repr__(self) -> str:
+        return f"Pooling({self.size}x{self.size}, {self.mode})"
+
+    def output_size(self, P: int, Q: int) -> Tuple[int, int]:
+        return P // self.size, Q // self.size
+
+    def __call__(self, fmaps: np.ndarray) -> np.ndarray:
+        # pools the last two axes
+        fmaps = np.asarray(fmaps)
+        P, Q = self.output_size(*fmaps.shape[-2:])
+        windows = fmaps[..., : P * self.size, : Q * self.size].reshape(
+            fmaps.shape[:-2] + (P, self.size, Q, self.size)
+        )
+        if self.mode == "max":
+            return windows.max(axis=(-3, -1))
+        pooled = windows.mean(axis=(-3, -1))
+        if np.issubdtype(fmaps.dtype, np.integer):
+            return np.rint(pooled).astype(fmaps.dtype)
+        return pooled
+
+
+class Epilogue:
+    # what happens to the accumulated outputs of a convolution before they leave SRAM:
+    # the activation of every output, then optionally the pooling of whole windows,
+    # so only the pooled outputs are stored to FRAM
+    def __init__(self, activation: Optional[ReLU] = None, pooling: Optional[Pooling] = None) -> None:
+        self.activation = activation or RELU
+        self.pooling = pooling
+
+    def __repr__(self) -> str:
+        return f"Epilogue({self.activation}, {self.pooling})"
+
+    @property
+    def rows_per_store(self) -> int:
+        # output rows that have to be complete before they can be stored
+        return 1 if self.pooling is None else self.pooling.size
+
+    def output_size(self, P: int, Q: int) -> Tuple[int, int]:
+        return (P, Q) if self.pooling is None else self.pooling.output_size(P, Q)
+
+    def align(self, tile_shape: Tuple[int, int]) -> Tuple[int, int]:
+        # largest tile not above tile_shape whose rows and columns hold whole windows
+        size = self.rows_per_store
+        return tuple(max(size, extent // size * size) for extent in tile_shape)
@@ -0,0 +1,136 @@
+from typing import Dict, List, Optional, Tuple, Union
+import math
+import numpy as np
+from classes.config import Config
+from classes.filter import Filter
+from classes.InputFeatureMap import InputFeatureMap
+
+# fixed-point types the fmaps and filters can be stored in
+QUANTIZED_DTYPES: Dict[str, type] = {"int8": np.int8, "int16": np.int16}
+ACCUMULATOR_BITS: Dict[str, int] = {"int8": 32, "int16": 64}
+
+
+def quantization_scale(values: np.ndarray, dtype: str = "int8") -> float:
+    # symmetric per-tensor scale: the largest magnitude maps to the largest integer
+    qmax = np.iinfo(QUANTIZED_DTYPES[dtype]).max
+    largest = float(np.max(np.abs(values))) if np.size(values) else 0.0
+    return largest / qmax if largest > 0 else 1.0
+
+
+def quantize(values: np.ndarray, scale: float, dtype: str = "int8") -> np.ndarray:
+    qmax = np.iinfo(QUANTIZED_DTYPES[dtype]).max
+    return np.clip(np.round(values / scale), -qmax, qmax).astype(QUANTIZED_DTYPES[dtype])
+
+
+def dequantize(values: np.ndarray, scale: float) -> np.ndarray:
+    return values.astype(np.float64) * scale
+
+
+def fixed_point_multiplier(real: float) -> Tuple[int, int]:
+    # real = multiplier * 2^-shift with a 31 bit multiplier, as MCU kernels requantize
+    if real <= 0:
+        raise ValueError("Requantization scale must be positive.")
+    mantissa, exponent = math.frexp(real)
+    multiplier = int(round(mantissa * (1 << 31)))
+    if multiplier == 1 << 31:
+        multiplier //= 2
+        exponent += 1
+    shift = 31 - exponent
+    if shift <= 0:
+        raise ValueError(f"Requantization scale too large: {real}")
+    return multiplier, shift
+
+
+class Requantizer:
+    # brings an accumulator (input scale * filter scale) back to the storage type of the
+    # output (output scale): saturate to accumulator_bits, multiply by the fixed-point
+    # multiplier, round and shift, clip to the output type. Integer only, so the scalar
+    # loops and the vectorized engine give the same values
+    def __init__(
+        self,
+        input_scale: float,
+        filter_scale: float,
+        output_scale: float,
+        dtype: str = "int8",
+        accumulator_bits: Optional[int] = None,
+    ) -> None:
+        if dtype not in QUANTIZED_DTYPES:
+            raise ValueError(f"Unknown quantized type: {dtype}")
+        self.dtype = dtype
+        # int16 products overflow a 32 bit sum after a few MACs, so they use 64 bits
+        self.accumulator_bits = accumulator_bits or ACCUMULATOR_BITS[dtype]
+        self.input_scale = input_scale
+        self.filter_scale = filter_scale
+        self.output_scale = output_scale
+        self.multiplier, self.shift = fixed_point_multiplier(
+            input_scale * filter_scale / output_scale
+        )
+        info = np.iinfo(QUANTIZED_DTYPES[dtype])
+        self.qmin, self.qmax = int(info.min), int(info.max)
+        self.accumulator_min = -(1 << (self.accumulator_bits - 1))
+        self.accumulator_max = (1 << (self.accumulator_bits - 1)) - 1
+
+    def __repr__(self) -> str:
+        return (
+            f"Requantizer({self.dtype}, multiplier={self.multiplier}, shift={self.shift}, "
+            f"output_scale={self.output_scale})"
+        )
+
+    @property
+    def bits(self) -> int:
+        return np.dtype(QUANTIZED_DTYPES[self.dtype]).itemsize * 8
+
+    def __call__(self, accumulator: Union[int, np.ndarray]) -> Union[int, np.ndarray]:
+        rounding = 1 << (self.shift - 1)
+        if isinstance(accumulator, np.ndarray):
+            accumulator = np.clip(accumulator, self.accumulator_min, self.accumulator_max)
+            # a 64 bit accumulator times the multiplier needs more than 64 bits
+            wide = np.int64 if self.accumulator_bits <= 32 else object
+            scaled = (accumulator.astype(wide) * self.multiplier + rounding) >> self.shift
+            return np.clip(scaled, self.qmin, self.qmax).astype(QUANTIZED_DTYPES[self.dtype])
+        accumulator = min(max(int(accumulator), self.accumulator_min), self.accumulator_max)
+        scaled = (accumulator * self.multiplier + rounding) >> self.shift
+        return min(max(scaled, self.qmin), self.qmax)
+
+
+def quantize_layer(
+    filters: Dict[int, Filter],
+    biases: Dict[int, float],
+    inputFmaps: List[InputFeatureMap],
+    dtype: str = "int8",
+    config: Optional[Config] = None,
+    output_scale: Optional[float] = None,
+) -> Tuple[Dict[int, Filter], Dict[int, int], List[InputFeatureMap], Requantizer]:
+    # fixed-point copy of the data of generate_data: fmaps and filters in dtype with one
+    # scale each, biases as accumulator integers (scale input * filter). The output scale
+    # is calibrated on the float convolution unless given. The copies keep the ids
+    from tools.convolution import convolve_arrays
+
+    config = config or Config()
+    fs, ifs = config.filter_size, config.input_fmap_size
+    fmaps = np.stack([inputFmaps[n].fmap for n in range(ifs.N)])
+    kernels = np.stack([filters[m].kernel for m in range(fs.M)])
+    input_scale = quantization_scale(fmaps, dtype)
+    filter_scale = quantization_scale(kernels, dtype)
+    if output_scale is None:
+        bias_values = np.array([biases[m] for m in range(fs.M)], dtype=np.float64)
+        reference = convolve_arrays(
+            fmaps, kernels, bias_values, config.P, config.Q, exact=False, stride=config.stride
+        )
+        output_scale = quantization_scale(reference, dtype)
+
+    quantized_filters: Dict[int, Filter] = {}
+    quantized_biases: Dict[int, int] = {}
+    for m in range(fs.M):
+        quantized_biases[m] = int(round(biases[m] / (input_scale * filter_scale)))
+        quantized_filters[m] = Filter(
+            quantized_biases[m], quantize(filters[m].kernel, filter_scale, dtype), config=config
+        )
+        quantized_filters[m].id = filters[m].id
+    quantized_fmaps = []
+    for fmap in inputFmaps:
+        quantized = InputFeatureMap(quantize(fmap.fmap, input_scale, dtype), config=config)
+        quantized.id = fmap.id
+        quantized_fmaps.append(quantized)
+    requantizer = Requantizer(input_scale, filter_scale, output_scale, dtype)
+    return quantized_filters, quantized_biases, quantized_fmaps, requantizer
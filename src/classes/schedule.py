@@ -0,0 +1,144 @@
+from typing import Dict, Optional, Tuple
+from classes.config import Config
+
+# loop variables of the convolution nest
+# n: input fmap, m: filter, c: channel, p/q: output row/column, r/s: filter row/column
+LOOPS: Tuple[str, ...] = ("n", "m", "c", "p", "q", "r", "s")
+
+# loops that index each tensor
+TENSOR_LOOPS: Dict[str, Tuple[str, ...]] = {
+    "filters": ("m", "c", "r", "s"),
+    "input": ("n", "c", "p", "q", "r", "s"),
+    "biases": ("m",),
+    "output": ("n", "m", "p", "q"),
+}
+
+
+class Schedule:
+    # a dataflow schedule is a loop order plus, for every tensor, the depth in that
+    # order at which the tensor is brought into SRAM: the tile needed by the loops
+    # below that depth is loaded once per iteration of the loops above it.
+    # Depth 0 keeps the whole tensor resident, None leaves it in NVM.
+    def __init__(
+        self,
+        name: str,
+        loop_order: Tuple[str, ...],
+        residency: Dict[str, Optional[int]],
+    ) -> None:
+        if sorted(loop_order) != sorted(LOOPS):
+            raise ValueError(f"Loop order must be a permutation of {LOOPS}.")
+        for tensor, depth in residency.items():
+            if tensor not in TENSOR_LOOPS:
+                raise ValueError(f"Unknown tensor: {tensor}")
+            if depth is not None and not 0 <= depth <= len(loop_order):
+                raise ValueError(f"Invalid residency depth for {tensor}: {depth}")
+        self.name = name
+        self.loop_order = tuple(loop_order)
+        self.residency = {tensor: residency.get(tensor) for tensor in TENSOR_LOOPS}
+
+    def __repr__(self) -> str:
+        return f"Schedule({self.name}, order={''.join(self.loop_order)})"
+
+    def tile_elements(self, tensor: str, depth: int, extents: Dict[str, int], stride: int) -> int:
+        # number of elements of the tensor touched by the loops below depth
+        inner = self.loop_order[depth:]
+        extent = {loop: extents[loop] if loop in inner else 1 for loop in LOOPS}
+        if tensor == "input":
+            # output and filter positions overlap on the input plane
+            rows = (extent["p"] - 1) * stride + extent["r"]
+            cols = (extent["q"] - 1) * stride + extent["s"]
+            return extent["n"] * extent["c"] * rows * cols
+        elements = 1
+        for loop in TENSOR_LOOPS[tensor]:
+            elements *= extent[loop]
+        return elements
+
+    def count_accesses(
+        self,
+        P: int,
+        Q: int,
+        config: Optional[Config] = None,
+        itemsizes: Optional[Dict[str, int]] = None,
+    ) -> Dict[str, Dict[str, int]]:
+        # closed-form accesses of every tensor for this schedule, per memory level.
+        # itemsizes are the bytes of an element of every tensor (fixed-point data,
+        # wide partial sums), SIZE_OF_FLOAT for those not given
+        config = config or Config()
+        itemsizes = itemsizes or {}
+        fs, ifs, um = config.filter_size, config.input_fmap_size, config.unit_model
+        stride = config.stride
+        extents = {
+            "n": ifs.N, "m": fs.M, "c": fs.C, "p": P, "q": Q, "r": fs.R, "s": fs.S,
+        }
+        macs = 1
+        for loop in LOOPS:
+            macs *= extents[loop]
+        outputs = ifs.N * fs.M * P * Q
+        # accesses done by the computation itself, as in the monitored loops:
+        # every MAC reads input, filter and partial sum and writes the partial sum,
+        # every output reads its bias, initialises the sum and applies the activation
+        compute = {
+            "filters": (macs, 0),
+            "input": (macs, 0),
+            "biases": (outputs, 0),
+            "output": (macs + outputs, macs + 2 * outputs),
+        }
+
+        counts: Dict[str, Dict[str, int]] = {}
+        for tensor, depth in self.residency.items():
+            reads, writes = compute[tensor]
+            counts[tensor] = {
+                "sram_reads": 0, "sram_writes": 0, "nvm_reads": 0, "nvm_writes": 0,
+                "tile_bytes": 0,
+            }
+            if depth is None:
+                # the computation goes straight to NVM
+                counts[tensor]["nvm_reads"] = reads
+                counts[tensor]["nvm_writes"] = writes
+                continue
+            tile = self.tile_elements(tensor, depth, extents, stride)
+            loads = 1
+            for loop in self.loop_order[:depth]:
+                loads *= extents[loop]
+            counts[tensor]["tile_bytes"] = tile * itemsizes.get(tensor, um.SIZE_OF_FLOAT)
+            counts[tensor]["sram_reads"] = reads
+            counts[tensor]["sram_writes"] = writes
+            if tensor == "output":
+                # partial sums are written back every time the tile leaves SRAM and
+                # read back every time it comes in again (the first visit starts from the bias)
+                stores = loads * tile
+                counts[tensor]["nvm_writes"] = stores
+                counts[tensor]["nvm_reads"] = stores - outputs
+                counts[tensor]["sram_reads"] += stores
+                counts[tensor]["sram_writes"] += stores - outputs
+            else:
+                counts[tensor]["nvm_reads"] = loads * tile
+                counts[tensor]["sram_writes"] += loads * tile
+        return counts
+
+
+# each filter slice is loaded once and reused for every fmap and output position
+WEIGHT_STATIONARY = Schedule(
+    "weight-stationary",
+    ("m", "c", "n", "p", "q", "r", "s"),
+    {"filters": 2, "biases": 1, "input": 4, "output": 3},
+)
+
+# each output element stays in SRAM until all its C x R x S MACs are done
+OUTPUT_STATIONARY = Schedule(
+    "output-stationary",
+    ("n", "m", "p", "q", "c", "r", "s"),
+    {"filters": 2, "biases": 2, "input": 4, "output": 4},
+)
+
+# each strip of input rows is loaded once and used by every filter
+INPUT_STATIONARY = Schedule(
+    "input-stationary",
+    ("n", "c", "p", "m", "q", "r", "s"),
+    {"filters": 4, "biases": 0, "input": 3, "output": 2},
+)
+
+SCHEDULES: Dict[str, Schedule] = {
+    schedule.name: schedule
+    for schedule in (WEIGHT_STATIONARY, OUTPUT_STATIONARY, INPUT_STATIONARY)
+}
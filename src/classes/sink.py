@@ -0,0 +1,94 @@
+from typing import Any, Dict, List, Optional
+import os
+import numpy as np
+import pandas as pd
+
+SINK_FORMATS = (".csv", ".npz")
+
+
+class ResultsSink:
+    # columnar buffer of result records (one dict per row). Rows are kept as one list
+    # per column and written in bulk every flush_every rows: appended to a .csv file,
+    # or kept as chunks and written once to a .npz file on close.
+    # Without a path the rows just stay in memory
+    def __init__(self, path: Optional[str] = None, flush_every: int = 4096) -> None:
+        if path is not None and os.path.splitext(path)[1] not in SINK_FORMATS:
+            raise ValueError(f"Unsupported results format: {path} (expected {SINK_FORMATS})")
+        self.path = path
+        self.flush_every = flush_every
+        self.columns: Dict[str, List[Any]] = {}
+        self.buffered = 0
+        self.flushed = 0
+        # .npz rows already flushed, written to disk on close
+        self.chunks: List[pd.DataFrame] = []
+        if path is not None and os.path.exists(path):
+            # a new sink starts a new file
+            os.remove(path)
+
+    def __len__(self) -> int:
+        return self.flushed + self.buffered
+
+    def __repr__(self) -> str:
+        return f"ResultsSink({self.path}, {len(self)} rows)"
+
+    def append(self, record: Dict[str, Any]) -> None:
+        for key, value in record.items():
+            if key not in self.columns:
+                # columns that show up late are empty for the earlier rows
+                self.columns[key] = [None] * self.buffered
+            self.columns[key].append(value)
+        self.buffered += 1
+        for column in self.columns.values():
+            if len(column) < self.buffered:
+                column.append(None)
+        if self.path is not None and self.buffered >= self.flush_every:
+            self.flush()
+
+    def buffer_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns)
+
+    def flush(self) -> None:
+        # write the buffered rows, without a path there is nowhere to write them
+        if self.path is None or self.buffered == 0:
+            return
+        frame = self.buffer_frame()
+        if self.path.endswith(".csv"):
+            frame.to_csv(self.path, mode="a", header=self.flushed == 0, index=False)
+        else:
+            self.chunks.append(frame)
+        self.flushed += self.buffered
+        self.columns = {}
+        self.buffered = 0
+
+    def close(self) -> None:
+        self.flush()
+        if self.path is not None and self.path.endswith(".npz") and self.chunks:
+            frame = pd.concat(self.chunks, ignore_index=True)
+            np.savez_compressed(
+                self.path, **{column: frame[column].to_numpy() for column in frame.columns}
+            )
+
+    def to_frame(self) -> pd.DataFrame:
+        # every row of the sink, the flushed ones are read back from the file
+        frames = []
+        if self.flushed:
+            if self.path.endswith(".csv"):
+                frames.append(pd.read_csv(self.path))
+            else:
+                frames.extend(self.chunks)
+        if self.buffered:
+            frames.append(self.buffer_frame())
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def export_excel(self, path: str) -> None:
+        self.to_frame().to_excel(path, index=False)
+
+
+def load_results(path: str) -> pd.DataFrame:
+    # read back what a ResultsSink wrote
+    if path.endswith(".npz"):
+        with np.load(path, allow_pickle=True) as data:
+            return pd.DataFrame({column: data[column] for column in data.files})
+    return pd.read_csv(path)
@@ -0,0 +1,162 @@
+from typing import List, Optional
+import os
+import numpy as np
+from classes.counters import ROLE_INDEX
+from classes.InputFeatureMap import FmapTile
+
+# The trace follows the loop nest of the convolutions only: checkpoints, restores and
+# the work replayed after a power failure are not in it (their cost is in the counters)
+# one memory access: the tensor (a role of classes/counters.py), the flat index of the
+# element in the whole tensor, read (0) or write (1), volatile (0) or non-volatile (1)
+TRACE_DTYPE = np.dtype(
+    [("tensor", np.uint8), ("element", np.int64), ("op", np.uint8), ("level", np.uint8)]
+)
+
+
+class TraceRecorder:
+    # preallocated ring buffer of accesses: once full the oldest accesses are
+    # overwritten, unless a path is given, then full buffers are appended to the file
+    # (raw TRACE_DTYPE records, see read_trace) and nothing is lost
+    def __init__(self, capacity: int = 1 << 20, path: Optional[str] = None) -> None:
+        if capacity < 1:
+            raise ValueError("Trace capacity must be positive.")
+        self.buffer = np.zeros(capacity, dtype=TRACE_DTYPE)
+        self.path = path
+        # accesses recorded so far, the next one goes to position % capacity
+        self.position = 0
+        self.written = 0
+        # bytes of an element of every role (indexed by "tensor"), set by the Memory
+        # recording into it, see tools/reuse_distance.trace_blocks
+        self.itemsizes: Optional[np.ndarray] = None
+        if path is not None and os.path.exists(path):
+            # a new recorder starts a new file
+            os.remove(path)
+
+    def __len__(self) -> int:
+        return self.position
+
+    def __repr__(self) -> str:
+        return f"TraceRecorder({len(self)} accesses, capacity={self.buffer.size}, path={self.path})"
+
+    def record(self, accesses: np.ndarray) -> None:
+        capacity = self.buffer.size
+        while accesses.size > 0:
+            start = self.position % capacity
+            count = min(accesses.size, capacity - start)
+            self.buffer[start : start + count] = accesses[:count]
+            self.position += count
+            accesses = accesses[count:]
+            if self.path is not None and self.position % capacity == 0:
+                self.flush()
+
+    def flush(self) -> None:
+        # append what is not in the file yet (file mode only)
+        if self.path is None or self.written == self.position:
+            return
+        start = self.written % self.buffer.size
+        end = start + self.position - self.written
+        with open(self.path, "ab") as f:
+            self.buffer[start:end].tofile(f)
+        self.written = self.position
+
+    def close(self) -> None:
+        self.flush()
+
+    def to_array(self) -> np.ndarray:
+        # the recorded accesses in order: the whole file, or what is left in the ring
+        if self.path is not None:
+            self.flush()
+            return read_trace(self.path)
+        capacity = self.buffer.size
+        if self.position <= capacity:
+            return self.buffer[: self.position].copy()
+        start = self.position % capacity
+        return np.concatenate((self.buffer[start:], self.buffer[:start]))
+
+    def clear(self) -> None:
+        self.position = 0
+        self.written = 0
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def read_trace(path: str) -> np.ndarray:
+    return np.fromfile(path, dtype=TRACE_DTYPE)
+
+
+def convolution_trace(
+    tiles: List[FmapTile],
+    n: int,
+    m: int,
+    k: int,
+    channel: int,
+    channels: int,
+    height: int,
+    width: int,
+    filters: int,
+    R: int,
+    S: int,
+    P: int,
+    Q: int,
+    stride: int,
+    volatile: bool,
+    tiled: bool,
+) -> np.ndarray:
+    # accesses of one work item of monitor_convolution_one_by_one in the order of its
+    # loop nest, built with numpy for all outputs of a tile at once. For every output:
+    # bias read, output write, R * S times (input, filter, partial sum reads and
+    # partial sum write), then the activation read and write. The non-volatile writes of
+    # the outputs follow every row of a tile (tiled) or the whole fmap (untiled).
+    # Inputs are indexed in the whole fmap (channel of the tile), so the halo shared by
+    # neighbouring tiles shows up as reuse
+    level = 0 if volatile else 1
+    input_channel = channel if tiled else k
+    taps = R * S
+    i, j = np.divmod(np.arange(taps), S)
+    filter_elements = ((m * channels + k) * R + i) * S + j
+    # per output: 2 + 4 * taps + 2 accesses
+    tensor_row = np.concatenate(
+        (
+            [ROLE_INDEX["biases"], ROLE_INDEX["output"]],
+            np.tile(
+                [ROLE_INDEX["input"], ROLE_INDEX["filters"], ROLE_INDEX["output"], ROLE_INDEX["output"]],
+                taps,
+            ),
+            [ROLE_INDEX["output"], ROLE_INDEX["output"]],
+        )
+    )
+    op_row = np.concatenate(([0, 1], np.tile([0, 0, 0, 1], taps), [0, 1]))
+    chunks = []
+    for tile in tiles:
+        x, y = np.divmod(np.arange(tile.height * tile.width), tile.width)
+        outputs = (n * filters + m) * P * Q + (tile.p0 + x) * Q + tile.q0 + y
+        rows = tile.h0 + x[:, None] * stride + i
+        columns = tile.w0 + y[:, None] * stride + j
+        inputs = ((n * channels + input_channel) * height + rows) * width + columns
+        elements = np.empty((outputs.size, tensor_row.size), dtype=np.int64)
+        elements[:, 0] = m
+        elements[:, 1:] = outputs[:, None]
+        elements[:, 2 : 2 + 4 * taps : 4] = inputs
+        elements[:, 3 : 3 + 4 * taps : 4] = filter_elements
+        trace = np.empty(elements.shape, dtype=TRACE_DTYPE)
+        trace["tensor"] = tensor_row
+        trace["element"] = elements
+        trace["op"] = op_row
+        trace["level"] = level
+        if tiled:
+            # one non-volatile write after every output row of the tile
+            stores = np.zeros((tile.height, 1), dtype=TRACE_DTYPE)
+            stores["tensor"] = ROLE_INDEX["output"]
+            stores["element"] = outputs[:: tile.width, None]
+            stores["op"] = 1
+            stores["level"] = 1
+            trace = np.concatenate((trace.reshape(tile.height, -1), stores), axis=1)
+        chunks.append(trace.ravel())
+    if not tiled:
+        store = np.zeros(1, dtype=TRACE_DTYPE)
+        store["tensor"] = ROLE_INDEX["output"]
+        store["element"] = (n * filters + m) * P * Q
+        store["op"] = 1
+        store["level"] = 1
+        chunks.append(store)
+    return np.concatenate(chunks)
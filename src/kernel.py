@@ -6,29 +6,37 @@ import pandas as pd
 from classes.InputFeatureMap import InputFeatureMap
 from classes.memoryModel import Memory
 from classes.filter import Filter
-from classes.consts import (
-    FilterSize as fs,
-    InputFmapSize as ifs,
-    OutputFmapSize as ofs,
-    U as stride,
-    EnergyModel as em,
-)
+from classes.schedule import SCHEDULES
+from classes.config import Config
+from classes.trace import TraceRecorder
+from classes.quantization import quantize_layer
 from collections import defaultdict
 from tools.convolution import convolution, flattened_convolution
 from tools.generate_data import generate_data
 from tools.data_loader import data_loader
-from tools.benchmarkParser import main as benchmark_main
+from tools.benchmarkParser import main as benchmark_main, main_from_records, compare_strategies
+from tools.sweep import config_grid, run_sweep
+from tools.monte_carlo import monte_carlo
+from tools.reuse_distance import analyze_trace
+from classes.network import Network, ConvLayer, PoolLayer, ReLULayer
+from tools.pipeline import run_network
+from tools.fusion import run_fused
+from classes.operators import Epilogue, Pooling, ReLU6
 
+# the layer shape and the memory/energy models can also be loaded with Config.from_file
+config = Config()
+fs, ifs, em = config.filter_size, config.input_fmap_size, config.energy_model
+stride = config.stride
 
 
-# uncomment this one to generate new json files
-generate_data()
+# uncomment this one to generate new data files (binary=False writes the old json files)
+generate_data(config, binary=True)
 
 inputFmaps: List[InputFeatureMap] = []
 biases: Dict[int, float] = defaultdict(float)
 filters: Dict[int, Filter] = defaultdict(Filter)
 
-filters, biases, inputFmaps = data_loader()
+filters, biases, inputFmaps = data_loader(config, binary=True)
 for m in range(fs.M):
     print(f"Filter {m + 1}:")
     print(filters[m])
@@ -80,7 +88,7 @@ Q = (ifs.W - fs.S) // stride + 1
 
 
 # testing loading into Volatile Memory
-memory = Memory()
+memory = Memory(config=config)
 outputFmaps = np.zeros((ifs.N, fs.M, P, Q))
 
 # this one is used to check if power failure works correctly and some other stuff
@@ -95,9 +103,11 @@ outputFmaps = np.zeros((ifs.N, fs.M, P, Q))
 memory.perform_all_convolutions(
     outputFmaps, inputFmaps, filters, biases, P, Q, tiling=False, all_nonvolatile=True
 )
+# per work item counters of this run, the tiling run below replaces memory
+all_nonvolatile_records = memory.records
 
 
-# memory = Memory()
+# memory = Memory(config=config)
 # print("Convolution Volatile NO TILING")
 # outputFmaps = np.zeros((ifs.N, fs.M, P, Q))
 # memory.perform_all_convolutions(
@@ -105,7 +115,9 @@ memory.perform_all_convolutions(
 # )
 
 
-memory = Memory()
+# verbosity=3 also prints the memory usage after every alloc/free, other callbacks can
+# follow the run with memory.subscribe("power_failure", callback, every=1)
+memory = Memory(config=config)
 print("Convolution Volatile TILING")
 outputFmaps = np.zeros((ifs.N, fs.M, P, Q))
 memory.perform_all_convolutions(
@@ -113,11 +125,95 @@ memory.perform_all_convolutions(
 )
 
 
+# compare the NVM <-> SRAM traffic of the dataflow schedules on this layer
+# for schedule in SCHEDULES.values():
+#     memory = Memory(config=config)
+#     outputFmaps = np.zeros((ifs.N, fs.M, P, Q))
+#     memory.monitor_schedule(outputFmaps, inputFmaps, filters, biases, P, Q, schedule)
+
+
+# sweep a grid of layer shapes in this process, without generating files
+# print(
+#     run_sweep(
+#         config_grid(config, input_fmap_size__H=[16, 32], input_fmap_size__W=[16, 32]),
+#         tiling=True,
+#         all_nonvolatile=False,
+#     )
+# )
+
+
+# the same layer in int8 fixed point: 8x smaller fmaps and filters, int32 accumulators
+# qfilters, qbiases, qinputFmaps, requantizer = quantize_layer(filters, biases, inputFmaps, "int8", config)
+# memory = Memory(config=config, requantizer=requantizer)
+# outputFmaps = np.zeros((ifs.N, fs.M, P, Q), dtype=np.int8)
+# memory.perform_all_convolutions(
+#     outputFmaps, qinputFmaps, qfilters, qbiases, P, Q, tiling=True, all_nonvolatile=False
+# )
+
+
+# energy in pJ from the bits every access moves, FRAM transfers in 32 byte bursts with a
+# fixed cost per transaction (the default charges every access as a float word)
+# memory = Memory(config=config.replace(
+#     memory_model={"COST_UNIT": "bit", "BURST_SIZE": 32, "NONVOLATILE_TRANSACTION": 1000.0}
+# ))
+# memory.perform_all_convolutions(
+#     outputFmaps, inputFmaps, filters, biases, P, Q, tiling=True, all_nonvolatile=False
+# )
+# print(memory.snapshot().get_bits(), memory.snapshot().get_transactions())
+
+
+# a small network end to end: intermediate fmaps stay in SRAM when they fit, one row of
+# accesses and energy per layer (reuse=False stores and reloads every one of them)
+# network = Network(
+#     (1, 3, 16, 16),
+#     [ConvLayer(4), PoolLayer(2, mode="max"), ConvLayer(8), ReLULayer(), ConvLayer(4)],
+# )
+# network_output, layers = run_network(network, Memory(config=config, verbosity=0), seed=3)
+# print(layers[["name", "input_resident", "output_resident", "nonvolatile_accesses", "total_energy"]])
+
+
+# the same network fused depth-first: every output tile is computed from its input halo
+# in SRAM, the intermediate fmaps never reach FRAM (needs room for all the weights)
+# fused_output, fusion = run_fused(network, Memory(config=config.replace(
+#     memory_model={"VOLATILE_MEMORY_SIZE": 16 * 1024}), verbosity=0))
+# print(fusion["sram_peak"], fusion["nvm_energy_saved"], fusion["sram_energy_added"], fusion["layers"])
+
+
+# ReLU6 and 2x2 max pooling applied by the conv loops before the outputs leave SRAM,
+# only the pooled outputs are stored to FRAM (tile shapes are aligned to the window)
+# memory = Memory(config=config, verbosity=0, epilogue=Epilogue(ReLU6(), Pooling(2, "max")))
+# outputFmaps = np.zeros((ifs.N, fs.M, P, Q))
+# memory.perform_all_convolutions(
+#     outputFmaps, inputFmaps, filters, biases, P, Q, tiling=True, all_nonvolatile=False
+# )
+# print(memory.pooled_fmaps.shape, memory.snapshot().get_bits())
+
+
+# record which elements the tiled run touches and size the SRAM from the reuse distances
+# memory = Memory(config=config, trace=TraceRecorder(), verbosity=0)
+# outputFmaps = np.zeros((ifs.N, fs.M, P, Q))
+# memory.perform_all_convolutions(
+#     outputFmaps, inputFmaps, filters, biases, P, Q, tiling=True, all_nonvolatile=False
+# )
+# print(
+#     analyze_trace(
+#         memory.trace.to_array(), block_size=32, config=config,
+#         itemsizes=memory.trace.itemsizes,
+#     )
+# )
+
+
+# energy and access statistics of every strategy over many runs with random power failures
+# print(monte_carlo(trials=10000, config=config))
+
+
+# old text logs can still be parsed and differenced with benchmark_main
 # benchmark_main("data/benchmarks.txt", "data/benchmarks_diff.csv")
-benchmark_main("data/benchmarks_tiling.txt", "data/benchmarks_diff_tiling.csv")
-benchmark_main(
-    "data/benchmarks_all_nonvolatile.txt", "data/benchmarks_diff_all_nonvolatile.csv"
-)
+# the records of a run are also in data/benchmarks*.csv, see classes/sink.load_results
+# compare the strategies of old text logs (or of records frames) side by side
+# print(compare_strategies(["data/benchmarks.txt", "data/benchmarks_tiling.txt"]))
+main_from_records(memory.records, "data/benchmarks_diff_tiling.csv")
+main_from_records(all_nonvolatile_records, "data/benchmarks_diff_all_nonvolatile.csv")
 
 # move all .xslx files in data to a subfolder called like "ifs.H x ifs.W"
 
@@ -134,6 +230,6 @@ for file in os.listdir("data"):
     if file.endswith(".xlsx"):
         shutil.move(f"data/{file}", f"data/tests/{ifs.H}x{ifs.W}_{fs.R}x{fs.R}_{probability}/{file}")
 
-# os.remove("data/benchmarks.txt")
-os.remove("data/benchmarks_tiling.txt")
-os.remove("data/benchmarks_all_nonvolatile.txt")
\ No newline at end of file
+# os.remove("data/benchmarks.csv")
+os.remove("data/benchmarks_tiling.csv")
+os.remove("data/benchmarks_all_nonvolatile.csv")
\ No newline at end of file
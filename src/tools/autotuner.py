@@ -0,0 +1,156 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from classes.config import Config
+from classes.memoryModel import Memory
+
+
+class TilingConfig:
+    # result of the autotuner: an output tile of tile_height x tile_width elements
+    # (the tiled path of Memory runs one filter and one channel per work item)
+    def __init__(
+        self,
+        tile_height: int,
+        tile_width: int,
+        sram_bytes: int,
+        energy: float,
+        nvm_accesses: int,
+    ) -> None:
+        self.tile_height = tile_height
+        self.tile_width = tile_width
+        self.sram_bytes = sram_bytes
+        self.energy = energy
+        self.nvm_accesses = nvm_accesses
+
+    def __repr__(self) -> str:
+        return (
+            f"TilingConfig(tile={self.tile_height}x{self.tile_width}, SRAM={self.sram_bytes} B, "
+            f"energy={self.energy}, NVM accesses={self.nvm_accesses})"
+        )
+
+
+# layer shape and cost model -> best configuration, so repeated runs don't search again
+_cache: Dict[Tuple, TilingConfig] = {}
+
+
+def candidate_sizes(n: int) -> List[int]:
+    # every size for small dimensions, otherwise divisors and powers of two
+    if n <= 64:
+        return list(range(1, n + 1))
+    candidates = {d for d in range(1, n + 1) if n % d == 0}
+    candidates.update(2**e for e in range(n.bit_length()) if 2**e <= n)
+    candidates.add(n)
+    return sorted(candidates)
+
+
+def tile_extents(n: int, tile: int) -> Dict[int, int]:
+    # size -> number of tiles of that size along a dimension of n outputs
+    extents = {tile: n // tile}
+    if n % tile:
+        extents[n % tile] = 1
+    return extents
+
+
+def evaluate_tilings(
+    memory: Memory, P: int, Q: int, itemsize: Optional[int] = None, multiple: int = 1
+) -> Dict[str, np.ndarray]:
+    # what the tiled path of memory charges for every candidate output tile, for one
+    # work item (one filter channel over one input channel): for every tile the loads
+    # of its kernel and input with the halo, the accesses of its outputs and the stores
+    # of its rows (Memory.load_operands, count_output_accesses and store_output_block). Tiles of the same shape cost the same, so every
+    # shape is counted once on memory and multiplied. memory's counters are used
+    # as scratch. Only tile sizes that are multiples of multiple (the pooling window)
+    # are candidates, itemsize is the element size of memory unless given
+    fs, stride = memory.config.filter_size, memory.config.stride
+    itemsize = itemsize or memory.element_size()
+    heights = [th for th in candidate_sizes(P) if th % multiple == 0] or [min(multiple, P)]
+    widths = [tw for tw in candidate_sizes(Q) if tw % multiple == 0] or [min(multiple, Q)]
+    shape_ledgers: Dict[Tuple[int, int], np.ndarray] = {}
+    candidates: Dict[str, List] = {
+        "tile_height": [], "tile_width": [], "sram_bytes": [], "ledger": [],
+    }
+    for th in heights:
+        for tw in widths:
+            ledger = np.zeros_like(memory.ledger)
+            for height, rows in tile_extents(P, th).items():
+                for width, columns in tile_extents(Q, tw).items():
+                    if (height, width) not in shape_ledgers:
+                        before = memory.ledger.copy()
+                        memory.load_operands(
+                            (height - 1) * stride + fs.R, (width - 1) * stride + fs.S, True
+                        )
+                        memory.count_output_accesses(height * width, True)
+                        memory.store_output_block(height, width, True, row_by_row=True)
+                        shape_ledgers[height, width] = memory.ledger - before
+                    ledger += rows * columns * shape_ledgers[height, width]
+            # SRAM of one tile: kernel channel, input tile with halo and the partial
+            # sums, allocated in the float output fmaps
+            tile_rows = (th - 1) * stride + fs.R
+            tile_cols = (tw - 1) * stride + fs.S
+            candidates["tile_height"].append(th)
+            candidates["tile_width"].append(tw)
+            candidates["sram_bytes"].append(
+                itemsize * (fs.R * fs.S + tile_rows * tile_cols)
+                + memory.config.unit_model.SIZE_OF_FLOAT * th * tw
+            )
+            candidates["ledger"].append(ledger)
+    return {key: np.array(values) for key, values in candidates.items()}
+
+
+def autotune_tiling(
+    objective: str = "energy",
+    config: Optional[Config] = None,
+    itemsize: Optional[int] = None,
+    memory: Optional[Memory] = None,
+) -> TilingConfig:
+    # returns the output tile of the layer shape in config that fits in the volatile
+    # memory and minimises the total energy ("energy") or the NVM traffic ("nvm") of
+    # the tiled path, as the cost model of memory charges it (data types, epilogue,
+    # COST_UNIT, transactions and bursts). memory defaults to a float Memory of config.
+    # itemsize is the size of an fmap or filter element, that of memory unless given
+    if objective not in ("energy", "nvm"):
+        raise ValueError(f"Unknown objective: {objective}")
+    config = config or Config()
+    fs, ifs, mm = config.filter_size, config.input_fmap_size, config.memory_model
+    # a scratch Memory with the cost model of memory, its counters are not touched
+    memory = Memory(
+        config=config,
+        verbosity=0,
+        requantizer=None if memory is None else memory.requantizer,
+        epilogue=None if memory is None else memory.epilogue,
+    )
+    itemsize = itemsize or memory.element_size()
+    pooling = memory.epilogue.pooling
+    key = (
+        ifs.N, fs.M, fs.C, ifs.H, ifs.W, fs.R, fs.S, config.stride,
+        itemsize, mm.VOLATILE_MEMORY_SIZE, mm.BURST_SIZE, memory.costs.tobytes(),
+        memory.widths.tobytes(), None if pooling is None else pooling.size, objective,
+    )
+    if key in _cache:
+        return _cache[key]
+
+    candidates = evaluate_tilings(
+        memory, config.P, config.Q, itemsize, memory.epilogue.rows_per_store
+    )
+    feasible = np.flatnonzero(candidates["sram_bytes"] <= mm.VOLATILE_MEMORY_SIZE)
+    if feasible.size == 0:
+        raise ValueError("No tiling fits in volatile memory for this layer.")
+
+    # every work item (n, m, k, channel) runs the same tiles
+    work_items = ifs.N * fs.M * fs.C * fs.C
+    ledgers = candidates["ledger"] * work_items
+    energy = (ledgers * memory.costs).sum(axis=(1, 2, 3, 4))
+    nvm_accesses = ledgers[:, 0, :, 1].sum(axis=(1, 2))
+    score = energy if objective == "energy" else nvm_accesses
+    # ties are broken in favour of the smallest SRAM footprint
+    order = np.lexsort((candidates["sram_bytes"][feasible], score[feasible]))
+    best = feasible[order[0]]
+
+    best_config = TilingConfig(
+        int(candidates["tile_height"][best]),
+        int(candidates["tile_width"][best]),
+        int(candidates["sram_bytes"][best]),
+        float(energy[best]),
+        int(nvm_accesses[best]),
+    )
+    _cache[key] = best_config
+    return best_config
@@ -1,85 +1,198 @@
-import csv
 import pandas as pd
 import re
 import os
+from classes.sink import ResultsSink
+
+NUMBER = r"([-+\d\.eE]+)"
+# one regex per line of a block of the text log
+HEADER = re.compile(r"InputFmap #(\d+)\s+Filter #(\d+)\s+fmap #(\d+)\s+Channel #\s*(\d+)")
+ENERGY = re.compile(
+    rf"Total energy cost: {NUMBER} In volatile : {NUMBER} In non-volatile : {NUMBER}"
+)
+ACCESSES = re.compile(
+    rf"Total memory accesses: {NUMBER} In volatile : {NUMBER} In non-volatile : {NUMBER}"
+)
+# the counters of the text log, named as the records of Memory (classes/counters.py)
+LOG_COLUMNS = [
+    "total_energy",
+    "volatile_energy",
+    "nonvolatile_energy",
+    "total_accesses",
+    "volatile_accesses",
+    "nonvolatile_accesses",
+]
+LABELS = ["inputFmap", "filter", "fmap", "channel"]
+STRATEGY_ORDER = ("untiled", "tiling", "all_nonvolatile")
+# strategy of a benchmark file, from the names perform_all_convolutions writes
+STRATEGY_FILES = {
+    "benchmarks_all_nonvolatile": "all_nonvolatile",
+    "benchmarks_tiling": "tiling",
+    "benchmarks": "untiled",
+}
+
+# Function to read a text log in chunks of chunk_size blocks, every chunk is parsed with
+# vectorized regexes into a frame with the cumulative counters of every block.
+# Only one chunk of lines is in memory at a time
+def iter_benchmark_chunks(file_path, chunk_size=100000):
+    with open(file_path, 'r') as file:
+        lines = []
+        for line in file:
+            line = line.strip()
+            if line:
+                lines.append(line)
+            # every block is three lines, a chunk always ends on a block boundary
+            if len(lines) >= 3 * chunk_size:
+                yield parse_block_lines(lines)
+                lines = []
+        if lines:
+            yield parse_block_lines(lines)
+
+# Function to parse the lines of whole blocks (header, energy, accesses) into a frame
+def parse_block_lines(lines):
+    if len(lines) % 3:
+        raise ValueError(f"Truncated benchmark block: {lines[-(len(lines) % 3):]}")
+    lines = pd.Series(lines)
+    header = lines[0::3].str.extract(HEADER).reset_index(drop=True)
+    energy = lines[1::3].str.extract(ENERGY).reset_index(drop=True)
+    accesses = lines[2::3].str.extract(ACCESSES).reset_index(drop=True)
+    if pd.concat([header, energy, accesses], axis=1).isna().to_numpy().any():
+        raise ValueError("Malformed benchmark block")
+    return pd.DataFrame({
+        "fmap_info": lines[0::3].reset_index(drop=True),
+        **{label: header[i].astype("int64") for i, label in enumerate(LABELS)},
+        **{column: energy[i].astype("float64") for i, column in enumerate(LOG_COLUMNS[:3])},
+        **{column: accesses[i].astype("int64") for i, column in enumerate(LOG_COLUMNS[3:])},
+    })
+
+# Function to stream a text log as per work item counters: the log has the counters
+# after every work item, consecutive rows are subtracted (the first one from zero,
+# every file is a single run) carrying the last row over chunk boundaries
+def iter_benchmark_differences(file_path, chunk_size=100000, strategy=None):
+    strategy = strategy or benchmark_strategy(file_path)
+    previous = None
+    for chunk in iter_benchmark_chunks(file_path, chunk_size):
+        cumulative = chunk[LOG_COLUMNS]
+        differences = cumulative.diff()
+        differences.iloc[0] = cumulative.iloc[0] - (0 if previous is None else previous)
+        previous = cumulative.iloc[-1]
+        chunk[LOG_COLUMNS] = differences.astype(cumulative.dtypes.to_dict())
+        chunk.insert(0, "strategy", strategy)
+        yield chunk
+
+# Function to get the strategy of a benchmark file from its name
+def benchmark_strategy(file_path):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    for prefix, strategy in STRATEGY_FILES.items():
+        if name.startswith(prefix):
+            return strategy
+    return name
+
+# Function to load the per work item counters of a text log as a single frame
+def load_benchmarks(file_path, chunk_size=100000, strategy=None):
+    return pd.concat(
+        iter_benchmark_differences(file_path, chunk_size, strategy), ignore_index=True
+    )
+
+# Function to aggregate the per work item counters of several logs by the given labels
+# (e.g. ["filter"] or ["channel"]) without loading any log as a whole: sums and counts
+# are accumulated chunk by chunk and the means computed at the end.
+# Sources are text logs or frames (e.g. classes/sink.load_results of a records file)
+def summarize_benchmarks(sources, by=("filter",), chunk_size=100000):
+    by = ["strategy", *by]
+    partial = []
+    for source in sources:
+        chunks = (
+            [source] if isinstance(source, pd.DataFrame)
+            else iter_benchmark_differences(source, chunk_size)
+        )
+        for chunk in chunks:
+            if "strategy" not in chunk:
+                chunk = chunk.assign(strategy=chunk_strategy(chunk))
+            grouped = chunk.groupby(by)[LOG_COLUMNS]
+            partial.append(grouped.sum().join(grouped.size().rename("work_items")))
+    totals = pd.concat(partial).groupby(level=by).sum()
+    means = totals[LOG_COLUMNS].div(totals["work_items"], axis=0).add_prefix("mean_")
+    return totals.join(means).reset_index()
+
+# Function to name the strategy of a records frame from its tiling/all_nonvolatile labels
+def chunk_strategy(chunk):
+    strategy = pd.Series("untiled", index=chunk.index)
+    strategy[chunk["tiling"].astype(bool)] = "tiling"
+    strategy[chunk["all_nonvolatile"].astype(bool)] = "all_nonvolatile"
+    return strategy
+
+# Function to compare the strategies side by side: one row per counter, one column with
+# the total of every strategy and, if the untiled run is there, the ratio to it
+def compare_strategies(sources, chunk_size=100000):
+    totals = summarize_benchmarks(sources, by=(), chunk_size=chunk_size)
+    comparison = totals.set_index("strategy")[LOG_COLUMNS + ["work_items"]].T
+    order = [s for s in STRATEGY_ORDER if s in comparison]
+    comparison = comparison[order + [s for s in comparison if s not in order]]
+    if "untiled" in comparison:
+        for strategy in comparison.columns.drop("untiled"):
+            comparison[f"{strategy}_vs_untiled"] = comparison[strategy] / comparison["untiled"]
+    comparison.columns.name = None
+    return comparison
 
 # Function to parse the text file and extract relevant data
 def parse_benchmarks(file_path):
-    with open(file_path, 'r') as file:
-        data = file.read().strip().split('\n\n')
-    
-    parsed_data = []
-    for block in data:
-        lines = block.strip().split('\n')
-        fmap_info = lines[0]
-        total_energy_cost = float(re.search(r"Total energy cost: ([\d\.]+)", lines[1]).group(1))
-        volatile_energy = float(re.search(r"In volatile : ([\d\.]+)", lines[1]).group(1))
-        non_volatile_energy = float(re.search(r"In non-volatile : ([\d\.]+)", lines[1]).group(1))
-        total_memory_accesses = int(re.search(r"Total memory accesses: (\d+)", lines[2]).group(1))
-        volatile_accesses = int(re.search(r"In volatile : (\d+)", lines[2]).group(1))
-        non_volatile_accesses = int(re.search(r"In non-volatile : (\d+)", lines[2]).group(1))
-        
-        parsed_data.append({
-            "fmap_info": fmap_info,
-            "total_energy_cost": total_energy_cost,
-            "volatile_energy": volatile_energy,
-            "non_volatile_energy": non_volatile_energy,
-            "total_memory_accesses": total_memory_accesses,
-            "volatile_accesses": volatile_accesses,
-            "non_volatile_accesses": non_volatile_accesses
-        })
-    
-    return parsed_data
+    return pd.concat(iter_benchmark_chunks(file_path), ignore_index=True).rename(
+        columns={
+            "total_energy": "total_energy_cost",
+            "nonvolatile_energy": "non_volatile_energy",
+            "total_accesses": "total_memory_accesses",
+            "nonvolatile_accesses": "non_volatile_accesses",
+        }
+    )[
+        [
+            "fmap_info",
+            "total_energy_cost",
+            "volatile_energy",
+            "non_volatile_energy",
+            "total_memory_accesses",
+            "volatile_accesses",
+            "non_volatile_accesses",
+        ]
+    ].to_dict("records")
 
 # Function to compute differences and save to a CSV file
 def compute_differences_and_save(parsed_data, output_file):
-    differences = []
-
-    for i in range(1, len(parsed_data)):
-        prev = parsed_data[i - 1]
-        curr = parsed_data[i]
-
-        diff = {
-            "fmap_info": curr["fmap_info"],
-            "total_energy_cost_diff": curr["total_energy_cost"] - prev["total_energy_cost"],
-            "volatile_energy_diff": curr["volatile_energy"] - prev["volatile_energy"],
-            "non_volatile_energy_diff": curr["non_volatile_energy"] - prev["non_volatile_energy"],
-            "total_memory_accesses_diff": curr["total_memory_accesses"] - prev["total_memory_accesses"],
-            "volatile_accesses_diff": curr["volatile_accesses"] - prev["volatile_accesses"],
-            "non_volatile_accesses_diff": curr["non_volatile_accesses"] - prev["non_volatile_accesses"]
-        }
-
-        differences.append(diff)
+    parsed = pd.DataFrame(parsed_data)
+    counters = parsed.drop(columns="fmap_info")
+    # the first block has nothing to be subtracted from
+    differences = counters.diff().iloc[1:].add_suffix("_diff")
+    differences.insert(0, "fmap_info", parsed["fmap_info"].iloc[1:])
 
     # Compute averages
-    avg_diff = {
-        "fmap_info": "Average",
-        "total_energy_cost_diff": sum(d["total_energy_cost_diff"] for d in differences) / len(differences),
-        "volatile_energy_diff": sum(d["volatile_energy_diff"] for d in differences) / len(differences),
-        "non_volatile_energy_diff": sum(d["non_volatile_energy_diff"] for d in differences) / len(differences),
-        "total_memory_accesses_diff": sum(d["total_memory_accesses_diff"] for d in differences) / len(differences),
-        "volatile_accesses_diff": sum(d["volatile_accesses_diff"] for d in differences) / len(differences),
-        "non_volatile_accesses_diff": sum(d["non_volatile_accesses_diff"] for d in differences) / len(differences)
-    }
-
-    differences.append(avg_diff)
+    average = differences.drop(columns="fmap_info").mean()
+    differences.loc[len(parsed)] = {"fmap_info": "Average", **average.to_dict()}
 
     # Save to CSV
-    with open(output_file, 'w', newline='') as csvfile:
-        fieldnames = [
-            "fmap_info",
-            "total_energy_cost_diff",
-            "volatile_energy_diff",
-            "non_volatile_energy_diff",
-            "total_memory_accesses_diff",
-            "volatile_accesses_diff",
-            "non_volatile_accesses_diff"
-        ]
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    differences.to_csv(output_file, index=False)
 
-        writer.writeheader()
-        for diff in differences:
-            writer.writerow(diff)
+# Function to build the per work item records of Memory.records in the same layout,
+# the counters are already per work item so nothing has to be parsed or subtracted
+def records_frame(records):
+    df = records.to_frame() if isinstance(records, ResultsSink) else pd.DataFrame(records)
+    differences = pd.DataFrame({
+        "fmap_info": [
+            f"InputFmap #{r.inputFmap} Filter #{r.filter} fmap #{r.fmap} Channel # {r.channel}"
+            for r in df.itertuples()
+        ],
+        "total_energy_cost_diff": df["total_energy"],
+        "volatile_energy_diff": df["volatile_energy"],
+        "non_volatile_energy_diff": df["nonvolatile_energy"],
+        "total_memory_accesses_diff": df["total_accesses"],
+        "volatile_accesses_diff": df["volatile_accesses"],
+        "non_volatile_accesses_diff": df["nonvolatile_accesses"]
+    })
+    average = differences.drop(columns="fmap_info").mean()
+    differences.loc[len(differences)] = {"fmap_info": "Average", **average.to_dict()}
+    return differences
+
+# Function to save the records as a csv file
+def save_records(records, output_file):
+    records_frame(records).to_csv(output_file, index=False)
 
 # Main function to execute the script
 def main(file_path: str, output_file_path: str):
@@ -90,6 +203,12 @@ def main(file_path: str, output_file_path: str):
     os.remove(output_file_path)
     print(f"Differences computed and saved to {output_file_path.replace('.csv', '.xlsx')}")
 
+# Same as main, but from the records of a Memory (a list of dicts or a ResultsSink),
+# the frame goes straight to Excel without the temporary csv
+def main_from_records(records, output_file_path: str):
+    records_frame(records).to_excel(output_file_path.replace(".csv", ".xlsx"), index=False)
+    print(f"Records saved to {output_file_path.replace('.csv', '.xlsx')}")
+
 if __name__ == "__main__":
     file_path = "input.txt"  # Replace with your input file path
     output_file_path = "output.csv"  # Replace with your desired output file path
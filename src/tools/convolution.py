@@ -1,12 +1,10 @@
-from classes.consts import (
-    FilterSize as fs,
-    InputFmapSize as ifs,
-    OutputFmapSize as ofs,
-    U as stride,
-)
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+import numpy as np
+from classes.config import Config
+from classes.consts import U
 from classes.InputFeatureMap import InputFeatureMap
 from classes.filter import Filter
+from classes.operators import RELU
 
 
 # def convolution(
@@ -44,7 +42,17 @@ def convolution(
     biases: Dict[int, float],
     P: int,
     Q: int,
+    channels: Optional[List[int]] = None,
+    config: Optional[Config] = None,
+    activation: Any = None,
 ):
+    config = config or Config()
+    fs, ifs, stride = config.filter_size, config.input_fmap_size, config.stride
+    # channels restricts the accumulation to a subset of the input channels
+    # (used to validate the one-by-one monitored path), by default we use all of them.
+    # activation is one of classes/operators.py, ReLU by default
+    channels = list(range(fs.C)) if channels is None else channels
+    activation = activation or RELU
     # Iterate over each input feature map
     for n in range(ifs.N):
         # Iterate over each filter
@@ -58,7 +66,7 @@ def convolution(
                     # Perform the convolution operation
                     for i in range(fs.R):
                         for j in range(fs.S):
-                            for k in range(fs.C):
+                            for k in channels:
                                 # Load the input feature map value
                                 input_value = inputFmaps[n].fmap[k][x * stride + i][y * stride + j]  # 1 load
                                 # Load the filter kernel value
@@ -68,9 +76,8 @@ def convolution(
                                 # Accumulate the result
                                 output_value += product  # 1 load (for output_value) + 1 store (for output_value)
 
-                    # Apply activation function (ReLU)
-                    if output_value < 0:
-                        output_value = 0  # No additional load/store
+                    # Apply activation function (ReLU by default)
+                    output_value = activation(output_value)  # No additional load/store
                     # Store the final output value
                     outputFmaps[n][m][x][y] = output_value  # 1 store
 
@@ -84,7 +91,10 @@ def flattened_convolution(outputFmaps: List[Any],
     flattened_filters: Dict[int, Filter],
     biases: Dict[int, float],
     P: int,
-    Q: int):
+    Q: int,
+    config: Optional[Config] = None):
+    config = config or Config()
+    fs, ifs, stride = config.filter_size, config.input_fmap_size, config.stride
     for n in range(ifs.N):
         for m in range(fs.M):
             for x in range(P):
@@ -102,4 +112,150 @@ def flattened_convolution(outputFmaps: List[Any],
                                 filter_idx = k * (fs.R * fs.S) + i * fs.S + j
                                 output_value += flattened_input_fmaps[n, input_idx] * flattened_filters[m, filter_idx]
                     outputFmaps[n, m, x, y] = output_value
-    return outputFmaps
\ No newline at end of file
+    return outputFmaps
+
+
+def sliding_windows(
+    fmaps: np.ndarray, P: int, Q: int, R: int, S: int, stride: int = U
+) -> np.ndarray:
+    # zero-copy view of every R x S receptive field of fmaps (N x C x H x W),
+    # the result has shape N x C x P x Q x R x S and shares memory with fmaps
+    windows = np.lib.stride_tricks.sliding_window_view(fmaps, (R, S), axis=(2, 3))
+    return windows[:, :, : (P - 1) * stride + 1 : stride, : (Q - 1) * stride + 1 : stride]
+
+
+def vectorized_convolution(
+    outputFmaps: List[Any],
+    inputFmaps: List[InputFeatureMap],
+    filters: Dict[int, Filter],
+    biases: Dict[int, float],
+    P: int,
+    Q: int,
+    channels: Optional[List[int]] = None,
+    exact: bool = True,
+    config: Optional[Config] = None,
+    activation: Any = None,
+):
+    # same inputs and same result as convolution(), but every loop except the
+    # R x S x C reduction is done by numpy on the whole N x M x P x Q output at once
+    config = config or Config()
+    fs, ifs = config.filter_size, config.input_fmap_size
+    fmaps = np.stack([inputFmaps[n].fmap for n in range(ifs.N)])
+    kernels = np.stack([filters[m].kernel for m in range(fs.M)])
+    bias_values = np.array([biases[m] for m in range(fs.M)], dtype=np.float64)
+    output = convolve_arrays(
+        fmaps, kernels, bias_values, P, Q, channels, exact, config.stride, activation
+    )
+    for n in range(ifs.N):
+        for m in range(fs.M):
+            outputFmaps[n][m][:P, :Q] = output[n, m]
+    return outputFmaps
+
+
+def convolve_arrays(
+    fmaps: np.ndarray,
+    kernels: np.ndarray,
+    bias_values: np.ndarray,
+    P: int,
+    Q: int,
+    channels: Optional[List[int]] = None,
+    exact: bool = True,
+    stride: int = U,
+    activation: Any = None,
+    initial: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    # core of vectorized_convolution working directly on stacked arrays:
+    # fmaps is N x C x H x W, kernels is M x C x R x S, bias_values has M entries.
+    # initial (N x M x P x Q) are partial sums to continue from instead of the biases
+    channels = list(range(fmaps.shape[1])) if channels is None else channels
+    R, S = kernels.shape[2:]
+    windows = sliding_windows(fmaps, P, Q, R, S, stride)  # N x C x P x Q x R x S
+
+    output = np.empty((fmaps.shape[0], kernels.shape[0], P, Q))
+    if initial is None:
+        output[...] = bias_values[None, :, None, None]
+    else:
+        output[...] = initial
+    if exact:
+        # accumulate in the same (i, j, k) order as the scalar loops so that
+        # the floating point rounding, and therefore the result, is bit-identical
+        for i in range(R):
+            for j in range(S):
+                for k in channels:
+                    output += (
+                        windows[:, None, k, :, :, i, j]
+                        * kernels[None, :, k, i, j, None, None]
+                    )
+    else:
+        # im2col + a single batched matmul, faster but the summation order differs
+        # so results only match the scalar loops up to rounding
+        cols = windows[:, channels].transpose(0, 2, 3, 1, 4, 5).reshape(
+            fmaps.shape[0], P * Q, len(channels) * R * S
+        )
+        weights = kernels[:, channels].reshape(kernels.shape[0], -1)
+        output += (cols @ weights.T).transpose(0, 2, 1).reshape(output.shape)
+
+    # Apply activation function (ReLU by default, a select that keeps -0.0 untouched)
+    return (activation or RELU)(output)
+
+
+def quantized_convolve_arrays(
+    fmaps: np.ndarray,
+    kernels: np.ndarray,
+    bias_values: np.ndarray,
+    P: int,
+    Q: int,
+    requantizer: Any,
+    channels: Optional[List[int]] = None,
+    stride: int = U,
+    activation: Any = None,
+) -> np.ndarray:
+    # fixed-point counterpart of convolve_arrays: integer fmaps and kernels, integer
+    # biases in the accumulator scale, requantization (classes/quantization.py) and the activation.
+    # Integer sums don't depend on the order, so a single einsum is exact
+    channels = list(range(fmaps.shape[1])) if channels is None else channels
+    R, S = kernels.shape[2:]
+    windows = sliding_windows(fmaps, P, Q, R, S, stride)  # N x C x P x Q x R x S
+    accumulator = np.einsum(
+        "ncpqrs,mcrs->nmpq",
+        windows[:, channels].astype(np.int64),
+        kernels[:, channels].astype(np.int64),
+    )
+    accumulator += np.asarray(bias_values, dtype=np.int64)[None, :, None, None]
+    return (activation or RELU)(requantizer(accumulator))
+
+
+def quantized_convolution(
+    outputFmaps: List[Any],
+    inputFmaps: List[InputFeatureMap],
+    filters: Dict[int, Filter],
+    biases: Dict[int, int],
+    P: int,
+    Q: int,
+    channels: Optional[List[int]] = None,
+    config: Optional[Config] = None,
+    requantizer: Any = None,
+    activation: Any = None,
+):
+    # vectorized_convolution for the fixed-point data of classes/quantization.quantize_layer
+    if requantizer is None:
+        raise ValueError("Quantized convolution needs a requantizer.")
+    config = config or Config()
+    fs, ifs = config.filter_size, config.input_fmap_size
+    fmaps = np.stack([inputFmaps[n].fmap for n in range(ifs.N)])
+    kernels = np.stack([filters[m].kernel for m in range(fs.M)])
+    bias_values = np.array([biases[m] for m in range(fs.M)], dtype=np.int64)
+    output = quantized_convolve_arrays(
+        fmaps, kernels, bias_values, P, Q, requantizer, channels, config.stride, activation
+    )
+    for n in range(ifs.N):
+        for m in range(fs.M):
+            outputFmaps[n][m][:P, :Q] = output[n, m]
+    return outputFmaps
+
+
+# engines that can be used as reference by the monitored paths in Memory
+CONVOLUTION_ENGINES = {
+    "scalar": convolution,
+    "vectorized": vectorized_convolution,
+}
@@ -1,20 +1,27 @@
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 import numpy as np
 import json
 from classes.InputFeatureMap import InputFeatureMap
 from classes.memoryModel import Memory
 from classes.filter import Filter
-from classes.consts import (
-    FilterSize as fs,
-    InputFmapSize as ifs,
-    OutputFmapSize as ofs,
-    U as stride,
-)
+from classes.config import Config
 from collections import defaultdict
 
+# binary layout: one .npy file per tensor, kernels are M x C x R x S,
+# biases have M entries and input fmaps are N x C x H x W
+FILTERS_FILE = "data/filters.npy"
+BIASES_FILE = "data/biases.npy"
+INPUT_FMAPS_FILE = "data/input_fmaps.npy"
 
-def data_loader() -> tuple[Dict[int, Filter], Dict[int, float], List[InputFeatureMap]]:
+
+def data_loader(
+    config: Optional[Config] = None, binary: bool = False
+) -> tuple[Dict[int, Filter], Dict[int, float], List[InputFeatureMap]]:
     # this function loads data from json files and returns it in a cool tuple
+    config = config or Config()
+    if binary:
+        return binary_data_loader(config)
+    fs, ifs = config.filter_size, config.input_fmap_size
     filters: Dict[int, Filter] = defaultdict(Filter)
     with open("data/filters.json", "r") as f:
         filters_json = json.load(f)
@@ -25,7 +32,7 @@ def data_loader() -> tuple[Dict[int, Filter], Dict[int, float], List[InputFeatur
                 kernel.append([])
                 for r in range(fs.R):
                     kernel[c].append(filters_json[m]["kernel"][f"channel_{c}"][f"row_{r}"])
-            filters[m] = Filter(bias, np.array(kernel))
+            filters[m] = Filter(bias, np.array(kernel), config=config)
     biases: Dict[int, float] = defaultdict(float)
     for m in range(fs.M):
         biases[m] = filters[m].get_bias()
@@ -38,5 +45,46 @@ def data_loader() -> tuple[Dict[int, Filter], Dict[int, float], List[InputFeatur
                 fmap.append([])
                 for h in range(ifs.H):
                     fmap[c].append(input_fmaps_json[n]["fmap"][f"channel_{c}"][f"row_{h}"])
-            inputFmaps.append(InputFeatureMap(np.array(fmap)))
+            inputFmaps.append(InputFeatureMap(np.array(fmap), config=config))
     return (filters, biases, inputFmaps)
+
+
+def binary_data_loader(
+    config: Optional[Config] = None,
+) -> tuple[Dict[int, Filter], Dict[int, float], List[InputFeatureMap]]:
+    # same tuple as data_loader, but the arrays are memory-mapped from the .npy files:
+    # nothing is parsed and only the pages that are actually touched are read
+    config = config or Config()
+    fs, ifs = config.filter_size, config.input_fmap_size
+    kernels = np.load(FILTERS_FILE, mmap_mode="r")
+    bias_values = np.load(BIASES_FILE, mmap_mode="r")
+    fmaps = np.load(INPUT_FMAPS_FILE, mmap_mode="r")
+    if kernels.shape != (fs.M, fs.C, fs.R, fs.S) or bias_values.shape != (fs.M,):
+        raise ValueError(f"Filters in {FILTERS_FILE} do not match the configured filter size.")
+    if fmaps.shape != (ifs.N, ifs.C, ifs.H, ifs.W):
+        raise ValueError(f"Fmaps in {INPUT_FMAPS_FILE} do not match the configured fmap size.")
+
+    filters: Dict[int, Filter] = defaultdict(Filter)
+    biases: Dict[int, float] = defaultdict(float)
+    for m in range(fs.M):
+        filters[m] = Filter(float(bias_values[m]), kernels[m], config=config)
+        biases[m] = filters[m].get_bias()
+    inputFmaps: List[InputFeatureMap] = [
+        InputFeatureMap(fmaps[n], config=config) for n in range(ifs.N)
+    ]
+    return (filters, biases, inputFmaps)
+
+
+def save_binary_data(
+    filters: Dict[int, Filter], inputFmaps: List[InputFeatureMap]
+) -> None:
+    # write the tensors in the layout read by binary_data_loader
+    np.save(FILTERS_FILE, np.stack([filters[m].kernel for m in range(len(filters))]))
+    np.save(BIASES_FILE, np.array([filters[m].get_bias() for m in range(len(filters))]))
+    np.save(INPUT_FMAPS_FILE, np.stack([inputFmap.fmap for inputFmap in inputFmaps]))
+
+
+def convert_json_to_binary(config: Optional[Config] = None) -> None:
+    # one-off conversion of the existing data/*.json files to the binary layout
+    filters, _, inputFmaps = data_loader(config)
+    save_binary_data(filters, inputFmaps)
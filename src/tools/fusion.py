@@ -0,0 +1,322 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from classes.config import Config
+from classes.counters import CounterSnapshot
+from classes.filter import Filter
+from classes.InputFeatureMap import InputFeatureMap
+from classes.memoryModel import Memory
+from classes.network import ConvLayer, Network, PoolLayer, ReLULayer
+from classes.operators import Epilogue
+from tools.autotuner import candidate_sizes
+from tools.convolution import convolve_arrays
+from tools.pipeline import run_network
+
+# region of an fmap: first row, first column, rows, columns
+Region = Tuple[int, int, int, int]
+
+
+def layer_window(layer: Any) -> Tuple[int, int, int]:
+    # rows and columns of input behind one output element, and the stride
+    if isinstance(layer, ConvLayer):
+        return layer.kernel_size + (layer.stride,)
+    if isinstance(layer, PoolLayer):
+        return (layer.size, layer.size, layer.stride)
+    return (1, 1, 1)
+
+
+def region_extents(network: Network, start: int, length: int, axis: int) -> List[Tuple[int, int]]:
+    # (start, length) along rows (axis 0) or columns (axis 1) of every fmap of the
+    # network needed to compute length outputs of the last layer from start on.
+    # Going back through a layer, consecutive outputs share window - stride inputs
+    extents = [(start, length)]
+    for layer in reversed(network.layers):
+        window, stride = layer_window(layer)[axis], layer_window(layer)[2]
+        start, length = start * stride, (length - 1) * stride + window
+        extents.append((start, length))
+    return extents[::-1]
+
+
+def fused_regions(network: Network, p0: int, q0: int, height: int, width: int) -> List[Region]:
+    # region of every fmap (network input first) behind one output tile
+    rows = region_extents(network, p0, height, 0)
+    cols = region_extents(network, q0, width, 1)
+    return [(r0, c0, r, c) for (r0, r), (c0, c) in zip(rows, cols)]
+
+
+def weight_elements(network: Network) -> int:
+    shapes = network.shapes()
+    elements = 0
+    for layer, (N, C, H, W) in zip(network.layers, shapes):
+        if isinstance(layer, ConvLayer):
+            R, S = layer.kernel_size
+            elements += layer.filters * (C * R * S + 1)
+    return elements
+
+
+def output_accesses(layer: Any, channels: int, outputs: int) -> Tuple[int, int]:
+    # SRAM reads and writes to compute outputs output elements of the layer, as the
+    # monitored loops count them (see Memory.count_output_accesses)
+    if isinstance(layer, ConvLayer):
+        macs = outputs * channels * layer.kernel_size[0] * layer.kernel_size[1]
+        return 3 * macs + 2 * outputs, macs + 2 * outputs
+    if isinstance(layer, PoolLayer):
+        return outputs * layer.size * layer.size, outputs
+    return outputs, outputs
+
+
+def evaluate_fused_tilings(
+    network: Network, config: Optional[Config] = None, itemsize: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    # closed-form cost of every candidate output tile of the fused network: the input
+    # region of a tile is loaded from FRAM, every intermediate region is computed in
+    # SRAM (halos again for every tile) and only the output tile is stored to FRAM.
+    # Regions are separable, so totals are sums over the tile rows times sums over
+    # the tile columns
+    config = config or Config()
+    itemsize = itemsize or config.unit_model.SIZE_OF_FLOAT
+    mm = config.memory_model
+    shapes = network.shapes()
+    N, _, P, Q = shapes[-1]
+    candidates: Dict[str, List[Any]] = {
+        "tile_height": [], "tile_width": [], "sram_bytes": [], "nvm_reads": [],
+        "computed": [], "energy": [],
+    }
+    weights = weight_elements(network)
+    for th in candidate_sizes(P):
+        row_extents = [region_extents(network, p0, min(th, P - p0), 0) for p0 in range(0, P, th)]
+        rows = np.array([[length for _, length in extents] for extents in row_extents]).sum(axis=0)
+        for tw in candidate_sizes(Q):
+            col_extents = [
+                region_extents(network, q0, min(tw, Q - q0), 1) for q0 in range(0, Q, tw)
+            ]
+            cols = np.array([[length for _, length in extents] for extents in col_extents]).sum(axis=0)
+            # elements of every fmap over all the tiles, halos counted every time
+            computed = [N * shape[1] * int(r) * int(c) for shape, r, c in zip(shapes, rows, cols)]
+            # the largest tile holds the input and the output region of one layer at a time
+            largest = fused_regions(network, 0, 0, min(th, P), min(tw, Q))
+            region_bytes = [
+                itemsize * N * shape[1] * r * c for shape, (_, _, r, c) in zip(shapes, largest)
+            ]
+            sram_bytes = itemsize * weights + max(
+                a + b for a, b in zip(region_bytes[:-1], region_bytes[1:])
+            )
+            reads = writes = 0
+            for index, layer in enumerate(network.layers):
+                layer_reads, layer_writes = output_accesses(
+                    layer, shapes[index][1], computed[index + 1]
+                )
+                reads += layer_reads
+                writes += layer_writes
+            energy = (
+                (computed[0] + weights) * (mm.NONVOLATILE_READ + mm.VOLATILE_WRITE)
+                + reads * mm.VOLATILE_READ
+                + writes * mm.VOLATILE_WRITE
+            )
+            candidates["tile_height"].append(th)
+            candidates["tile_width"].append(tw)
+            candidates["sram_bytes"].append(sram_bytes)
+            candidates["nvm_reads"].append(computed[0] + weights)
+            candidates["computed"].append(computed)
+            candidates["energy"].append(energy)
+    return {key: np.array(values) for key, values in candidates.items()}
+
+
+def plan_fused_tiling(
+    network: Network, config: Optional[Config] = None, itemsize: Optional[int] = None
+) -> Tuple[int, int]:
+    # output tile of the fused network with the lowest energy that fits in SRAM
+    config = config or Config()
+    candidates = evaluate_fused_tilings(network, config, itemsize)
+    feasible = np.flatnonzero(
+        candidates["sram_bytes"] <= config.memory_model.VOLATILE_MEMORY_SIZE
+    )
+    if feasible.size == 0:
+        raise ValueError("No fused tiling fits in volatile memory for this network.")
+    # ties are broken in favour of the smallest SRAM footprint
+    order = np.lexsort((candidates["sram_bytes"][feasible], candidates["energy"][feasible]))
+    best = feasible[order[0]]
+    return int(candidates["tile_height"][best]), int(candidates["tile_width"][best])
+
+
+def layer_by_layer_traffic(
+    network: Network,
+    config: Config,
+    inputFmaps: List[InputFeatureMap],
+    weights: List[Optional[Tuple[Dict[int, Filter], Dict[int, float]]]],
+    epilogue: Optional[Epilogue] = None,
+) -> Tuple[CounterSnapshot, int]:
+    # what tools/pipeline.run_network with reuse=False charges for the same network and
+    # data on a Memory of its own, and the MACs it runs: every layer loads its input
+    # and weights from FRAM and stores its whole output, the convolutions sum over the
+    # input channels like the fused ones. Fused execution injects no power failures,
+    # so neither does this run
+    config = config.replace(energy_model={"POWER_FAILURE_PROBABILITY": 0.0})
+    memory = Memory(config=config, verbosity=0, epilogue=epilogue)
+    before = memory.snapshot()
+    run_network(network, memory, inputFmaps, weights, reuse=False)
+    return memory.snapshot() - before, memory.progress.macs
+
+
+def run_fused(
+    network: Network,
+    memory: Optional[Memory] = None,
+    inputFmaps: Optional[List[InputFeatureMap]] = None,
+    weights: Optional[List[Optional[Tuple[Dict[int, Filter], Dict[int, float]]]]] = None,
+    tile_shape: Optional[Tuple[int, int]] = None,
+) -> Tuple[np.ndarray, Dict[str, Any]]:
+    # depth-first execution of the whole network: for every output tile of the last
+    # layer the matching input region (halo included) is loaded from FRAM and every
+    # layer computes the region the next one needs in SRAM, so the intermediate fmaps
+    # never go to FRAM. The weights of every layer stay in SRAM for the whole run.
+    # Convolutions accumulate every input channel (the reference convolution of
+    # tools/convolution.py) and apply the activation of memory.
+    # Returns the output fmaps and a report: SRAM peak, recomputed halo elements per
+    # layer and, against layer-by-layer execution measured by running it
+    # (layer_by_layer_traffic), the FRAM traffic and energy saved apart from the MACs,
+    # SRAM accesses and SRAM energy the halo recomputation adds
+    memory = memory or Memory(verbosity=0)
+    if memory.requantizer is not None:
+        raise ValueError("Fixed-point networks need one requantizer per layer.")
+    if memory.epilogue.pooling is not None:
+        raise ValueError("Pooling in a network is a PoolLayer, not an epilogue of the memory.")
+    inputFmaps = inputFmaps or network.generate_inputs()
+    weights = weights or network.generate_weights(memory.config)
+    itemsize = memory.element_size()
+    shapes = network.shapes()
+    N, M, P, Q = shapes[-1]
+    if tile_shape is None:
+        tile_shape = plan_fused_tiling(network, memory.config, itemsize)
+    tile_height, tile_width = tile_shape
+
+    fmaps = np.stack([fmap.fmap for fmap in inputFmaps]).astype(np.float64)
+    layer_weights = []
+    for layer, layer_weight in zip(network.layers, weights):
+        if isinstance(layer, ConvLayer):
+            filters, biases = layer_weight
+            layer_weights.append(
+                (
+                    np.stack([filters[m].kernel for m in range(layer.filters)]),
+                    np.array([biases[m] for m in range(layer.filters)], dtype=np.float64),
+                )
+            )
+        else:
+            layer_weights.append(None)
+    output = np.zeros(shapes[-1])
+    before = memory.snapshot()
+    macs = memory.progress.macs
+    handles = [memory.alloc(kernels, volatile=True) for kernels, _ in filter(None, layer_weights)]
+    handles += [memory.alloc(bias, volatile=True) for _, bias in filter(None, layer_weights)]
+    biases = sum(bias.size for _, bias in filter(None, layer_weights))
+    for role, elements in (("filters", weight_elements(network) - biases), ("biases", biases)):
+        memory.transfer(False, False, elements, role)
+        memory.transfer(True, True, elements, role)
+    peak = memory.volatile_memory_usage
+    computed = [0] * len(shapes)
+    input_reads = 0
+    # the intermediate regions are never stored, the output tile is stored at the end
+    memory.keep_outputs = True
+    try:
+        for p0 in range(0, P, tile_height):
+            for q0 in range(0, Q, tile_width):
+                height, width = min(tile_height, P - p0), min(tile_width, Q - q0)
+                regions = fused_regions(network, p0, q0, height, width)
+                r0, c0, rows, cols = regions[0]
+                data = np.ascontiguousarray(fmaps[:, :, r0 : r0 + rows, c0 : c0 + cols])
+                data_handle = memory.alloc(data, volatile=True)
+                # one contiguous run per row of the region
+                memory.transfer(False, False, cols, "input", runs=data.shape[0] * data.shape[1] * rows)
+                memory.transfer(True, True, cols, "input", runs=data.shape[0] * data.shape[1] * rows)
+                input_reads += data.size
+                computed[0] += data.size
+                for index, layer in enumerate(network.layers):
+                    _, _, rows, cols = regions[index + 1]
+                    if isinstance(layer, ConvLayer):
+                        kernels, bias = layer_weights[index]
+                        result = convolve_arrays(
+                            data, kernels, bias, rows, cols, stride=layer.stride,
+                            activation=memory.activation,
+                        )
+                        R, S = layer.kernel_size
+                        memory.count_output_accesses(result.size, True, taps=data.shape[1] * R * S)
+                        memory.progress.macs += result.size * data.shape[1] * R * S
+                    elif isinstance(layer, PoolLayer):
+                        result = memory.monitor_pooling(data, layer.size, layer.stride, layer.mode)
+                    elif isinstance(layer, ReLULayer):
+                        result = memory.monitor_activation(data)
+                    else:
+                        raise ValueError(f"Unknown layer: {layer}")
+                    result_handle = memory.alloc(result, volatile=True)
+                    peak = max(peak, memory.volatile_memory_usage)
+                    memory.free(data_handle, volatile=True)
+                    data, data_handle = result, result_handle
+                    computed[index + 1] += result.size
+                output[:, :, p0 : p0 + height, q0 : q0 + width] = data
+                # one FRAM write per output row of the tile
+                memory.keep_outputs = False
+                memory.store_outputs(width, runs=N * M * height)
+                memory.keep_outputs = True
+                memory.free(data_handle, volatile=True)
+    finally:
+        memory.keep_outputs = False
+        for handle in handles:
+            if memory.check_if_volatile(handle):
+                memory.free(handle, volatile=True)
+    memory.progress.completed_outputs += output.size
+
+    unique = [int(np.prod(shape)) for shape in shapes]
+    layers = pd.DataFrame(
+        {
+            "layer": range(len(network)),
+            "name": [layer.name for layer in network.layers],
+            "outputs": unique[1:],
+            "computed": computed[1:],
+            "recomputed": [c - u for c, u in zip(computed[1:], unique[1:])],
+            "recompute_overhead": [c / u - 1 for c, u in zip(computed[1:], unique[1:])],
+        }
+    )
+    fused = memory.snapshot() - before
+    macs = memory.progress.macs - macs
+    baseline, layer_macs = layer_by_layer_traffic(
+        network, memory.config, inputFmaps, weights, memory.epilogue
+    )
+    sram_reads, sram_writes, nvm_reads, nvm_writes = fused.get_counters()
+    layer_sram_reads, layer_sram_writes, layer_reads, layer_writes = baseline.get_counters()
+    nvm_bits = sum(fused.get_bits()[2:])
+    layer_bits = sum(baseline.get_bits()[2:])
+    energy = fused.get_energy_by_level()
+    layer_energy = baseline.get_energy_by_level()
+    report = {
+        "tile_shape": tile_shape,
+        "tiles": -(-P // tile_height) * -(-Q // tile_width),
+        "sram_peak": peak,
+        # FRAM traffic: what fusion saves
+        "nvm_reads": nvm_reads,
+        "nvm_writes": nvm_writes,
+        "nvm_bits": nvm_bits,
+        "nvm_energy": energy["nonvolatile"],
+        "layer_by_layer_nvm_reads": layer_reads,
+        "layer_by_layer_nvm_writes": layer_writes,
+        "layer_by_layer_nvm_bits": layer_bits,
+        "layer_by_layer_nvm_energy": layer_energy["nonvolatile"],
+        "nvm_accesses_saved": layer_reads + layer_writes - nvm_reads - nvm_writes,
+        "nvm_bits_saved": layer_bits - nvm_bits,
+        "nvm_energy_saved": layer_energy["nonvolatile"] - energy["nonvolatile"],
+        # compute in SRAM: what the recomputed halos cost
+        "macs": macs,
+        "sram_reads": sram_reads,
+        "sram_writes": sram_writes,
+        "sram_energy": energy["volatile"],
+        "layer_by_layer_macs": layer_macs,
+        "layer_by_layer_sram_reads": layer_sram_reads,
+        "layer_by_layer_sram_writes": layer_sram_writes,
+        "layer_by_layer_sram_energy": layer_energy["volatile"],
+        "macs_added": macs - layer_macs,
+        "sram_energy_added": energy["volatile"] - layer_energy["volatile"],
+        "input_halo_reads": input_reads - unique[0],
+        "recomputed_outputs": int(layers["recomputed"].sum()),
+        "energy": fused.get_total_energy_cost(),
+        "layer_by_layer_energy": baseline.get_total_energy_cost(),
+        "layers": layers,
+    }
+    return output, report
@@ -1,19 +1,21 @@
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional
 import numpy as np
 import json
 from classes.InputFeatureMap import InputFeatureMap
 from classes.memoryModel import Memory
 from classes.filter import Filter
-from classes.consts import (
-    FilterSize as fs,
-    InputFmapSize as ifs,
-    OutputFmapSize as ofs,
-    U as stride,
-)
+from classes.config import Config
+from tools.data_loader import save_binary_data
 from collections import defaultdict
 
-def generate_data() -> None:
+def generate_data(
+    config: Optional[Config] = None, save: bool = True, binary: bool = False
+) -> tuple[Dict[int, Filter], Dict[int, float], List[InputFeatureMap]]:
     # here we would like to create an example of kernel computation
+    # with save=False nothing is written and the data is only returned (used by sweeps),
+    # with binary=True the data is saved as .npy files instead of json
+    config = config or Config()
+    fs, ifs = config.filter_size, config.input_fmap_size
 
     # FILTERS:
     # we are going to have M filters, each one with C channels and R x S kernel size
@@ -29,7 +31,7 @@ def generate_data() -> None:
 
     filters: Dict[int, Filter] = defaultdict(Filter)
     for m in range(fs.M):
-        filters[m] = Filter()
+        filters[m] = Filter(config=config)
 
 
     # each filter has a bias, so for now we simply map it with a dict to quickly access it
@@ -40,14 +42,20 @@ def generate_data() -> None:
     # we initialize the N fmaps with random values
     inputFmaps: List[InputFeatureMap] = []
     for n in range(ifs.N):
-        inputFmaps.append(InputFeatureMap())
+        inputFmaps.append(InputFeatureMap(config=config))
 
+    if not save:
+        return (filters, biases, inputFmaps)
+    if binary:
+        save_binary_data(filters, inputFmaps)
+        return (filters, biases, inputFmaps)
     filters_json = [filter.to_dict() for filter in filters.values()]
     with open("data/filters.json", "w") as f:
         json.dump(filters_json, f, indent=4)
     input_fmaps_json = [inputFmap.to_dict() for inputFmap in inputFmaps]
     with open("data/input_fmaps.json", "w") as f:
         json.dump(input_fmaps_json, f, indent=4)
+    return (filters, biases, inputFmaps)
 
 if __name__ == "_main_":
     generate_data()
\ No newline at end of file
@@ -0,0 +1,182 @@
+from typing import Any, Dict, List, Optional, Tuple
+from statistics import NormalDist
+import contextlib
+import copy
+import io
+import numpy as np
+import pandas as pd
+from classes.checkpoint import CheckpointPolicy, OnFailure
+from classes.config import Config
+from classes.counters import ROLE_INDEX, CounterSnapshot
+from classes.memoryModel import Memory
+from tools.generate_data import generate_data
+
+# strategy name -> (tiling, all_nonvolatile) as in perform_all_convolutions
+STRATEGIES: Dict[str, Tuple[bool, bool]] = {
+    "untiled": (False, False),
+    "tiling": (True, False),
+    "all_nonvolatile": (False, True),
+}
+
+METRICS = (
+    "volatile_reads",
+    "volatile_writes",
+    "nonvolatile_reads",
+    "nonvolatile_writes",
+    "total_energy",
+    "failures",
+)
+
+
+def run_quietly(memory: Memory, *args: Any, **kwargs: Any) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        memory.perform_all_convolutions(*args, **kwargs)
+
+
+def check_modelled(policy: CheckpointPolicy) -> None:
+    # the failures of a run are drawn independently of each other, which holds when a
+    # failure saves and restores the whole state at the point where it happens.
+    # Periodic saves and dirty blocks make the cost of a failure depend on the
+    # previous ones (rollback and power models are not modelled at all)
+    if policy.counts_macs or policy.block_size is not None:
+        raise ValueError(
+            f"monte_carlo can't model {policy}: failures are only independent with "
+            "OnFailure or JustInTime whole-state checkpoints, run perform_all_convolutions"
+        )
+
+
+def strategy_profile(
+    config: Config,
+    tiling: bool,
+    all_nonvolatile: bool,
+    data: Tuple[Dict, Dict, List],
+    tile_shape: Optional[Tuple[int, int]] = None,
+    checkpoint_policy: Optional[CheckpointPolicy] = None,
+) -> Tuple[CounterSnapshot, int, np.ndarray, np.ndarray]:
+    # the scalar path draws one failure per MAC and a failure only adds the checkpoint
+    # traffic of the position where it happens, so a run is the failure-free ledger
+    # plus the cost of every failure. Returns (failure-free snapshot, MACs that can
+    # fail, distinct ledgers of one failure, share of the MACs where each happens),
+    # all measured with the simulator itself. Raises ValueError if the strategy
+    # doesn't fit
+    filters, biases, inputFmaps = data
+    P, Q = config.P, config.Q
+    policy = checkpoint_policy or OnFailure()
+    quiet = config.replace(energy_model={"POWER_FAILURE_PROBABILITY": 0.0})
+    memory = Memory(
+        fast_counting=True, config=quiet, verbosity=0, checkpoint_policy=copy.deepcopy(policy)
+    )
+    outputFmaps = np.zeros((config.input_fmap_size.N, config.filter_size.M, P, Q))
+    run_quietly(
+        memory, outputFmaps, inputFmaps, filters, biases, P, Q, tiling, all_nonvolatile,
+        tile_shape=tile_shape, record=False,
+    )
+    base = memory.snapshot()
+    if all_nonvolatile:
+        return base, 0, np.zeros((1,) + base.ledger.shape, dtype=np.int64), np.ones(1)
+    macs = memory.progress.macs
+
+    # every work item runs the same loop nest: the first one with a failure on every
+    # MAC gives the cost of a failure at every position (only checkpoints and
+    # restores touch the checkpoint role)
+    item_config = config.replace(energy_model={"POWER_FAILURE_PROBABILITY": 1.0})
+    memory = Memory(
+        config=item_config, seed=0, verbosity=0, checkpoint_policy=copy.deepcopy(policy)
+    )
+    checkpoint = ROLE_INDEX["checkpoint"]
+    marks = [memory.ledger[:, checkpoint].copy()]
+
+    def mark(memory: Memory, event: str, payload: Dict[str, Any]) -> None:
+        marks.append(memory.ledger[:, checkpoint].copy())
+
+    memory.subscribe("power_failure", mark)
+    with contextlib.redirect_stdout(io.StringIO()):
+        memory.monitor_convolution_one_by_one(
+            outputFmaps, inputFmaps, filters, biases, P, Q, 0, 0, 0, 0, tiling,
+            all_nonvolatile, tile_shape=tile_shape, record=False,
+        )
+    costs, counts = np.unique(np.diff(np.array(marks), axis=0), axis=0, return_counts=True)
+    ledgers = np.zeros((len(costs),) + base.ledger.shape, dtype=np.int64)
+    ledgers[:, :, checkpoint] = costs
+    return base, macs, ledgers, counts / counts.sum()
+
+
+def monte_carlo(
+    trials: int = 10000,
+    config: Optional[Config] = None,
+    strategies: Optional[List[str]] = None,
+    probability: Optional[float] = None,
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+    tile_shape: Optional[Tuple[int, int]] = None,
+    samples: bool = False,
+    checkpoint_policy: Optional[CheckpointPolicy] = None,
+) -> Any:
+    # distribution of counters and energy of perform_all_convolutions under random
+    # power failures, for trials runs of every strategy at once: the failures of a run
+    # are Binomial(MACs, probability) instead of one draw per MAC, and their positions
+    # (which set what each one costs) are drawn uniformly. One row per strategy
+    # and metric with mean, variance, the confidence interval of the mean and the
+    # central interval of the runs. samples=True also returns the raw samples.
+    # Without explicit strategies those that don't fit in the config (e.g. untiled
+    # with a small SRAM) are skipped and listed in summary.attrs["infeasible"].
+    # checkpoint_policy is OnFailure by default, see check_modelled for the others
+    config = config or Config()
+    check_modelled(checkpoint_policy or OnFailure())
+    if probability is None:
+        probability = config.energy_model.POWER_FAILURE_PROBABILITY
+    explicit = strategies is not None
+    strategies = strategies or list(STRATEGIES)
+    rng = np.random.default_rng(seed)
+    data = generate_data(config, save=False)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    tail = (1 - confidence) / 2 * 100
+
+    rows = []
+    drawn: Dict[str, pd.DataFrame] = {}
+    infeasible: Dict[str, str] = {}
+    for strategy in strategies:
+        tiling, all_nonvolatile = STRATEGIES[strategy]
+        try:
+            base, macs, failure_costs, shares = strategy_profile(
+                config, tiling, all_nonvolatile, data, tile_shape, checkpoint_policy
+            )
+        except ValueError as error:
+            if explicit:
+                raise
+            infeasible[strategy] = str(error)
+            continue
+        failures = rng.binomial(macs, probability, size=trials)
+        # how many of the failures of every run fall on positions of each cost
+        positions = rng.multinomial(failures, shares)
+        ledgers = base.ledger + np.tensordot(positions, failure_costs, axes=1)
+        counters = ledgers[:, 0].sum(axis=1).reshape(trials, -1)
+        values = {name: counters[:, i] for i, name in enumerate(METRICS[:4])}
+        values["total_energy"] = (ledgers * base.costs).sum(axis=(1, 2, 3, 4))
+        values["failures"] = failures
+        drawn[strategy] = pd.DataFrame(values)
+        for metric in METRICS:
+            sample = values[metric]
+            mean = sample.mean()
+            variance = sample.var(ddof=1) if trials > 1 else 0.0
+            half_width = z * np.sqrt(variance / trials)
+            low, high = np.percentile(sample, [tail, 100 - tail])
+            rows.append(
+                {
+                    "strategy": strategy,
+                    "metric": metric,
+                    "mean": mean,
+                    "variance": variance,
+                    "ci_low": mean - half_width,
+                    "ci_high": mean + half_width,
+                    "interval_low": low,
+                    "interval_high": high,
+                }
+            )
+    if not rows:
+        raise ValueError(f"No strategy fits in this configuration: {infeasible}")
+    summary = pd.DataFrame(rows)
+    summary.attrs["infeasible"] = infeasible
+    if samples:
+        return summary, drawn
+    return summary
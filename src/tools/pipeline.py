@@ -0,0 +1,169 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from classes.config import Config
+from classes.filter import Filter
+from classes.InputFeatureMap import InputFeatureMap
+from classes.memoryModel import Memory
+from classes.network import ConvLayer, Network, PoolLayer, ReLULayer
+from tools.autotuner import autotune_tiling
+
+
+def fits_in_sram(
+    network: Network,
+    index: int,
+    reserved: int,
+    config: Config,
+    tiling: bool,
+    itemsize: int,
+) -> bool:
+    # whether layer index can run while reserved bytes of SRAM hold resident fmaps:
+    # a tiled convolution needs a tiling that fits in the rest, an untiled one a
+    # channel of its input and of a kernel. Pooling and ReLU stream their data
+    size = config.memory_model.VOLATILE_MEMORY_SIZE
+    if reserved > size:
+        return False
+    layer = network.layers[index]
+    if not isinstance(layer, ConvLayer):
+        return True
+    layer_config = network.layer_config(index, config)
+    if not tiling:
+        ifs, fs = layer_config.input_fmap_size, layer_config.filter_size
+        return itemsize * (ifs.H * ifs.W + fs.R * fs.S) <= size - reserved
+    try:
+        autotune_tiling(
+            config=layer_config.replace(memory_model={"VOLATILE_MEMORY_SIZE": size - reserved}),
+            itemsize=itemsize,
+        )
+    except ValueError:
+        return False
+    return True
+
+
+def plan_residency(
+    network: Network, config: Config, tiling: bool, itemsize: int
+) -> List[bool]:
+    # for every layer, whether its output fmaps stay in SRAM as the input of the next
+    # layer: they have to fit next to the resident input of the layer while it runs,
+    # and next to the working set of the next layer. The network output goes to FRAM
+    shapes = network.shapes()
+    keep = []
+    resident = 0
+    for index in range(len(network)):
+        output_bytes = itemsize * int(np.prod(shapes[index + 1]))
+        kept = (
+            index + 1 < len(network)
+            and fits_in_sram(network, index, resident + output_bytes, config, tiling, itemsize)
+            and fits_in_sram(network, index + 1, output_bytes, config, tiling, itemsize)
+        )
+        keep.append(kept)
+        resident = output_bytes if kept else 0
+    return keep
+
+
+def run_network(
+    network: Network,
+    memory: Optional[Memory] = None,
+    inputFmaps: Optional[List[InputFeatureMap]] = None,
+    weights: Optional[List[Optional[Tuple[Dict[int, Filter], Dict[int, float]]]]] = None,
+    tiling: bool = True,
+    reuse: bool = True,
+    seed: Optional[int] = None,
+) -> Tuple[np.ndarray, pd.DataFrame]:
+    # execute the network layer by layer on memory, returns the output fmaps and one
+    # row per layer with its accesses, bits and energy. Every layer loads its weights
+    # and, unless the previous layer left it in SRAM, its input fmaps from FRAM, and
+    # stores its output fmaps to FRAM unless they stay in SRAM for the next layer.
+    # reuse=False stores and reloads every intermediate fmap (layers in isolation).
+    # Convolutions make one pass over the input channels with the partial sums in
+    # their outputs (accumulate_channels), loading kernels and input tiles as they go;
+    # the output is that of run_fused up to the rounding of the summation order
+    memory = memory or Memory(verbosity=0)
+    if memory.requantizer is not None:
+        raise ValueError("Fixed-point networks need one requantizer per layer.")
+    if memory.epilogue.pooling is not None:
+        raise ValueError("Pooling in a network is a PoolLayer, not an epilogue of the memory.")
+    base = memory.config
+    inputFmaps = inputFmaps or network.generate_inputs()
+    weights = weights or network.generate_weights(base)
+    itemsize = memory.element_size()
+    keep = (
+        plan_residency(network, base, tiling, itemsize) if reuse else [False] * len(network)
+    )
+    seeds = np.random.SeedSequence(seed).generate_state(len(network))
+    size = base.memory_model.VOLATILE_MEMORY_SIZE
+
+    fmaps = np.stack([fmap.fmap for fmap in inputFmaps]).astype(np.float64)
+    resident = None
+    rows: List[Dict[str, Any]] = []
+    try:
+        for index, layer in enumerate(network.layers):
+            before = memory.snapshot()
+            convolution = isinstance(layer, ConvLayer)
+            if resident is None and not convolution:
+                # the input fmaps come from FRAM (the conv loops load their own tiles)
+                memory.transfer(False, False, fmaps.size, "input")
+                memory.transfer(True, True, fmaps.size, "input")
+            output_shape = network.shapes()[index + 1]
+            outputs = np.zeros(output_shape)
+            output_handle = memory.alloc(outputs, volatile=True) if keep[index] else None
+            memory.keep_outputs = keep[index]
+            if convolution:
+                filters, biases = weights[index]
+                layer_config = network.layer_config(index, base)
+                fs = layer_config.filter_size
+                memory.transfer(False, False, fs.M, "biases")
+                memory.transfer(True, True, fs.M, "biases")
+                tile_shape = None
+                if tiling:
+                    reserved = memory.volatile_memory_usage
+                    tiling_config = autotune_tiling(
+                        config=layer_config.replace(
+                            memory_model={"VOLATILE_MEMORY_SIZE": size - reserved}
+                        ),
+                        memory=memory,
+                    )
+                    tile_shape = (tiling_config.tile_height, tiling_config.tile_width)
+                memory.config = layer_config
+                memory.keep_inputs = resident is not None
+                try:
+                    memory.perform_all_convolutions(
+                        outputs,
+                        [InputFeatureMap(fmap, config=layer_config) for fmap in fmaps],
+                        filters, biases, layer_config.P, layer_config.Q,
+                        tiling=tiling, all_nonvolatile=False, tile_shape=tile_shape,
+                        seed=int(seeds[index]), record=False, accumulate_channels=True,
+                    )
+                finally:
+                    memory.config = base
+                    memory.keep_inputs = False
+            elif isinstance(layer, PoolLayer):
+                outputs[:] = memory.monitor_pooling(fmaps, layer.size, layer.stride, layer.mode)
+            elif isinstance(layer, ReLULayer):
+                outputs[:] = memory.monitor_activation(fmaps)
+            else:
+                raise ValueError(f"Unknown layer: {layer}")
+            memory.keep_outputs = False
+            peak = memory.volatile_memory_usage
+            if resident is not None:
+                memory.free(resident, volatile=True)
+            resident = output_handle
+            fmaps = outputs
+
+            rows.append(
+                (memory.snapshot() - before).to_record(
+                    layer=index,
+                    name=layer.name,
+                    kind=type(layer).__name__,
+                    output_shape="x".join(str(extent) for extent in output_shape),
+                    input_resident=index > 0 and keep[index - 1],
+                    output_resident=keep[index],
+                    resident_bytes=peak,
+                )
+            )
+    finally:
+        memory.keep_outputs = False
+        memory.keep_inputs = False
+        if resident is not None:
+            memory.free(resident, volatile=True)
+    return fmaps, pd.DataFrame(rows)
@@ -0,0 +1,153 @@
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+from classes.config import Config
+from classes.counters import ROLES
+from classes.trace import TRACE_DTYPE
+
+
+def trace_blocks(
+    trace: np.ndarray,
+    block_size: Optional[int] = None,
+    config: Optional[Config] = None,
+    level: Optional[int] = None,
+    itemsizes: Optional[Sequence[int]] = None,
+) -> np.ndarray:
+    # one integer per access naming the block of block_size bytes it touches (one element
+    # per block when block_size is None), different tensors never share a block.
+    # level=0 or 1 keeps only the volatile or the non-volatile accesses. itemsizes are
+    # the bytes of an element of every role (TraceRecorder.itemsizes), SIZE_OF_FLOAT
+    # for all of them unless given
+    if trace.dtype != TRACE_DTYPE:
+        raise ValueError("Expected a trace of classes/trace.TRACE_DTYPE records.")
+    if level is not None:
+        trace = trace[trace["level"] == level]
+    elements = trace["element"]
+    if block_size is not None:
+        sizes = element_sizes(config, itemsizes)
+        elements = elements * sizes[trace["tensor"]] // block_size
+    return elements * len(ROLES) + trace["tensor"]
+
+
+def element_sizes(
+    config: Optional[Config] = None, itemsizes: Optional[Sequence[int]] = None
+) -> np.ndarray:
+    # bytes of an element of every role
+    if itemsizes is None:
+        return np.full(len(ROLES), (config or Config()).unit_model.SIZE_OF_FLOAT)
+    if len(itemsizes) != len(ROLES):
+        raise ValueError(f"Expected the element sizes of the {len(ROLES)} roles.")
+    return np.asarray(itemsizes, dtype=np.int64)
+
+
+def reuse_distances(blocks: np.ndarray) -> np.ndarray:
+    # number of distinct blocks touched between an access and the previous access to the
+    # same block (LRU stack distance), -1 for the first access to a block.
+    # An access hits in a fully associative LRU memory of c blocks iff 0 <= distance < c
+    distances = np.full(blocks.size, -1, dtype=np.int64)
+    if blocks.size == 0:
+        return distances
+    # accesses repeating the previous block (e.g. a partial sum read then written)
+    # have distance 0 and don't change the order of the others
+    first = np.flatnonzero(np.concatenate(([True], blocks[1:] != blocks[:-1])))
+    distances[1:][blocks[1:] == blocks[:-1]] = 0
+    ids = np.unique(blocks[first], return_inverse=True)[1]
+
+    # previous access to the same block of every (collapsed) access
+    order = np.argsort(ids, kind="stable")
+    previous = np.full(ids.size, -1, dtype=np.int64)
+    same = ids[order[1:]] == ids[order[:-1]]
+    previous[order[1:][same]] = order[:-1][same]
+
+    # Fenwick tree over the positions holding the last access of some block: the
+    # distance is the number of those between the previous access and this one
+    size = ids.size
+    tree = [0] * (size + 1)
+    collapsed = [-1] * size
+    for t, p in enumerate(previous.tolist()):
+        if p >= 0:
+            count = 0
+            i = t
+            while i > 0:
+                count += tree[i]
+                i -= i & -i
+            i = p + 1
+            while i > 0:
+                count -= tree[i]
+                i -= i & -i
+            collapsed[t] = count
+            i = p + 1
+            while i <= size:
+                tree[i] -= 1
+                i += i & -i
+        i = t + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+    distances[first] = collapsed
+    return distances
+
+
+def reuse_histogram(distances: np.ndarray) -> pd.DataFrame:
+    # accesses per reuse distance, the first accesses (cold misses) have distance -1
+    distance, accesses = np.unique(distances, return_counts=True)
+    return pd.DataFrame({"distance": distance, "accesses": accesses})
+
+
+def miss_ratio_curve(
+    distances: np.ndarray,
+    block_size: int,
+    sizes: Optional[Sequence[int]] = None,
+) -> pd.DataFrame:
+    # miss ratio of a fully associative LRU memory of every size (bytes) in sizes, by
+    # default powers of two up to the size at which only the cold misses are left
+    reuses = np.sort(distances[distances >= 0])
+    cold = int((distances < 0).sum())
+    total = distances.size
+    if sizes is None:
+        enough = (int(reuses[-1]) + 1 if reuses.size else 1) * block_size
+        sizes = 2 ** np.arange(int(np.ceil(np.log2(max(enough, block_size)))) + 1)
+        sizes = sizes[sizes >= block_size]
+    sizes = np.asarray(sizes, dtype=np.int64)
+    blocks = sizes // block_size
+    misses = cold + reuses.size - np.searchsorted(reuses, blocks, side="left")
+    return pd.DataFrame(
+        {
+            "size": sizes,
+            "blocks": blocks,
+            "misses": misses,
+            "miss_ratio": misses / total if total else np.zeros(sizes.size),
+        }
+    )
+
+
+def suggest_memory_size(
+    distances: np.ndarray, block_size: int, miss_ratio: float = 0.0
+) -> int:
+    # smallest size (bytes) whose miss ratio is at most miss_ratio above the cold misses,
+    # e.g. a VOLATILE_MEMORY_SIZE that holds everything the trace reuses for miss_ratio=0
+    reuses = np.sort(distances[distances >= 0])
+    allowed = int(np.floor(miss_ratio * distances.size))
+    if allowed >= reuses.size:
+        return 0
+    # with c blocks the reuses at distance >= c miss, keep at most allowed of them
+    return (int(reuses[reuses.size - allowed - 1]) + 1) * block_size
+
+
+def analyze_trace(
+    trace: np.ndarray,
+    block_size: Optional[int] = None,
+    config: Optional[Config] = None,
+    level: Optional[int] = None,
+    sizes: Optional[Sequence[int]] = None,
+    itemsizes: Optional[Sequence[int]] = None,
+) -> pd.DataFrame:
+    # miss ratio curve of a recorded trace (e.g. recorder.to_array() with
+    # itemsizes=recorder.itemsizes for a Memory(trace=recorder)). Only the accesses of
+    # the loop nest are traced, checkpoint and restore traffic is not in the curve.
+    # Without block_size every element is a block of the largest element size
+    blocks = trace_blocks(trace, block_size, config, level, itemsizes)
+    distances = reuse_distances(blocks)
+    return miss_ratio_curve(
+        distances, block_size or int(element_sizes(config, itemsizes).max()), sizes
+    )
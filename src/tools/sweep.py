@@ -0,0 +1,78 @@
+from typing import Any, Dict, List, Optional
+import contextlib
+import io
+import itertools
+import numpy as np
+import pandas as pd
+from classes.config import Config
+from classes.memoryModel import Memory
+from classes.sink import ResultsSink
+from tools.generate_data import generate_data
+
+
+def config_grid(base: Optional[Config] = None, **axes: List[Any]) -> List[Config]:
+    # cartesian product of parameter values on top of base, axes are named
+    # "section__PARAM" (e.g. input_fmap_size__H=[32, 64]) or "stride"
+    base = base or Config()
+    names = list(axes)
+    configs = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        stride = None
+        sections: Dict[str, Dict[str, Any]] = {}
+        for name, value in zip(names, values):
+            if name == "stride":
+                stride = value
+                continue
+            section, _, parameter = name.partition("__")
+            sections.setdefault(section, {})[parameter] = value
+        configs.append(base.replace(stride, **sections))
+    return configs
+
+
+def run_sweep(
+    configs: List[Config],
+    tiling: bool,
+    all_nonvolatile: bool,
+    fast_counting: bool = True,
+    seed: Optional[int] = None,
+    workers: int = 1,
+    quiet: bool = True,
+    output: Optional[str] = None,
+) -> pd.DataFrame:
+    # run perform_all_convolutions for every config back to back in this process,
+    # with freshly generated data that is never written to disk, one row per config.
+    # output (.csv or .npz) also writes the rows there, flushed in bulk
+    rows = ResultsSink(output)
+    for config in configs:
+        filters, biases, inputFmaps = generate_data(config, save=False)
+        memory = Memory(
+            fast_counting=fast_counting, seed=seed, config=config, verbosity=0 if quiet else 1
+        )
+        outputFmaps = np.zeros(
+            (config.input_fmap_size.N, config.filter_size.M, config.P, config.Q)
+        )
+        captured = io.StringIO() if quiet else None
+        with contextlib.redirect_stdout(captured) if quiet else contextlib.nullcontext():
+            memory.perform_all_convolutions(
+                outputFmaps, inputFmaps, filters, biases, config.P, config.Q,
+                tiling=tiling, all_nonvolatile=all_nonvolatile, workers=workers,
+                seed=seed, record=False,
+            )
+        row: Dict[str, Any] = {"stride": config.stride}
+        for section in ("filter_size", "input_fmap_size", "memory_model", "energy_model"):
+            for key, value in getattr(config, section).to_dict().items():
+                row[f"{section}__{key}"] = value
+        row.update(
+            {
+                "volatile_reads": memory.volatile_reads,
+                "volatile_writes": memory.volatile_writes,
+                "nonvolatile_reads": memory.nonvolatile_reads,
+                "nonvolatile_writes": memory.nonvolatile_writes,
+                "volatile_energy": memory.get_volatile_energy_cost(),
+                "nonvolatile_energy": memory.get_nonvolatile_energy_cost(),
+                "total_energy": memory.get_total_energy_cost(),
+            }
+        )
+        rows.append(row)
+    rows.close()
+    return rows.to_frame()